@@ -8,6 +8,7 @@ class Agency(entity.Entity):
   """GTFS Agency entity."""
   ENTITY_TYPE = 'o'
   KEY = 'agency_id'
+  TABLE = 'agency'
   REQUIRED = [
     'agency_name',
     'agency_url',
@@ -18,7 +19,26 @@ class Agency(entity.Entity):
     'agency_lang',
     'agency_phone',
     'agency_fare_url'
-  ]  
+  ]
+  RULES = [
+    # Required
+    validation.Rule('agency_name', validation.required, "Required: agency_name"),
+    validation.Rule('agency_url', validation.required, "Required: agency_url"),
+    validation.Rule('agency_url', validation.valid_url, "Invalid agency_url",
+      optional=True),
+    validation.Rule('agency_timezone', validation.required,
+      "Required: agency_timezone"),
+    validation.Rule('agency_timezone', validation.valid_tz,
+      "Invalid agency_timezone", optional=True),
+    # Optional
+    validation.Rule('agency_lang', validation.valid_language, "Invalid language",
+      optional=True),
+    validation.Rule('agency_fare_url', validation.valid_url,
+      "Invalid agency_fare_url", optional=True)
+  ]
+  # Members of json() that are generated by json_items().
+  JSON_STREAMED = ['features', 'routes']
+
   def name(self):
     return self.get('agency_name')
 
@@ -36,16 +56,28 @@ class Agency(entity.Entity):
   def bbox(self):
     return geom.bbox(self.stops())
 
+  def json_items(self):
+    """The (key, value) members of json(), in key order.
+
+    routes and features are generators, so they can be written one at
+    a time; see export.write_geojson().
+    """
+    stops = self.stops()
+    return [
+      ('bbox', geom.bbox(stops)),
+      ('features', (s.json() for s in stops)),
+      ('geometry', self.geometry()),
+      ('name', self.name()),
+      ('properties', self.data),
+      ('routes', (r.json() for r in self.routes())),
+      ('type', 'FeatureCollection')
+    ]
+
   def json(self):
-    return {
-      'type': 'FeatureCollection',
-      'name': self.name(),
-      'properties': self.data,
-      'bbox': self.bbox(),
-      'geometry': self.geometry(),
-      'routes': [r.json() for r in self.routes()],
-      'features': [s.json() for s in self.stops()]
-    }
+    return dict(
+      (key, list(value) if key in self.JSON_STREAMED else value)
+      for key, value in self.json_items()
+    )
 
   def geometry(self):
     hull = geom.convex_hull(self.stops())
@@ -106,36 +138,3 @@ class Agency(entity.Entity):
     for trip in self.trips():
       stop_times |= trip.stop_times()
     return stop_times
-    
-  ##### Validation #####
-    
-  def validate(self, validator=None):
-    validator = super(Agency, self).validate(validator)
-    # Required
-    with validator(self): 
-      assert self.get('agency_name'), \
-        "Required: agency_name"
-    with validator(self): 
-      assert self.get('agency_url'), "Required: agency_url"
-      assert validation.valid_url(self.get('agency_url')), \
-        "Invalid agency_url"
-    with validator(self):
-      assert self.get('agency_timezone'), "Required: agency_timezone"
-      assert validation.valid_tz(self.get('agency_timezone')), \
-        "Invalid agency_timezone"
-    # Optional
-    with validator(self): 
-      if self.get('agency_lang'):
-        assert validation.valid_language(self.get('agency_lang')), \
-          "Invalid language"
-    with validator(self): 
-      if self.get('agency_fare_url'):
-        assert validation.valid_url(self.get('agency_fare_url')), \
-          "Invalid agency_fare_url"
-    with validator(self):
-      if self.get('agency_id'): 
-        pass
-    with validator(self):
-      if self.get('agency_phone'):
-        pass
-    return validator
@@ -0,0 +1,265 @@
+"""Benchmarks for feed queries, and for reading and writing feeds.
+
+Runs on the sample feeds, on any GTFS files given, and on generated
+synthetic feeds. Feed benchmarks each run in a new process; a forked
+process starts with the memory of its parent, so the memory reported is
+the growth in peak memory over that of the process when it starts.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import shutil
+import resource
+import multiprocessing
+
+import feed
+import util
+import synthetic
+import validation
+
+def timed(results, name, func, *args, **kw):
+  t = time.time()
+  ret = func(*args, **kw)
+  results.append((name, time.time() - t))
+  return ret
+
+def bench_routing(filename, date, queries=100, seed=0):
+  """Build the CSA and RAPTOR routers for a date, and run random queries."""
+  results = []
+  f = feed.Feed(filename)
+  timed(results, 'timetable', f.timetable)
+  connections = timed(results, 'connections', f.connections, date)
+  stops = sorted(connections.stop_ids)
+  rng = random.Random(seed)
+  pairs = [
+    (rng.choice(stops), rng.choice(stops), rng.randint(6*3600, 18*3600))
+    for i in range(queries)
+  ]
+  def run():
+    found = 0
+    for origin, destination, departure in pairs:
+      if f.journey(origin, destination, date, departure) is not None:
+        found += 1
+    return found
+  found = timed(results, 'journey x %s'%queries, run)
+  timed(results, 'raptor', f.raptor, date)
+  def run_raptor():
+    for origin, destination, departure in pairs:
+      f.journeys(origin, destination, date, departure)
+  timed(results, 'journeys x %s'%queries, run_raptor)
+  def run_range():
+    for origin, destination, departure in pairs:
+      f.journeys(origin, destination, date, departure, end=departure+3600)
+  timed(results, 'range 1h x %s'%queries, run_range)
+  return len(connections), found, results
+
+def report(name, connections, found, results):
+  print "%s: %s connections"%(name, connections)
+  for label, seconds in results:
+    print "  %-20s %0.3fs"%(label, seconds)
+  print "  found %s journeys"%found
+
+##### Feed benchmarks #####
+
+# Synthetic feed scales, as arguments to synthetic.generate_network().
+SCALES = {
+  'small': dict(agencies=1, routes=10, trips=20, stops=20),
+  'medium': dict(agencies=2, routes=40, trips=50, stops=30),
+  'large': dict(agencies=4, routes=100, trips=100, stops=40)
+}
+
+def _tables(f):
+  ret = []
+  for table in sorted(f.FACTORIES):
+    try:
+      f.header(table)
+    except KeyError:
+      continue
+    ret.append(table)
+  return ret
+
+def _rows(f):
+  # Rows read into memory.
+  return sum(len(i) for i in f.cache.values() + f.by_id.values())
+
+# Each benchmark takes a filename, and returns the seconds and rows for
+# the timed part; setup is not timed.
+
+def bench_iterread(filename):
+  f = feed.Feed(filename)
+  t = time.time()
+  rows = 0
+  for table in _tables(f):
+    for entity in f.iterread(table):
+      rows += 1
+  return time.time() - t, rows
+
+def bench_read(filename):
+  f = feed.Feed(filename)
+  t = time.time()
+  for table in _tables(f):
+    f.read(table)
+  return time.time() - t, _rows(f)
+
+def bench_preload(filename):
+  f = feed.Feed(filename)
+  t = time.time()
+  f.preload()
+  return time.time() - t, _rows(f)
+
+def bench_validate(filename):
+  f = feed.Feed(filename)
+  t = time.time()
+  f.validate(validator=validation.ValidationReport())
+  return time.time() - t, _rows(f)
+
+def bench_shapes(filename):
+  f = feed.Feed(filename)
+  t = time.time()
+  f.shapes()
+  return time.time() - t, len(f.read('shapes'))
+
+def bench_route_geometry(filename):
+  f = feed.Feed(filename)
+  f.preload()
+  if 'shapes' in _tables(f):
+    f.shapes()
+  t = time.time()
+  for route in f.routes():
+    route.geometry()
+  return time.time() - t, len(f.routes())
+
+def bench_agency_json(filename):
+  f = feed.Feed(filename)
+  f.preload()
+  t = time.time()
+  rows = 0
+  for agency in f.agencies():
+    data = agency.json()
+    rows += len(data['routes']) + len(data['features'])
+  return time.time() - t, rows
+
+def bench_write(filename):
+  f = feed.Feed(filename)
+  tables = _tables(f)
+  for table in tables:
+    f.read(table)
+  path = tempfile.mkdtemp()
+  try:
+    t = time.time()
+    for table in tables:
+      f.write(os.path.join(path, '%s.txt'%table), f.read(table))
+    return time.time() - t, _rows(f)
+  finally:
+    shutil.rmtree(path)
+
+# Benchmarks: (name, function, tables required).
+BENCHMARKS = [
+  ('iterread', bench_iterread, []),
+  ('read', bench_read, []),
+  ('preload', bench_preload, ['stop_times']),
+  ('validate', bench_validate, feed.Feed.REQUIRED),
+  ('shapes', bench_shapes, ['shapes']),
+  ('Route.geometry', bench_route_geometry, ['stop_times']),
+  ('Agency.json', bench_agency_json, ['stop_times']),
+  ('write', bench_write, [])
+]
+
+def _run(args):
+  name, filename = args
+  func = dict((i[0], i[1]) for i in BENCHMARKS)[name]
+  # Kilobytes on Linux.
+  start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  seconds, rows = func(filename)
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return seconds, rows, peak - start
+
+def bench_feed(filename, names=None):
+  """Run the feed benchmarks, each in a new process.
+
+  Returns a list of (name, seconds, rows, peak memory growth in
+  kilobytes), or (name, None, None, None) if the feed lacks a required
+  table. Errors in a benchmark are raised.
+  """
+  tables = set(_tables(feed.Feed(filename)))
+  results = []
+  for name, func, required in BENCHMARKS:
+    if names and name not in names:
+      continue
+    if not tables.issuperset(required):
+      results.append((name, None, None, None))
+      continue
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+      ret = pool.apply(_run, [(name, filename)])
+    finally:
+      pool.close()
+      pool.join()
+    results.append((name,) + ret)
+  return results
+
+def report_feed(name, results):
+  print "%s:"%name
+  for label, seconds, rows, peak in results:
+    if seconds is None:
+      print "  %-16s %s"%(label, 'n/a')
+      continue
+    print "  %-16s %8.3fs %10d rows %12.0f rows/s %8.1f MB"%(
+      label,
+      seconds,
+      rows,
+      rows / max(seconds, 1e-6),
+      peak / 1024.0
+    )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Benchmark feed queries.')
+  parser.add_argument('filenames', nargs='*', help='GTFS files')
+  parser.add_argument('--date', help='Service date for GTFS files, YYYYMMDD')
+  parser.add_argument('--size', help='Synthetic feed grid size', type=int,
+    default=20)
+  parser.add_argument('--queries', help='Number of journey queries', type=int,
+    default=100)
+  parser.add_argument('--feed',
+    help='Run the feed benchmarks instead of journey queries',
+    action='store_true')
+  parser.add_argument('--scale', action='append', choices=sorted(SCALES),
+    help='Synthetic feed scale for feed benchmarks; default small and medium')
+  parser.add_argument('--bench', action='append',
+    choices=[i[0] for i in BENCHMARKS], help='Run only this feed benchmark')
+  args = parser.parse_args()
+
+  if args.feed:
+    for filename in [util.example_feed()] + args.filenames:
+      report_feed(filename, bench_feed(filename, names=args.bench))
+    for scale in args.scale or ['small', 'medium']:
+      path = tempfile.mkdtemp()
+      try:
+        filename = os.path.join(path, 'synthetic.zip')
+        counts = synthetic.generate_zip(filename, network=True, **SCALES[scale])
+        name = 'synthetic %s (%s stop_times)'%(scale, counts['stop_times'])
+        report_feed(name, bench_feed(filename, names=args.bench))
+      finally:
+        shutil.rmtree(path)
+  else:
+    feeds = [(util.example_feed(), '20070605')]
+    if args.filenames and not args.date:
+      parser.error('--date is required with GTFS files')
+    feeds += [(filename, args.date) for filename in args.filenames]
+    for filename, date in feeds:
+      report(filename, *bench_routing(filename, date, queries=args.queries))
+
+    path = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(path, 'synthetic.zip')
+      counts = synthetic.generate_zip(filename, size=args.size)
+      name = 'synthetic %sx%s (%s stop_times)'%(
+        args.size,
+        args.size,
+        counts['stop_times']
+      )
+      report(name, *bench_routing(filename, '20150601', queries=args.queries))
+    finally:
+      shutil.rmtree(path)
@@ -0,0 +1,126 @@
+"""Vehicle blocks: trips chained by block_id, and fleet size."""
+import collections
+
+import frequency
+
+# A trip in a block, with its first departure and last arrival in seconds.
+BlockTrip = collections.namedtuple(
+  'BlockTrip',
+  ['trip_id', 'route_id', 'start', 'end', 'first_stop_id', 'last_stop_id']
+)
+
+# The time between two consecutive trips in a block. kind is 'layover' if
+# the next trip starts where the previous ended, 'deadhead' if the vehicle
+# must move without passengers, or 'overlap' if the next trip starts
+# before the previous ends. interline is True if the routes differ.
+Gap = collections.namedtuple(
+  'Gap',
+  ['service_id', 'block_id', 'from_trip_id', 'to_trip_id', 'seconds', 'kind', 'interline']
+)
+
+class BlockIndex(object):
+  """Trips grouped by service and block_id, ordered by start time.
+
+  Built with one sort over the first departure and last arrival of every
+  trip, read from the timetable. Trips without a block_id are each run
+  by their own vehicle.
+  """
+  def __init__(self, tt, trips, frequencies=None):
+    """Build from a Timetable, Trips, and Frequencies."""
+    rows = []
+    for trip, trip_id, stops in frequency.timed_trips(tt, trips, frequencies):
+      if not stops:
+        continue
+      rows.append((
+        trip.get('service_id'),
+        trip.get('block_id') or None,
+        stops[0][2],
+        BlockTrip(
+          trip_id,
+          trip.get('route_id'),
+          stops[0][2],
+          stops[-1][1],
+          stops[0][0],
+          stops[-1][0]
+        )
+      ))
+    rows.sort(key=lambda x:(x[0], x[1], x[2], x[3].trip_id))
+    # (service_id, block_id) -> [BlockTrip]
+    self.blocks = collections.defaultdict(list)
+    # service_id -> [BlockTrip], trips without a block_id
+    self.unblocked = collections.defaultdict(list)
+    # service_id -> [(service_id, block_id)], sorted
+    self.services = collections.defaultdict(list)
+    for service_id, block_id, start, trip in rows:
+      if block_id is None:
+        self.unblocked[service_id].append(trip)
+        continue
+      key = (service_id, block_id)
+      if key not in self.blocks:
+        self.services[service_id].append(key)
+      self.blocks[key].append(trip)
+
+  @classmethod
+  def from_feed(cls, feed):
+    try:
+      frequencies = feed.read('frequencies')
+    except KeyError:
+      frequencies = []
+    return cls(feed.timetable(), feed.trips(), frequencies)
+
+  def block(self, service_id, block_id):
+    """Return the BlockTrips of a block, in order."""
+    return self.blocks.get((service_id, block_id), [])
+
+  def block_ids(self, service_id=None):
+    """Return (service_id, block_id) for each block."""
+    if service_id is None:
+      return sorted(self.blocks)
+    return list(self.services.get(service_id, []))
+
+  def gaps(self, service_id=None):
+    """Generate the Gaps between consecutive trips of each block."""
+    for key in self.block_ids(service_id):
+      trips = self.blocks[key]
+      for a, b in zip(trips, trips[1:]):
+        seconds = b.start - a.end
+        if seconds < 0:
+          kind = 'overlap'
+        elif a.last_stop_id == b.first_stop_id:
+          kind = 'layover'
+        else:
+          kind = 'deadhead'
+        yield Gap(
+          key[0],
+          key[1],
+          a.trip_id,
+          b.trip_id,
+          seconds,
+          kind,
+          a.route_id != b.route_id
+        )
+
+  def spans(self, service_ids):
+    """Return the (start, end) in service of each vehicle, for services."""
+    ret = []
+    for service_id in service_ids:
+      for key in self.block_ids(service_id):
+        trips = self.blocks[key]
+        ret.append((trips[0].start, max(i.end for i in trips)))
+      for trip in self.unblocked.get(service_id, []):
+        ret.append((trip.start, trip.end))
+    return sorted(ret)
+
+  def fleet_size(self, service_ids):
+    """Return the peak number of vehicles in service at once."""
+    # Ends sort before starts at the same time: a vehicle can be reused.
+    events = []
+    for start, end in self.spans(service_ids):
+      events.append((start, 1))
+      events.append((end, -1))
+    events.sort(key=lambda x:(x[0], x[1]))
+    peak = count = 0
+    for t, change in events:
+      count += change
+      peak = max(peak, count)
+    return peak
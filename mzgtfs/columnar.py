@@ -0,0 +1,299 @@
+"""A compact columnar format for GTFS, for fast reloads. Requires numpy.
+
+A feed is written to a directory with one .npy file for each column of
+each table, and a manifest.json describing them. Each column is typed:
+
+  int     integers, e.g. stop_sequence; empty values are INT_NULL
+  float   decimals, e.g. stop_lat; empty values are NaN
+  time    HH:MM:SS times as seconds, e.g. arrival_time; empty values are -1
+  string  dictionary-encoded: the distinct values, as concatenated UTF-8
+          bytes (.dict) and offsets (.offsets), and a code for each row
+
+A column is only typed if every value can be written back exactly as it
+was read, so tables round-trip unchanged; otherwise it is a string column.
+Arrays are memory-mapped when read, without parsing rows.
+"""
+import array
+import collections
+import json
+import os
+import re
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import feed
+
+FORMAT = 'mzgtfs-columnar'
+VERSION = 2
+MANIFEST = 'manifest.json'
+INT_NULL = -2**31
+TIME_NULL = -1
+# Rows converted to entities at a time.
+CHUNK_SIZE = 10000
+
+# Time formats, tried in order.
+TIME_FORMATS = ['%02d:%02d:%02d', '%d:%02d:%02d']
+TIME_RE = re.compile(r'^\d+:\d\d:\d\d$')
+
+def _require():
+  if numpy is None:
+    raise ImportError('The columnar format requires numpy.')
+
+def _smallest(count):
+  """The smallest unsigned dtype for codes less than count."""
+  for dtype in ['uint8', 'uint16', 'uint32']:
+    if count <= numpy.iinfo(dtype).max + 1:
+      return dtype
+  return 'uint64'
+
+def _seconds(value):
+  h, m, s = map(int, value.split(':'))
+  return h * 3600 + m * 60 + s
+
+def _format_time(seconds, fmt):
+  return fmt%(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+# Parser, empty value, and dtype of each typed kind.
+TYPES = {
+  'int': (int, INT_NULL, 'int32'),
+  'float': (float, float('nan'), 'float64'),
+  'time': (_seconds, TIME_NULL, 'int32')
+}
+
+def infer(values):
+  """Return the kind and time format for the distinct values of a column."""
+  values = [i for i in values if i != '']
+  if not values:
+    return 'string', None
+  try:
+    if all(str(int(i)) == i for i in values):
+      ints = [int(i) for i in values]
+      if min(ints) > INT_NULL and max(ints) < 2**31:
+        return 'int', None
+  except ValueError:
+    pass
+  try:
+    # NaN is the empty value.
+    if all(repr(float(i)) == i and float(i) == float(i) for i in values):
+      return 'float', None
+  except ValueError:
+    pass
+  if all(TIME_RE.match(i) for i in values):
+    for fmt in TIME_FORMATS:
+      if all(_format_time(_seconds(i), fmt) == i for i in values):
+        return 'time', fmt
+  return 'string', None
+
+class ColumnBuilder(object):
+  """Dictionary-encode a column as values arrive; type it when finished."""
+  def __init__(self):
+    self.index = {}
+    self.codes = array.array('L')
+
+  def add(self, value):
+    try:
+      code = self.index[value]
+    except KeyError:
+      code = self.index[value] = len(self.index)
+    self.codes.append(code)
+
+  def arrays(self):
+    """Return the column description, and a dict of suffix to array."""
+    values = [None] * len(self.index)
+    for value, code in self.index.items():
+      values[code] = value
+    kind, fmt = infer(values)
+    codes = numpy.zeros(0, dtype='uint64')
+    if self.codes:
+      codes = numpy.frombuffer(self.codes, dtype='u%s'%self.codes.itemsize)
+    if kind != 'string':
+      parse, null, dtype = TYPES[kind]
+      typed = numpy.array([parse(i) if i != '' else null for i in values], dtype=dtype)
+      column = dict(kind=kind)
+      if fmt:
+        column['format'] = fmt
+      return column, {'': typed[codes]}
+    # Sort the dictionary, so codes are ordered as the values.
+    order = sorted(range(len(values)), key=lambda x:values[x])
+    remap = numpy.zeros(len(values), dtype=_smallest(len(values)))
+    remap[order] = numpy.arange(len(values))
+    encoded = [values[i].encode('utf-8') for i in order]
+    offsets = numpy.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = numpy.cumsum([len(i) for i in encoded])
+    dictionary = numpy.frombuffer(''.join(encoded), dtype='uint8') \
+      if encoded else numpy.zeros(0, dtype='uint8')
+    return dict(kind=kind), {
+      '': remap[codes],
+      '.dict': dictionary,
+      '.offsets': offsets
+    }
+
+def _filename(path, table, column, suffix=''):
+  return os.path.join(path, '%s.%s%s.npy'%(table, column, suffix))
+
+def write(gtfs_feed, path, tables=None):
+  """Write the tables of a feed to a columnar directory; return row counts."""
+  _require()
+  if os.path.exists(path) and os.listdir(path):
+    raise IOError('Path exists and is not empty: %s'%path)
+  if not os.path.exists(path):
+    os.makedirs(path)
+  manifest = dict(format=FORMAT, version=VERSION, tables={})
+  counts = {}
+  for table in sorted(tables or gtfs_feed.FACTORIES):
+    try:
+      header = gtfs_feed.header(table)
+    except KeyError:
+      continue
+    gtfs_feed.log('... writing columns: %s'%table)
+    builders = [ColumnBuilder() for i in header]
+    rows = 0
+    for entity in gtfs_feed.iterread(table):
+      for builder, value in zip(builders, entity.data):
+        builder.add(value)
+      rows += 1
+    columns = []
+    for name, builder in zip(header, builders):
+      column, arrays = builder.arrays()
+      column['name'] = name
+      for suffix, data in arrays.items():
+        numpy.save(_filename(path, table, name, suffix), data)
+        if not suffix:
+          column['dtype'] = str(data.dtype)
+      columns.append(column)
+    manifest['tables'][table] = dict(
+      rows=rows,
+      hash=gtfs_feed.table_hash(table),
+      columns=columns
+    )
+    counts[table] = rows
+  with open(os.path.join(path, MANIFEST), 'w') as f:
+    json.dump(manifest, f, sort_keys=True, indent=2)
+  return counts
+
+class ColumnarFeed(feed.Feed):
+  """A Feed read from a columnar directory.
+
+  Tables are read from memory-mapped arrays: iterread() and read() work
+  as usual, and column() returns a whole column as a typed numpy array.
+  The directory may be given as filename or path; Feed(filename) returns
+  a ColumnarFeed for a columnar directory.
+  """
+  def __init__(self, filename=None, path=None, debug=False, mmap=True):
+    _require()
+    path = filename or path
+    super(ColumnarFeed, self).__init__(filename=path, debug=debug)
+    self.mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, MANIFEST)) as f:
+      self.manifest = json.load(f)
+    if self.manifest.get('format') != FORMAT:
+      raise ValueError('Not a columnar GTFS directory: %s'%path)
+    if self.manifest.get('version') != VERSION:
+      raise ValueError('Unsupported columnar version: %s'%self.manifest.get('version'))
+    self._arrays = {}
+    self._dictionaries = {}
+
+  def _open(self, table):
+    raise KeyError("Columnar feeds have no csv files: %s"%table)
+
+  def _table(self, table):
+    try:
+      return self.manifest['tables'][table]
+    except KeyError:
+      raise KeyError("Table not found in columnar directory: %s"%table)
+
+  def _column(self, table, name):
+    for column in self._table(table)['columns']:
+      if column['name'] == name:
+        return column
+    raise KeyError("Column not found: %s.%s"%(table, name))
+
+  def _array(self, table, name, suffix=''):
+    key = (table, name, suffix)
+    if key not in self._arrays:
+      self._arrays[key] = numpy.load(
+        _filename(self.filename, table, name, suffix),
+        mmap_mode=self.mmap_mode
+      )
+    return self._arrays[key]
+
+  def _dictionary(self, table, name):
+    # The distinct values of a string column, decoded once.
+    key = (table, name)
+    if key not in self._dictionaries:
+      data = self._array(table, name, '.dict').tostring()
+      offsets = self._array(table, name, '.offsets').tolist()
+      values = numpy.empty(len(offsets) - 1, dtype=object)
+      for i, (start, end) in enumerate(zip(offsets, offsets[1:])):
+        values[i] = data[start:end].decode('utf-8')
+      self._dictionaries[key] = values
+    return self._dictionaries[key]
+
+  def header(self, table):
+    return [i['name'] for i in self._table(table)['columns']]
+
+  def table_hash(self, table):
+    """The hash of the source table when it was written."""
+    try:
+      return self._table(table)['hash']
+    except KeyError:
+      return None
+
+  def column(self, table, name):
+    """Return a column as a numpy array; string columns are decoded."""
+    column = self._column(table, name)
+    data = self._array(table, name)
+    if column['kind'] == 'string':
+      return self._dictionary(table, name)[data]
+    return data
+
+  def codes(self, table, name):
+    """Return a string column's dictionary, as an object array, and codes."""
+    if self._column(table, name)['kind'] != 'string':
+      raise ValueError('Not a string column: %s.%s'%(table, name))
+    return self._dictionary(table, name), self._array(table, name)
+
+  def _strings(self, table, name, start, end):
+    # The values of rows start to end as strings, via their distinct values.
+    column = self._column(table, name)
+    data = self._array(table, name)[start:end]
+    if column['kind'] == 'string':
+      values = self._dictionary(table, name).tolist()
+      return [values[i] for i in data.tolist()]
+    distinct, inverse = numpy.unique(data, return_inverse=True)
+    if column['kind'] == 'int':
+      values = [u'' if i == INT_NULL else unicode(i) for i in distinct.tolist()]
+    elif column['kind'] == 'float':
+      values = [u'' if i != i else unicode(repr(i)) for i in distinct.tolist()]
+    else:
+      values = [
+        u'' if i == TIME_NULL else unicode(_format_time(i, column['format']))
+        for i in distinct.tolist()
+      ]
+    return [values[i] for i in inverse.tolist()]
+
+  def iterread(self, table):
+    """Iteratively read a table from its columns."""
+    self.log('Reading: %s'%table)
+    cls = self.FACTORIES[table]
+    header = self.header(table)
+    ent = collections.namedtuple('EntityNamedTuple', map(str, header))
+    rows = self._table(table)['rows']
+    for start in xrange(0, rows, CHUNK_SIZE):
+      end = min(start + CHUNK_SIZE, rows)
+      columns = [self._strings(table, name, start, end) for name in header]
+      for i, row in enumerate(zip(*columns), start + 1):
+        yield cls.from_row(ent._make(row), self, row=i)
+
+if __name__ == "__main__":
+  import argparse
+  parser = argparse.ArgumentParser(description='Write a GTFS feed as columns.')
+  parser.add_argument('filename', help='GTFS File')
+  parser.add_argument('path', help='Output directory')
+  args = parser.parse_args()
+  counts = write(feed.Feed(args.filename), args.path)
+  for table in sorted(counts):
+    print "%s: %s"%(table, counts[table])
@@ -0,0 +1,202 @@
+"""Connection Scan Algorithm journey planner."""
+import array
+import bisect
+import collections
+import sys
+
+import widetime
+import frequency
+
+# One leg of a journey. trip_id is None for a transfer between stops.
+Leg = collections.namedtuple(
+  'Leg',
+  ['trip_id', 'from_stop_id', 'to_stop_id', 'departure', 'arrival']
+)
+
+INFINITY = sys.maxint
+
+def read_transfers(transfers):
+  """Return change times at stops, and footpaths between stops.
+
+  A transfer from a stop to itself gives the time needed to change trips
+  at that stop; other transfers are footpaths, taking min_transfer_time
+  or no time. Transfers of type 3, not possible, are ignored.
+  """
+  change_times = {}
+  footpaths = collections.defaultdict(list)
+  for transfer in (transfers or []):
+    if transfer.get('transfer_type') in ('3', 3):
+      continue
+    from_stop_id = transfer.get('from_stop_id')
+    to_stop_id = transfer.get('to_stop_id')
+    duration = int(transfer.get('min_transfer_time') or 0)
+    if from_stop_id == to_stop_id:
+      change_times[from_stop_id] = duration
+    else:
+      footpaths[from_stop_id].append((to_stop_id, duration))
+  return change_times, footpaths
+
+def feed_inputs(feed, date):
+  """Return the Timetable, active Trips, Frequencies, and Transfers for a date."""
+  services = feed.service_calendar().active_services(date)
+  trips = [i for i in feed.trips() if i.get('service_id') in services]
+  tables = []
+  for table in ['frequencies', 'transfers']:
+    try:
+      tables.append(feed.read(table))
+    except KeyError:
+      tables.append([])
+  return [feed.timetable(), trips] + tables
+
+class ConnectionScan(object):
+  """Earliest arrival queries over the trips of one service date.
+
+  Each pair of consecutive timed stops on a trip is a connection. The
+  connections are stored as parallel arrays sorted by departure time, and
+  a query is a single scan from the requested departure time.
+
+  Transfers are read with read_transfers().
+  """
+  def __init__(self, tt, trips, frequencies=None, transfers=None):
+    """Build from a Timetable, the active Trips, Frequencies, and Transfers."""
+    self.stop_ids = []
+    self._stops = {}
+    self.trip_ids = []
+    rows = []
+    for _, trip_id, stops in frequency.timed_trips(tt, trips, frequencies):
+      trip = len(self.trip_ids)
+      self.trip_ids.append(trip_id)
+      prev = None
+      for stop_id, arrive, depart in stops:
+        stop = self._stop(stop_id)
+        if prev:
+          rows.append((prev[1], arrive, prev[0], stop, trip))
+        prev = (stop, depart)
+    rows.sort()
+    self.departures = array.array('i', [i[0] for i in rows])
+    self.arrivals = array.array('i', [i[1] for i in rows])
+    self.from_stops = array.array('i', [i[2] for i in rows])
+    self.to_stops = array.array('i', [i[3] for i in rows])
+    self.trips = array.array('i', [i[4] for i in rows])
+    # Transfers.
+    change_times, footpaths = read_transfers(transfers)
+    self.change_times = dict(
+      (self._stops[stop_id], duration)
+      for stop_id, duration in change_times.items()
+      if stop_id in self._stops
+    )
+    self.footpaths = collections.defaultdict(list)
+    for from_stop_id, walks in footpaths.items():
+      for to_stop_id, duration in walks:
+        if from_stop_id in self._stops and to_stop_id in self._stops:
+          self.footpaths[self._stops[from_stop_id]].append(
+            (self._stops[to_stop_id], duration)
+          )
+
+  @classmethod
+  def from_feed(cls, feed, date):
+    """Build for the services active on a date."""
+    return cls(*feed_inputs(feed, date))
+
+  def _stop(self, stop_id):
+    try:
+      return self._stops[stop_id]
+    except KeyError:
+      self._stops[stop_id] = len(self.stop_ids)
+      self.stop_ids.append(stop_id)
+      return self._stops[stop_id]
+
+  def __len__(self):
+    return len(self.departures)
+
+  def _scan(self, origin, departure, target=None):
+    """Scan connections; return arrival times, and how each stop was reached."""
+    n = len(self.stop_ids)
+    # Earliest arrival, and earliest time to board another trip.
+    arrival = [INFINITY] * n
+    ready = [INFINITY] * n
+    # Connection used to reach each stop, or the stop walked from.
+    in_connection = [-1] * n
+    in_walk = [-1] * n
+    # Connection where each trip was boarded.
+    boarded = [-1] * len(self.trip_ids)
+    arrival[origin] = ready[origin] = departure
+    for stop, duration in self.footpaths.get(origin, ()):
+      if departure + duration < arrival[stop]:
+        arrival[stop] = ready[stop] = departure + duration
+        in_walk[stop] = origin
+    departures, arrivals = self.departures, self.arrivals
+    from_stops, to_stops, trips = self.from_stops, self.to_stops, self.trips
+    change_times, footpaths = self.change_times, self.footpaths
+    for i in xrange(bisect.bisect_left(departures, departure), len(departures)):
+      if target is not None and departures[i] > arrival[target]:
+        break
+      trip = trips[i]
+      if boarded[trip] < 0:
+        if ready[from_stops[i]] > departures[i]:
+          continue
+        boarded[trip] = i
+      arrive, stop = arrivals[i], to_stops[i]
+      if arrive < arrival[stop]:
+        arrival[stop] = arrive
+        ready[stop] = arrive + change_times.get(stop, 0)
+        in_connection[stop] = i
+        in_walk[stop] = -1
+        for walk_stop, duration in footpaths.get(stop, ()):
+          if arrive + duration < arrival[walk_stop]:
+            arrival[walk_stop] = ready[walk_stop] = arrive + duration
+            in_connection[walk_stop] = -1
+            in_walk[walk_stop] = stop
+    return arrival, in_connection, in_walk, boarded
+
+  def arrival_times(self, origin, departure):
+    """Return the earliest arrival time at every reachable stop."""
+    origin = self._stops.get(origin)
+    if origin is None:
+      return {}
+    arrival = self._scan(origin, widetime.to_seconds(departure))[0]
+    return dict(
+      (self.stop_ids[i], widetime.WideTime.from_seconds(t))
+      for i, t in enumerate(arrival)
+      if t < INFINITY
+    )
+
+  def journey(self, origin, destination, departure):
+    """Return the Legs of the earliest arriving journey, or None."""
+    departure = widetime.to_seconds(departure)
+    origin = self._stops.get(origin)
+    destination = self._stops.get(destination)
+    if origin is None or destination is None:
+      return None
+    arrival, in_connection, in_walk, boarded = self._scan(
+      origin,
+      departure,
+      target=destination
+    )
+    if arrival[destination] == INFINITY:
+      return None
+    legs = []
+    stop = destination
+    while stop != origin:
+      if in_walk[stop] >= 0:
+        prev = in_walk[stop]
+        legs.append(Leg(
+          None,
+          self.stop_ids[prev],
+          self.stop_ids[stop],
+          widetime.WideTime.from_seconds(arrival[prev]),
+          widetime.WideTime.from_seconds(arrival[stop])
+        ))
+      else:
+        i = in_connection[stop]
+        first = boarded[self.trips[i]]
+        prev = self.from_stops[first]
+        legs.append(Leg(
+          self.trip_ids[self.trips[i]],
+          self.stop_ids[prev],
+          self.stop_ids[stop],
+          widetime.WideTime.from_seconds(self.departures[first]),
+          widetime.WideTime.from_seconds(self.arrivals[i])
+        ))
+      stop = prev
+    return list(reversed(legs))
@@ -0,0 +1,131 @@
+"""Departure boards: the next departures from a stop."""
+import array
+import bisect
+import collections
+import datetime
+import heapq
+import itertools
+
+import servicecalendar
+import timetable
+import widetime
+
+# A departure from a stop. time is relative to the queried date, and
+# trip_start to service_date; they differ for trips past midnight from
+# the previous service day. For frequency-based trips, trip_start
+# identifies the departure of the template trip.
+Departure = collections.namedtuple(
+  'Departure',
+  ['time', 'stop_id', 'trip_id', 'stop_sequence', 'trip_start', 'service_date']
+)
+
+DAY = 24 * 3600
+
+class DepartureBoard(object):
+  """Departure times for each stop and service, sorted once.
+
+  Scheduled departures are kept as sorted arrays for each stop and
+  service, and found with a binary search. Trips in frequencies.txt are
+  templates: their departures are computed from the headway at query
+  time, and merged in order with the scheduled departures.
+  """
+  def __init__(self, tt, trips, frequencies=None):
+    """Build from a Timetable, Trip entities, and Frequency entities."""
+    frequencies = list(frequencies or [])
+    templates = set(i.get('trip_id') for i in frequencies)
+    services = dict((trip.id(), trip.get('service_id')) for trip in trips)
+    self._overnight = False
+    # Scheduled trips.
+    rows = collections.defaultdict(list)
+    for trip_id, times in tt.trips.items():
+      service_id = services.get(trip_id)
+      if service_id is None or trip_id in templates:
+        continue
+      start = timetable.first_departure(times)
+      for stop_id, depart, sequence in zip(
+          times.stops, times.departures, times.sequences
+        ):
+        if depart >= 0:
+          rows[(stop_id, service_id)].append((depart, trip_id, sequence, start))
+          self._overnight |= depart >= DAY
+    # (stop_id, service_id) -> (times, trip_ids, stop_sequences, trip_starts)
+    self._scheduled = {}
+    for key, departures in rows.items():
+      departures.sort()
+      times, trip_ids, sequences, starts = zip(*departures)
+      self._scheduled[key] = (
+        array.array('i', times),
+        trip_ids,
+        array.array('i', sequences),
+        array.array('i', starts)
+      )
+    # Frequency-based trips.
+    # (stop_id, service_id) -> [(start, end, headway, offset, trip_id, stop_sequence)]
+    self._frequencies = collections.defaultdict(list)
+    for freq in frequencies:
+      trip_id = freq.get('trip_id')
+      times = tt.get(trip_id)
+      service_id = services.get(trip_id)
+      if not times or service_id is None:
+        continue
+      first = timetable.first_departure(times)
+      if first is None:
+        continue
+      start, end, headway = int(freq.start()), int(freq.end()), freq.headway()
+      for stop_id, depart, sequence in zip(
+          times.stops, times.departures, times.sequences
+        ):
+        if depart >= 0:
+          self._frequencies[(stop_id, service_id)].append(
+            (start, end, headway, depart - first, trip_id, sequence)
+          )
+          self._overnight |= end + depart - first > DAY
+
+  def _scheduled_after(self, key, after):
+    times, trip_ids, sequences, starts = self._scheduled[key]
+    for i in xrange(bisect.bisect_left(times, after), len(times)):
+      yield times[i], trip_ids[i], sequences[i], starts[i]
+
+  def _frequency_after(self, row, after):
+    start, end, headway, offset, trip_id, sequence = row
+    if after - offset > start:
+      start += -(-(after - offset - start) // headway) * headway
+    for t in xrange(start, end, headway):
+      yield t + offset, trip_id, sequence, t
+
+  def _departures(self, stop_id, service_ids, after, service_date, shift):
+    streams = []
+    for service_id in service_ids:
+      key = (stop_id, service_id)
+      if key in self._scheduled:
+        streams.append(self._scheduled_after(key, after + shift))
+      for row in self._frequencies.get(key, ()):
+        streams.append(self._frequency_after(row, after + shift))
+    for t, trip_id, sequence, start in heapq.merge(*streams):
+      yield Departure(
+        widetime.WideTime.from_seconds(t - shift),
+        stop_id,
+        trip_id,
+        sequence,
+        widetime.WideTime.from_seconds(start),
+        service_date
+      )
+
+  def departures(self, stop_ids, calendar, date, after=0, limit=None):
+    """Return departures from stops on a date, at or after a time.
+
+    calendar is a ServiceCalendar. Trips from the previous service day
+    that are still running after midnight are included.
+    """
+    date = servicecalendar.parse_date(date)
+    streams = []
+    days = [(date, 0)]
+    if self._overnight:
+      days.append((date - datetime.timedelta(days=1), DAY))
+    for stop_id in stop_ids:
+      for service_date, shift in days:
+        service_ids = calendar.active_services(service_date)
+        streams.append(
+          self._departures(stop_id, service_ids, after, service_date, shift)
+        )
+    return list(itertools.islice(heapq.merge(*streams), limit))
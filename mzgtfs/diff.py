@@ -0,0 +1,199 @@
+"""Row-level differences between two versions of a feed.
+
+Each table is compared by key: the primary key of the entity, or a
+natural key for tables without one, e.g. (trip_id, stop_sequence) for
+stop_times. The old table is streamed once to hash each row; the new table
+is streamed against the hashes. Rows of the old table that were modified
+or removed are then read again, so only the hashes, and the changed rows,
+are held in memory. Rows that repeat a key are compared as a group.
+Tables with identical files are skipped.
+"""
+import argparse
+import collections
+import hashlib
+import json
+
+import feed
+
+# Key columns of each table.
+KEYS = {
+  'agency': ('agency_id',),
+  'routes': ('route_id',),
+  'trips': ('trip_id',),
+  'stops': ('stop_id',),
+  'stop_times': ('trip_id', 'stop_sequence'),
+  'calendar': ('service_id',),
+  'calendar_dates': ('service_id', 'date'),
+  'shapes': ('shape_id', 'shape_pt_sequence'),
+  'frequencies': ('trip_id', 'start_time'),
+  'transfers': ('from_stop_id', 'to_stop_id'),
+  'fare_attributes': ('fare_id',),
+  'fare_rules': ('fare_id', 'route_id', 'origin_id', 'destination_id', 'contains_id'),
+  'feed_info': ('feed_publisher_name',)
+}
+
+# Tables compared, in order.
+TABLES = [
+  'agency',
+  'routes',
+  'trips',
+  'stop_times',
+  'stops',
+  'calendar',
+  'calendar_dates',
+  'frequencies',
+  'shapes',
+  'transfers',
+  'fare_attributes',
+  'fare_rules',
+  'feed_info'
+]
+
+# A changed row. action is 'added', 'removed', or 'modified'. key is a
+# tuple of the key column values. old and new are dicts of column values:
+# the whole row if added or removed, or only the changed columns.
+Change = collections.namedtuple('Change', ['table', 'action', 'key', 'old', 'new'])
+
+def row(entity):
+  """The non-empty values of an entity, as a dict."""
+  return dict((k, v) for k, v in entity.items() if v not in (None, ''))
+
+def row_hash(values):
+  """A hash of a row's values, independent of column order."""
+  return hashlib.sha1(repr(sorted(values.items()))).digest()
+
+def _iterread(gtfs_feed, table):
+  try:
+    gtfs_feed.header(table)
+  except KeyError:
+    return []
+  return gtfs_feed.iterread(table)
+
+def _key(entity, columns):
+  return tuple(entity.get(i) or '' for i in columns)
+
+def _push(d, k, value):
+  # A dict of key to one value, or a list if the key repeats.
+  if k not in d:
+    d[k] = value
+  elif isinstance(d[k], list):
+    d[k].append(value)
+  else:
+    d[k] = [d[k], value]
+
+def _pop(d, k, value=None):
+  # Remove value (or the first value) for a key; return it, or None.
+  if k not in d:
+    return None
+  items = d[k] if isinstance(d[k], list) else [d[k]]
+  if value is None:
+    value = items[0]
+  elif value not in items:
+    return None
+  items.remove(value)
+  if not items:
+    del d[k]
+  elif len(items) == 1:
+    d[k] = items[0]
+  else:
+    d[k] = items
+  return value
+
+def _changed(a, b):
+  return (set(a) ^ set(b)) | set(i for i in a if i in b and a[i] != b[i])
+
+def diff_table(old, new, table, columns=None):
+  """Generate the Changes to a table between two feeds, by key columns.
+
+  Keys need not be unique: rows with the same key are compared as a
+  group. Identical rows are matched first; the remaining old and new rows
+  of a key are paired in file order as modified, and the rest are
+  removed or added.
+  """
+  columns = columns or KEYS.get(table)
+  if not columns:
+    raise ValueError('No key for table: %s'%table)
+  old_hash, new_hash = old.table_hash(table), new.table_hash(table)
+  if old_hash == new_hash:
+    return
+  # Hash the old rows.
+  hashes = {}
+  for entity in _iterread(old, table):
+    _push(hashes, _key(entity, columns), row_hash(row(entity)))
+  # Stream the new rows; keep those not matched by an identical old row.
+  unmatched = {}
+  for entity in _iterread(new, table):
+    k = _key(entity, columns)
+    values = row(entity)
+    if k not in hashes:
+      yield Change(table, 'added', k, None, values)
+    elif _pop(hashes, k, row_hash(values)) is None:
+      _push(unmatched, k, values)
+  # hashes now holds the old rows that were modified or removed.
+  if hashes:
+    # Read the old versions of changed rows.
+    for entity in _iterread(old, table):
+      k = _key(entity, columns)
+      a = row(entity)
+      if _pop(hashes, k, row_hash(a)) is None:
+        continue
+      b = _pop(unmatched, k)
+      if b is None:
+        yield Change(table, 'removed', k, a, None)
+        continue
+      changed = _changed(a, b)
+      if not changed:
+        continue
+      yield Change(
+        table,
+        'modified',
+        k,
+        dict((i, a[i]) for i in changed if i in a),
+        dict((i, b[i]) for i in changed if i in b)
+      )
+  # New rows of repeated keys without an old row to pair with.
+  for k, values in sorted(unmatched.items()):
+    for b in (values if isinstance(values, list) else [values]):
+      yield Change(table, 'added', k, None, b)
+
+def diff(old, new, tables=None):
+  """Generate the Changes between two feeds, table by table."""
+  for table in tables or TABLES:
+    for change in diff_table(old, new, table):
+      yield change
+
+def summary(changes):
+  """Count changes by table and action."""
+  counts = collections.defaultdict(lambda:collections.defaultdict(int))
+  for change in changes:
+    counts[change.table][change.action] += 1
+  return dict((k, dict(v)) for k, v in counts.items())
+
+def write_changes(f, changes):
+  """Write changes as newline-delimited JSON; return the count."""
+  count = 0
+  for change in changes:
+    f.write(json.dumps(change._asdict(), sort_keys=True))
+    f.write('\n')
+    count += 1
+  return count
+
+if __name__ == "__main__":
+  import sys
+  parser = argparse.ArgumentParser(description='Compare two GTFS feeds.')
+  parser.add_argument('old', help='Old GTFS File')
+  parser.add_argument('new', help='New GTFS File')
+  parser.add_argument('--table', action='append', dest='tables',
+    help='Compare only this table')
+  parser.add_argument('--changes',
+    help='Write every change as newline-delimited JSON',
+    action='store_true')
+  args = parser.parse_args()
+  changes = diff(feed.Feed(args.old), feed.Feed(args.new), tables=args.tables)
+  if args.changes:
+    write_changes(sys.stdout, changes)
+  else:
+    for table, actions in sorted(summary(changes).items()):
+      print "%s: %s"%(table, ', '.join(
+        '%s %s'%(actions[i], i) for i in ['added', 'removed', 'modified'] if i in actions
+      ))
@@ -16,8 +16,13 @@ class Entity(object):
   """
   ENTITY_TYPE = None
   KEY = None
+  TABLE = None
   REQUIRED = []
   OPTIONAL = []
+  # Validation rules; see validation.Rule
+  RULES = []
+  # Validation rules for relationships with other entities in the feed
+  FEED_RULES = []
 
   def __init__(self, **data):
     """Row data from DictReader, and reference to feed."""
@@ -29,6 +34,8 @@ class Entity(object):
     # Relationships (e.g. trips, stop_times, ...)
     self._children = set()
     self._parents = set()
+    # Row number in the source table, if read from a file.
+    self._row = None
 
   def __repr__(self):
     return '<%s %s>'%(self.__class__.__name__, self.id())
@@ -53,10 +60,10 @@ class Entity(object):
 
   def get(self, key, default=None):
     """Get row data by key."""
-    try:
-      return self[key]
-    except KeyError:
-      return default
+    data = self.data
+    if hasattr(data, '_fields'):
+      return getattr(data, key, default)
+    return data.get(key, default)
 
   def set(self, key, value):
     # Convert from namedtuple to dict if setting value.
@@ -101,12 +108,17 @@ class Entity(object):
 
   # Load / Dump.
   @classmethod
-  def from_row(cls, data, feed=None):
+  def from_row(cls, data, feed=None, row=None):
     entity = cls()
     entity.data = data
     entity.set_feed(feed)
+    entity._row = row
     return entity
 
+  def row(self):
+    """Row number in the source table; the first row after the header is 1."""
+    return self._row
+
   @classmethod
   def from_json(cls, data):
     raise NotImplementedError
@@ -131,8 +143,14 @@ class Entity(object):
 
   def children(self):
     """Read and cache children."""
+    if not self._children and self._feed is not None:
+      self._children = self._read_children()
     return self._children
 
+  def _read_children(self):
+    """Read the children from the GTFS feed."""
+    return self._feed.read_children(self)
+
   # ... parents
   def add_parent(self, parent):
     """Add a parent relationship."""
@@ -140,16 +158,20 @@ class Entity(object):
 
   def parents(self):
     """Read and cache parents."""
+    if not self._parents and self._feed is not None:
+      self._parents = self._read_parents()
     return self._parents
 
   def _read_parents(self):
     """Read the parents from the GTFS feed."""
-    return set()
+    return self._feed.read_parents(self)
 
   ##### Validation #####
 
   def validate(self, validator=None):
-    return validation.make_validator(validator)
+    validator = validation.make_validator(validator)
+    return validation.run_rules(self, 'RULES', validator)
 
   def validate_feed(self, validator=None):
-    return validation.make_validator(validator)
+    validator = validation.make_validator(validator)
+    return validation.run_rules(self, 'FEED_RULES', validator)
@@ -1,15 +1,130 @@
-"""Provide useful information about a GTFS file and export to JSON."""
+"""Provide useful information about a GTFS file and export to JSON.
+
+Exports are streamed: each route and stop feature is encoded and written
+as it is computed, instead of building the whole FeatureCollection and
+encoding it at once. The agencies of a feed can be exported in parallel.
+"""
 import argparse
 import json
+import multiprocessing
+import os
 
 import feed
 
+INDENT = 4
+
+def dumps(obj, compact=False, level=0):
+  """Encode obj as JSON, indented to be nested 'level' deep."""
+  if compact:
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+  data = json.dumps(obj, sort_keys=True, indent=INDENT, separators=(',', ': '))
+  return data.replace('\n', '\n' + ' ' * INDENT * level)
+
+def _write_array(f, items, compact=False, level=0):
+  # Write a JSON array, one item at a time.
+  f.write('[')
+  sep = ',' if compact else ',\n' + ' ' * INDENT * (level + 1)
+  first = True
+  for item in items:
+    if first:
+      f.write('' if compact else sep[1:])
+    else:
+      f.write(sep)
+    f.write(dumps(item, compact=compact, level=level + 1))
+    first = False
+  if not first and not compact:
+    f.write('\n' + ' ' * INDENT * level)
+  f.write(']')
+
+def write_geojson(f, agency, compact=False):
+  """Write agency.json() to f, encoding each route and stop as it is computed.
+
+  The output is the same as json.dump(agency.json(), f, sort_keys=True),
+  indented by 4 unless compact.
+  """
+  members = sorted(agency.json_items(), key=lambda x:x[0])
+  sep = ',' if compact else ',\n' + ' ' * INDENT
+  f.write('{' if compact else '{\n' + ' ' * INDENT)
+  for i, (key, value) in enumerate(members):
+    if i:
+      f.write(sep)
+    f.write(json.dumps(key))
+    f.write(':' if compact else ': ')
+    if key in agency.JSON_STREAMED:
+      _write_array(f, value, compact=compact, level=1)
+    else:
+      f.write(dumps(value, compact=compact, level=1))
+  f.write('}' if compact else '\n}')
+
+def write_ndjson(f, agency):
+  """Write each route and stop feature of an agency on its own line."""
+  for route in agency.routes():
+    f.write(dumps(route.json(), compact=True))
+    f.write('\n')
+  for stop in agency.stops():
+    f.write(dumps(stop.json(), compact=True))
+    f.write('\n')
+
+def export_agency(agency, path='.', compact=False, ndjson=False):
+  """Export an agency to a file in path; return the file name."""
+  ext = 'ndjson' if ndjson else 'geojson'
+  outfile = os.path.join(path, 'export-%s.%s'%(agency.id(), ext))
+  with open(outfile, 'w') as f:
+    if ndjson:
+      write_ndjson(f, agency)
+    else:
+      write_geojson(f, agency, compact=compact)
+  return outfile
+
+# The preloaded feed, shared with forked worker processes.
+_FEED = None
+
+def _export(args):
+  agency_id, path, compact, ndjson = args
+  return export_agency(_FEED.agency(agency_id), path=path, compact=compact,
+    ndjson=ndjson)
+
+def export(gtfs_feed, path='.', compact=False, ndjson=False, workers=None):
+  """Export each agency of a preloaded feed; return the file names.
+
+  Agencies without stops are skipped. With workers, agencies are exported
+  in that many processes, forked after preloading so they share the
+  entity graph.
+  """
+  global _FEED
+  agency_ids = [agency.id() for agency in gtfs_feed.agencies() if agency.stops()]
+  args = [(agency_id, path, compact, ndjson) for agency_id in agency_ids]
+  if not workers or workers < 2 or len(args) < 2:
+    return [
+      export_agency(gtfs_feed.agency(agency_id), path=path, compact=compact,
+        ndjson=ndjson)
+      for agency_id in agency_ids
+    ]
+  _FEED = gtfs_feed
+  pool = multiprocessing.Pool(min(workers, len(args)))
+  try:
+    return pool.map(_export, args)
+  finally:
+    pool.close()
+    pool.join()
+    _FEED = None
+
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description='GTFS Info and JSON export')
   parser.add_argument('filename', help='GTFS File')
-  parser.add_argument('--debug', 
-    help='Show helpful debugging information', 
+  parser.add_argument('--debug',
+    help='Show helpful debugging information',
+    action='store_true')
+  parser.add_argument('--compact',
+    help='Write JSON without indentation',
+    action='store_true')
+  parser.add_argument('--ndjson',
+    help='Write newline-delimited GeoJSON features',
     action='store_true')
+  parser.add_argument('--workers',
+    help='Export agencies in parallel',
+    type=int)
+  parser.add_argument('--path', help='Output directory', default='.')
 
   args = parser.parse_args()
   g = feed.Feed(args.filename)
@@ -30,14 +145,12 @@ if __name__ == "__main__":
       for trip in agency.trips():
         print trip.data
 
-    # Export
-    outfile = 'export-%s.geojson'%agency.id()
+  # Export
+  for outfile in export(
+      g,
+      path=args.path,
+      compact=args.compact,
+      ndjson=args.ndjson,
+      workers=args.workers
+    ):
     print "Writing: %s"%outfile
-    with open(outfile, 'w') as f:
-      json.dump(
-        agency.json(), 
-        f, 
-        sort_keys=True, 
-        indent=4, 
-        separators=(',', ': ')
-      )
@@ -0,0 +1,293 @@
+"""Extract a subset of a feed by agency, date range, or bounding box.
+
+The subset is computed in streaming passes over the source tables, keeping
+only sets of ids in memory: routes of the selected agencies; services
+active in the date range; trips of those routes and services, and, with a
+bounding box, visiting at least one stop inside it. Trips are kept whole,
+so the stops, parent stations, shapes, and frequencies they reference are
+then added to the subset. With a date range, calendars are clipped to
+it. Each table is filtered as it is streamed into the new zip archive.
+Tables not listed in TABLES are skipped, and logged.
+"""
+import glob
+import os
+import zipfile
+
+import zipstream
+import servicecalendar
+
+# Tables written to the subset, in order: stops are collected while writing
+# stop_times, and fares while writing fare_rules.
+TABLES = [
+  'agency',
+  'routes',
+  'trips',
+  'stop_times',
+  'stops',
+  'calendar',
+  'calendar_dates',
+  'frequencies',
+  'shapes',
+  'transfers',
+  'fare_rules',
+  'fare_attributes',
+  'feed_info'
+]
+
+def in_bbox(entity, bbox):
+  """True if a stop is inside bbox, [min_lon, min_lat, max_lon, max_lat]."""
+  try:
+    lon, lat = float(entity.get('stop_lon')), float(entity.get('stop_lat'))
+  except (TypeError, ValueError):
+    return False
+  return bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]
+
+class Extractor(object):
+  """Compute and write the subset of a feed.
+
+  Filters are combined: trips must belong to one of agency_ids, run on
+  at least one date between start_date and end_date (inclusive), and stop
+  inside bbox. Any filter may be None.
+  """
+  def __init__(self, feed, agency_ids=None, start_date=None, end_date=None, bbox=None):
+    self.feed = feed
+    self.agency_ids = set(agency_ids) if agency_ids is not None else None
+    self.start_date = servicecalendar.parse_date(start_date) if start_date else None
+    self.end_date = servicecalendar.parse_date(end_date) if end_date else None
+    self.bbox = bbox
+    # The subset; filled in by select() and write().
+    self.trip_ids = set()
+    self.route_ids = set()
+    self.service_ids = set()
+    self.shape_ids = set()
+    self.stop_ids = set()
+    self.fare_ids = set()
+    self.selected_agency_ids = set()
+    # Source tables not written to the subset.
+    self.skipped = []
+
+  def _exists(self, table):
+    try:
+      self.feed._open(table).close()
+    except KeyError:
+      return False
+    return True
+
+  def _iterread(self, table):
+    """Read a table, or nothing if it is missing."""
+    if not self._exists(table):
+      return []
+    return self.feed.iterread(table)
+
+  def _source_tables(self):
+    """Names of the tables in the source path and zip archive."""
+    names = set()
+    if self.feed.path:
+      names |= set(os.path.basename(i) for i in glob.glob(os.path.join(self.feed.path, '*.txt')))
+    if self.feed.filename and os.path.exists(self.feed.filename):
+      zf = zipfile.ZipFile(self.feed.filename)
+      names |= set(os.path.basename(i) for i in zf.namelist() if i.endswith('.txt'))
+      zf.close()
+    return sorted(os.path.splitext(i)[0] for i in names)
+
+  def _default_agency_id(self):
+    # Routes may omit agency_id if the feed has one agency.
+    agencies = [i.get('agency_id') for i in self._iterread('agency')]
+    if len(agencies) == 1:
+      return agencies[0]
+
+  ##### Selection #####
+
+  def _routes(self):
+    """Route ids of the selected agencies, or None for all."""
+    if self.agency_ids is None:
+      return None
+    default_agency_id = self._default_agency_id()
+    return set(
+      route.id() for route in self._iterread('routes')
+      if (route.get('agency_id') or default_agency_id) in self.agency_ids
+    )
+
+  def _services(self):
+    """Service ids active in the date range, or None for all."""
+    if not (self.start_date or self.end_date):
+      return None
+    calendar = servicecalendar.ServiceCalendar(
+      self._iterread('calendar'),
+      self._iterread('calendar_dates')
+    )
+    ret = set()
+    for service_id in calendar.service_ids():
+      for date in calendar.service_dates(service_id):
+        if self.start_date and date < self.start_date:
+          continue
+        if self.end_date and date > self.end_date:
+          break
+        ret.add(service_id)
+        break
+    return ret
+
+  def _region(self):
+    """Stop ids inside the bounding box, or None for all."""
+    if self.bbox is None:
+      return None
+    return set(
+      stop.id() for stop in self._iterread('stops')
+      if in_bbox(stop, self.bbox)
+    )
+
+  def select(self):
+    """Compute the trips in the subset, and the routes, services, and shapes they use."""
+    route_ids = self._routes()
+    service_ids = self._services()
+    region = self._region()
+    trip_ids = set()
+    for trip in self._iterread('trips'):
+      if route_ids is not None and trip.get('route_id') not in route_ids:
+        continue
+      if service_ids is not None and trip.get('service_id') not in service_ids:
+        continue
+      trip_ids.add(trip.id())
+    if region is not None:
+      trip_ids = set(
+        stoptime.get('trip_id') for stoptime in self._iterread('stop_times')
+        if stoptime.get('trip_id') in trip_ids and stoptime.get('stop_id') in region
+      )
+    self.trip_ids = trip_ids
+    for trip in self._iterread('trips'):
+      if trip.id() in trip_ids:
+        self.route_ids.add(trip.get('route_id'))
+        self.service_ids.add(trip.get('service_id'))
+        if trip.get('shape_id'):
+          self.shape_ids.add(trip.get('shape_id'))
+    default_agency_id = self._default_agency_id()
+    for route in self._iterread('routes'):
+      if route.id() in self.route_ids:
+        self.selected_agency_ids.add(route.get('agency_id') or default_agency_id)
+    return self.trip_ids
+
+  ##### Filters #####
+
+  def _stoptimes(self):
+    # Collect stops while writing.
+    for stoptime in self._iterread('stop_times'):
+      if stoptime.get('trip_id') in self.trip_ids:
+        self.stop_ids.add(stoptime.get('stop_id'))
+        yield stoptime
+
+  def _stops(self):
+    # Add the parent stations of used stops; one level, as in GTFS.
+    for stop in self._iterread('stops'):
+      if stop.id() in self.stop_ids and stop.get('parent_station'):
+        self.stop_ids.add(stop.get('parent_station'))
+    for stop in self._iterread('stops'):
+      if stop.id() in self.stop_ids:
+        yield stop
+
+  def _fare_rules(self):
+    # Rules for kept routes, or for all routes; zones must be served.
+    zone_ids = set([None, ''])
+    for stop in self._iterread('stops'):
+      if stop.id() in self.stop_ids:
+        zone_ids.add(stop.get('zone_id'))
+    for rule in self._iterread('fare_rules'):
+      if rule.get('route_id') and rule.get('route_id') not in self.route_ids:
+        continue
+      if any(rule.get(i) not in zone_ids for i in ['origin_id', 'destination_id', 'contains_id']):
+        continue
+      self.fare_ids.add(rule.get('fare_id'))
+      yield rule
+
+  def _fare_attributes(self):
+    # Fares with kept rules, and fares without rules of kept agencies.
+    ruled = set(rule.get('fare_id') for rule in self._iterread('fare_rules'))
+    for fare in self._iterread('fare_attributes'):
+      fare_id = fare.get('fare_id')
+      if fare_id in self.fare_ids:
+        yield fare
+      elif fare_id not in ruled and \
+          (not fare.get('agency_id') or fare.get('agency_id') in self.selected_agency_ids):
+        yield fare
+
+  def _date(self, value):
+    return value.strftime('%Y%m%d')
+
+  def _calendar(self):
+    # Clip date ranges to the window; drop rows left empty.
+    for period in self._iterread('calendar'):
+      if period.get('service_id') not in self.service_ids:
+        continue
+      start, end = period.get('start_date'), period.get('end_date')
+      if self.start_date and start < self._date(self.start_date):
+        start = self._date(self.start_date)
+      if self.end_date and end > self._date(self.end_date):
+        end = self._date(self.end_date)
+      if start > end:
+        continue
+      period.set('start_date', start)
+      period.set('end_date', end)
+      yield period
+
+  def _calendar_dates(self):
+    # Exceptions inside the window.
+    for exception in self._iterread('calendar_dates'):
+      if exception.get('service_id') not in self.service_ids:
+        continue
+      date = exception.get('date')
+      if self.start_date and date < self._date(self.start_date):
+        continue
+      if self.end_date and date > self._date(self.end_date):
+        continue
+      yield exception
+
+  def filtered(self, table):
+    """Generate the rows of a table in the subset."""
+    read = self._iterread
+    if table == 'agency':
+      return (i for i in read(table) if i.get('agency_id') in self.selected_agency_ids)
+    elif table == 'routes':
+      return (i for i in read(table) if i.id() in self.route_ids)
+    elif table in ['trips', 'frequencies']:
+      return (i for i in read(table) if i.get('trip_id') in self.trip_ids)
+    elif table == 'stop_times':
+      return self._stoptimes()
+    elif table == 'stops':
+      return self._stops()
+    elif table == 'calendar':
+      return self._calendar()
+    elif table == 'calendar_dates':
+      return self._calendar_dates()
+    elif table == 'shapes':
+      return (i for i in read(table) if i.get('shape_id') in self.shape_ids)
+    elif table == 'transfers':
+      return (
+        i for i in read(table)
+        if i.get('from_stop_id') in self.stop_ids and i.get('to_stop_id') in self.stop_ids
+      )
+    elif table == 'fare_rules':
+      return self._fare_rules()
+    elif table == 'fare_attributes':
+      return self._fare_attributes()
+    return read(table)
+
+  ##### Output #####
+
+  def write(self, filename, compress=True):
+    """Select the subset and write it to a zip archive; return row counts by table."""
+    self.select()
+    counts = {}
+    self.skipped = [i for i in self._source_tables() if i not in TABLES]
+    for table in self.skipped:
+      self.feed.log('... skipping unknown table: %s'%table)
+    with zipstream.ZipWriter(filename, compress=compress) as zf:
+      for table in TABLES:
+        if not self._exists(table):
+          continue
+        self.feed.log('... extracting: %s'%table)
+        counts[table] = zf.write_entities(
+          '%s.txt'%table,
+          self.filtered(table),
+          columns=self.feed.header(table)
+        )
+    return counts
+
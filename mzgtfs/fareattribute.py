@@ -9,6 +9,7 @@ import validation
 
 class FareAttribute(entity.Entity):
   KEY = 'fare_id'
+  TABLE = 'fare_attributes'
   REQUIRED = [
     'fare_id',
     'price',
@@ -19,33 +20,20 @@ class FareAttribute(entity.Entity):
   OPTIONAL = [
     'transfer_duration'
   ]
-  
-  def validate(self, validator=None):
-    validator = super(FareAttribute, self).validate(validator)
+  RULES = [
     # Required
-    with validator(self):
-      assert self.get('fare_id'), "Required: fare_id"
-    with validator(self):
-      assert self.get('price'), "Required: price"
-    with validator(self):
-      assert validation.valid_float(self.get('price')), "Invalid price"
-    with validator(self):
-      assert self.get('currency_type'), "Required: currency_type"
-    with validator(self):
-      assert self.get('payment_method'), "Required: payment_method"
-    with validator(self):
-      assert validation.valid_bool(self.get('payment_method')), \
-        "Invalid payment_method"
-    with validator(self):
-      assert validation.valid_int(self.get('transfers'), vmin=0, vmax=2, empty=True), \
-        "Invalid transfers"
+    validation.Rule('fare_id', validation.required, "Required: fare_id"),
+    validation.Rule('price', validation.required, "Required: price"),
+    validation.Rule('price', validation.valid_float, "Invalid price"),
+    validation.Rule('currency_type', validation.required,
+      "Required: currency_type"),
+    validation.Rule('payment_method', validation.required,
+      "Required: payment_method"),
+    validation.Rule('payment_method', validation.valid_bool,
+      "Invalid payment_method"),
+    validation.Rule('transfers', validation.valid_int, "Invalid transfers",
+      vmin=0, vmax=2, empty=True),
     # Optional
-    with validator(self):
-      if self.get('transfer_duration'):
-        assert validation.valid_int(self.get('transfer_duration'), vmin=0), \
-          "Invalid transfer_duration"
-    return validator
-    
-  def validate_feed(self, validator=None):
-    validator = super(FareAttribute, self).validate_feed(validator)
-    return validator
\ No newline at end of file
+    validation.Rule('transfer_duration', validation.valid_int,
+      "Invalid transfer_duration", optional=True, vmin=0)
+  ]
@@ -9,6 +9,7 @@ import validation
 
 class FareRule(entity.Entity):
   KEY = 'fare_id'
+  TABLE = 'fare_rules'
   REQUIRED = [
     'fare_id'
   ]
@@ -18,28 +19,12 @@ class FareRule(entity.Entity):
     'destination_id',
     'contains_id'
   ]
-  
-  def validate(self, validator=None):
-    validator = super(FareRule, self).validate(validator)
+  RULES = [
     # Required
-    with validator(self):
-      assert self.get('fare_id'), "Required: fare_id"
-    return validator
-    
-  def validate_feed(self, validator=None):
-    validator = super(FareRule, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.fare(self.get('fare_id')), "Unknown fare_id"
-    with validator(self):
-      if self.get('route_id'):
-        assert self._feed.route(self.get('route_id')), "Unknown route_id"
-    with validator(self):
-      if self.get('origin_id'):
-        pass
-    with validator(self):
-      if self.get('destination_id'):
-        pass
-    with validator(self):
-      if self.get('contains_id'):
-        pass
-    return validator
\ No newline at end of file
+    validation.Rule('fare_id', validation.required, "Required: fare_id")
+  ]
+  FEED_RULES = [
+    validation.Reference('fare_id', 'fare_attributes', "Unknown fare_id"),
+    validation.Reference('route_id', 'routes', "Unknown route_id",
+      optional=True)
+  ]
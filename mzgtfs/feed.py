@@ -8,6 +8,7 @@ import tempfile
 import glob
 import subprocess
 import csv
+import hashlib
 
 try:
   import unicodecsv
@@ -17,6 +18,18 @@ except ImportError:
 import util
 import entities
 import validation
+import servicecalendar
+import timetable
+import widetime
+import frequency
+import departures
+import csa
+import raptor
+import stats
+import blocks
+import writer
+import zipstream
+import extract
 
 class Feed(object):
   """Read a GTFS feed."""
@@ -38,6 +51,45 @@ class Feed(object):
     'feed_info': entities.FeedInfo
   }
 
+  # Tables read by the relational checks (validate_feed) of each table.
+  DEPENDENCIES = {
+    'stops': ['stops'],
+    'trips': ['routes', 'calendar', 'stop_times'],
+    'stop_times': ['trips', 'stops'],
+    'calendar_dates': ['calendar'],
+    'fare_rules': ['fare_attributes', 'routes'],
+    'frequencies': ['trips'],
+    'transfers': ['stops']
+  }
+
+  # Validated tables, in order.
+  REQUIRED = [
+    'agency',
+    'stops',
+    'routes',
+    'trips',
+    'stop_times',
+    'calendar'
+  ]
+  OPTIONAL = [
+    'calendar_dates',
+    'fare_attributes',
+    'fare_rules',
+    'shapes',
+    'frequencies',
+    'transfers',
+    'feed_info'
+  ]
+
+  def __new__(cls, filename=None, *args, **kwargs):
+    # Open a columnar directory as a ColumnarFeed.
+    if cls is Feed and filename and \
+        os.path.isfile(os.path.join(filename, 'manifest.json')):
+      # Imported here, because columnar subclasses Feed.
+      import columnar
+      cls = columnar.ColumnarFeed
+    return super(Feed, cls).__new__(cls)
+
   def __init__(self, filename=None, path=None, debug=False):
     """Filename required."""
     self.filename = filename
@@ -47,6 +99,14 @@ class Feed(object):
     self.by_id = {}
     self._shapes = None
     self._zones = None
+    self._calendar = None
+    self._timetable = None
+    self._trip_index = None
+    self._departures = None
+    self._child_stops = None
+    self._connections = {}
+    self._raptor = {}
+    self._blocks = None
 
   def __repr__(self):
     return '<%s %s>'%(self.__class__.__name__, self.filename)
@@ -75,6 +135,32 @@ class Feed(object):
       raise KeyError("File not found in path or zip file: %s"%arcname)
     return f
 
+  def table_hash(self, table):
+    """Return a hash of the table contents, or None if it does not exist."""
+    try:
+      f = self._open(table)
+    except KeyError:
+      return None
+    h = hashlib.sha1()
+    for chunk in iter(lambda:f.read(2**20), ''):
+      h.update(chunk)
+    f.close()
+    return h.hexdigest()
+
+  def header(self, table):
+    """Return the column names of a GTFS table."""
+    f = self._open(table)
+    if unicodecsv:
+      data = unicodecsv.reader(f, encoding='utf-8-sig')
+    else:
+      data = csv.reader(f)
+    try:
+      header = data.next()
+    except StopIteration:
+      header = []
+    f.close()
+    return header
+
   def iterread(self, table):
     """Iteratively read data from a GTFS table. Returns namedtuples."""
     self.log('Reading: %s'%table)
@@ -92,7 +178,7 @@ class Feed(object):
       'EntityNamedTuple',
       map(str, header)
     )
-    for row in data:
+    for rownum, row in enumerate(data, 1):
       if len(row) == 0:
         continue
       # Get rid of extra spaces.
@@ -100,7 +186,7 @@ class Feed(object):
       # pad to length if necessary... :(
       if len(row) < headerlen:
         row += ['']*(headerlen-len(row))
-      yield cls.from_row(ent._make(row), self)
+      yield cls.from_row(ent._make(row), self, row=rownum)
     f.close()
 
   def read(self, table):
@@ -130,28 +216,41 @@ class Feed(object):
   def write(self, filename, entities, sortkey=None, columns=None):
     """Write entities out to filename in csv format.
 
+    entities may be a list, or a generator; rows are written as they
+    arrive. See writer.write_entities() for how columns are inferred, and
+    how output is sorted by sortkey with bounded memory.
+
     Note: this doesn't write directly into a Zip archive, because this behavior
     is difficult to achieve with Zip archives. Use make_zip() to create a new
     GTFS Zip archive.
     """
     if os.path.exists(filename):
       raise IOError('File exists: %s'%filename)
-    # Make sure we have all the entities loaded.
-    if sortkey:
-      entities = sorted(entities, key=lambda x:x[sortkey])
-    if not columns:
-      columns = set()
-      for entity in entities:
-        columns |= set(entity.keys())
-      columns = sorted(columns)
-    # Write the csv file
-    with open(filename, 'wb') as f:
-      writer = unicodecsv.writer(f) # , encoding='utf-8-sig'
-      writer.writerow(columns)
-      for entity in entities:
-        writer.writerow([entity.get(column) for column in columns])
-
-  def make_zip(self, filename, files=None, path=None, clone=None, compress=True):
+    # Only remove the file once it has been created.
+    f = open(filename, 'wb')
+    try:
+      with f:
+        return writer.write_entities(
+          f,
+          entities,
+          sortkey=sortkey,
+          columns=columns
+        )
+    except Exception:
+      # Do not leave a partial file.
+      os.unlink(filename)
+      raise
+
+  def make_zip(
+      self,
+      filename,
+      files=None,
+      path=None,
+      clone=None,
+      compress=True,
+      workers=None,
+      levels=None
+    ):
     """Create a Zip archive.
 
     Provide any of the following:
@@ -159,9 +258,15 @@ class Feed(object):
       path - A directory of .txt files
       clone - Copy any files from a zip archive not specified above
 
+    Options:
+      workers - Compress files in parallel, in chunks, with this many threads
+      levels - A dict of file name (e.g. 'stop_times.txt') to compression
+        level, 0 to 9; 0 stores the file uncompressed
+
     Duplicate files will be ignored. The 'files' argument will be used first,
     then files found in the specified 'path', then in the
-    specified 'clone' archive.
+    specified 'clone' archive. Files from the clone archive are copied
+    without recompressing them.
     """
     if filename and os.path.exists(filename):
       raise IOError('File exists: %s'%filename)
@@ -169,40 +274,105 @@ class Feed(object):
     arcnames = []
     if path and os.path.isdir(path):
       files += glob.glob(os.path.join(path, '*.txt'))
-    if compress:
-      compress_level = zipfile.ZIP_DEFLATED
-    else:
-      compress_level = zipfile.ZIP_STORED
 
     # Write files.
     self.log("Creating zip archive: %s"%filename)
-    zf = zipfile.ZipFile(filename, 'a', compression=compress_level)
-    for f in files:
+    levels = levels or {}
+    with zipstream.ZipWriter(filename, compress=compress) as zf:
+      add = []
+      for f in files:
+        base = os.path.basename(f)
+        if base in arcnames:
+          self.log('... skipping: %s'%f)
+        else:
+          self.log('... adding: %s'%f)
+          arcnames.append(base)
+          add.append((f, base))
+      if workers:
+        zf.write_parallel(add, workers=workers, levels=levels)
+      else:
+        for f, base in add:
+          zf.write(f, base, level=levels.get(base))
+
+      # Clone from existing zip archive.
+      if clone and os.path.exists(clone):
+        self._clone(zf, clone, arcnames, levels=levels)
+
+  def write_zip(self, filename, tables=None, clone=None, sortkeys=None, compress=True):
+    """Create a Zip archive, streaming each table into it.
+
+    tables is a dict of table name to entities, which may be generators;
+    each is written into the archive as its rows are produced, without
+    temporary files. Other tables are copied from the clone archive,
+    by default this feed's zip file, without recompressing them.
+    sortkeys is an optional dict of table name to sortkey.
+    """
+    if os.path.exists(filename):
+      raise IOError('File exists: %s'%filename)
+    tables = tables or {}
+    sortkeys = sortkeys or {}
+    if clone is None:
+      clone = self.filename
+    arcnames = []
+    self.log("Creating zip archive: %s"%filename)
+    with zipstream.ZipWriter(filename, compress=compress) as zf:
+      for table, data in sorted(tables.items()):
+        arcname = '%s.txt'%table
+        self.log('... writing: %s'%arcname)
+        arcnames.append(arcname)
+        zf.write_entities(arcname, data, sortkey=sortkeys.get(table))
+      if clone and os.path.exists(clone):
+        self._clone(zf, clone, arcnames)
+
+  def _clone(self, zf, clone, arcnames, levels=None):
+    zc = zipfile.ZipFile(clone)
+    for f in zc.namelist():
       base = os.path.basename(f)
-      if base in arcnames:
-        self.log('... skipping: %s'%f)
+      if os.path.splitext(base)[-1] != '.txt':
+        pass
+        # self.log('... skipping from clone: %s'%f)
+      elif base in arcnames:
+        self.log('... skipping from clone: %s'%f)
       else:
-        self.log('... adding: %s'%f)
+        self.log('... adding from clone: %s'%f)
         arcnames.append(base)
-        zf.write(f, base)
+        zf.clone(zc, f, base, level=(levels or {}).get(base))
+    zc.close()
+
+  def extract(
+      self,
+      filename,
+      agency_ids=None,
+      start_date=None,
+      end_date=None,
+      bbox=None,
+      compress=True
+    ):
+    """Write a subset of the feed to a new zip archive; return row counts by table.
 
-    # Clone from existing zip archive.
-    if clone and os.path.exists(clone):
-      zc = zipfile.ZipFile(clone)
-      for f in zc.namelist():
-        base = os.path.basename(f)
-        if os.path.splitext(base)[-1] != '.txt':
-          pass
-          # self.log('... skipping from clone: %s'%f)
-        elif base in arcnames:
-          self.log('... skipping from clone: %s'%f)
-        else:
-          self.log('... adding from clone: %s'%f)
-          arcnames.append(base)
-          with zc.open(f) as i:
-            data = i.read()
-          zf.writestr(base, data)
-    zf.close()
+    The subset contains the trips of agency_ids, running between start_date
+    and end_date, and stopping inside bbox ([min_lon, min_lat, max_lon,
+    max_lat]), with everything they reference. See extract.Extractor.
+    """
+    if os.path.exists(filename):
+      raise IOError('File exists: %s'%filename)
+    self.log("Extracting to zip archive: %s"%filename)
+    return extract.Extractor(
+      self,
+      agency_ids=agency_ids,
+      start_date=start_date,
+      end_date=end_date,
+      bbox=bbox
+    ).write(filename, compress=compress)
+
+  def write_columnar(self, path, tables=None):
+    """Write the feed to a columnar directory; return row counts by table.
+
+    Requires numpy. See columnar.write().
+    """
+    # Imported here, because columnar subclasses Feed.
+    import columnar
+    return columnar.write(self, path, tables=tables)
 
   def preload(self):
     # Load tables with primary key
@@ -228,6 +398,14 @@ class Feed(object):
       stoptime.add_parent(self.trip(stoptime.get('trip_id')))
       stoptime.add_child(self.stop(stoptime.get('stop_id')))
 
+  def read_children(self, entity):
+    """Return the children of an entity; see preload()."""
+    return set()
+
+  def read_parents(self, entity):
+    """Return the parents of an entity; see preload()."""
+    return set()
+
   ##### Keyed entities #####
 
   def _entities(self, table):
@@ -279,6 +457,143 @@ class Feed(object):
       return self._shapes[key]
     return self.shapes()[key]
 
+  ##### Schedule #####
+
+  def service_calendar(self):
+    """Return the ServiceCalendar for this feed."""
+    if self._calendar is None:
+      self.log("Generating service calendar...")
+      self._calendar = servicecalendar.ServiceCalendar.from_feed(self)
+    return self._calendar
+
+  def timetable(self):
+    """Return the Timetable of stop times for every trip."""
+    if self._timetable is None:
+      self.log("Generating timetable...")
+      self._timetable = timetable.Timetable.from_feed(self)
+    return self._timetable
+
+  def trips_on(self, date, start_time=None, end_time=None):
+    """Return the trips running on a date, sorted by first departure.
+
+    With start_time and/or end_time (seconds or HH:MM:SS), only trips
+    running in that window are returned.
+    """
+    if self._trip_index is None:
+      self._trip_index = timetable.TripIndex(self.timetable(), self.trips())
+    trip_ids = self._trip_index.trip_ids(
+      self.service_calendar().active_services(date),
+      start=widetime.to_seconds(start_time),
+      end=widetime.to_seconds(end_time)
+    )
+    return [self.trip(trip_id) for trip_id in trip_ids]
+
+  def frequency_trips(self, start_time=None, end_time=None):
+    """Generate a VirtualTrip for each departure in frequencies.txt.
+
+    Trips are expanded lazily, one frequency at a time. With start_time
+    and/or end_time (seconds or HH:MM:SS), only trips running in that
+    window are generated.
+    """
+    try:
+      self.header('frequencies')
+    except KeyError:
+      # frequencies.txt is optional.
+      return
+    start = widetime.to_seconds(start_time)
+    end = widetime.to_seconds(end_time)
+    tt = self.timetable()
+    for freq in self.iterread('frequencies'):
+      times = tt.get(freq.get('trip_id'))
+      if not times:
+        continue
+      first = timetable.first_departure(times)
+      last = timetable.last_arrival(times)
+      if first is None or last is None:
+        continue
+      trip = self.trip(freq.get('trip_id'))
+      for departure in freq.departures(last - first, start=start, end=end):
+        yield frequency.VirtualTrip(trip, times, departure)
+
+  def departures(self, stop_id, date, after=None, limit=None):
+    """Return the next Departures from a stop on a date.
+
+    after is seconds or HH:MM:SS. A station includes departures from its
+    child stops. Includes frequency-based trips and trips running past
+    midnight from the previous day.
+    """
+    if self._departures is None:
+      self.log("Generating departure board...")
+      try:
+        frequencies = self.frequencies()
+      except KeyError:
+        frequencies = []
+      self._departures = departures.DepartureBoard(
+        self.timetable(),
+        self.trips(),
+        frequencies
+      )
+    if self._child_stops is None:
+      # Child stops of each station.
+      self._child_stops = collections.defaultdict(list)
+      for stop in self.stops():
+        if stop.get('parent_station'):
+          self._child_stops[stop.get('parent_station')].append(stop.id())
+    stop_ids = [stop_id] + self._child_stops.get(stop_id, [])
+    return self._departures.departures(
+      stop_ids,
+      self.service_calendar(),
+      date,
+      after=widetime.to_seconds(after) or 0,
+      limit=limit
+    )
+
+  def connections(self, date):
+    """Return the ConnectionScan planner for a date. Cached for each date."""
+    date = servicecalendar.parse_date(date)
+    if date not in self._connections:
+      self.log("Generating connections: %s"%date)
+      self._connections[date] = csa.ConnectionScan.from_feed(self, date)
+    return self._connections[date]
+
+  def journey(self, origin, destination, date, departure):
+    """Return the earliest arriving journey as a list of Legs, or None."""
+    return self.connections(date).journey(origin, destination, departure)
+
+  def raptor(self, date):
+    """Return the RAPTOR router for a date. Cached for each date."""
+    date = servicecalendar.parse_date(date)
+    if date not in self._raptor:
+      self.log("Generating route patterns: %s"%date)
+      self._raptor[date] = raptor.Raptor.from_feed(self, date)
+    return self._raptor[date]
+
+  def journeys(self, origin, destination, date, start, end=None, max_transfers=4):
+    """Return Pareto-optimal journeys over arrival time and transfers.
+
+    With end, returns the journeys departing between start and end that
+    are Pareto-optimal over departure, arrival, and transfers.
+    """
+    router = self.raptor(date)
+    if end is None:
+      return router.journeys(origin, destination, start, max_transfers)
+    return router.range_journeys(origin, destination, start, end, max_transfers)
+
+  def service_stats(self, date, bin_size=3600):
+    """Return ServiceStats for the trips running on a date."""
+    return stats.ServiceStats.from_feed(self, date, bin_size=bin_size)
+
+  def blocks(self):
+    """Return the BlockIndex of trips by service and block_id."""
+    if self._blocks is None:
+      self.log("Generating block index...")
+      self._blocks = blocks.BlockIndex.from_feed(self)
+    return self._blocks
+
+  def fleet_size(self, date):
+    """Estimate the peak number of vehicles in service on a date."""
+    return self.blocks().fleet_size(self.service_calendar().active_services(date))
+
   ##### Other methods #####
 
   def dates(self):
@@ -290,54 +605,88 @@ class Feed(object):
 
   ##### Validation #####
 
-  def validate(self, validator=None, skip_relations=False):
+  def validate(self, validator=None, skip_relations=False, state=None):
     """Validate a GTFS
 
     :param validator: a ValidationReport
     :param (bool) skip_relations: skip validation of relations between entities (e.g. stop_times to stops)
+    :param state: a ValidationState from a previous run; only changed tables are re-checked
     :return:
     """
     validator = validation.make_validator(validator)
-    self.log('Loading...')
-    self.preload()
-    # required
-    required = [
-      'agency',
-      'stops',
-      'routes',
-      'trips',
-      'stop_times',
-      'calendar'
-    ]
-    for f in required:
-      self.log("Validating required file: %s"%f)
-      data = self.read(f)
-      for i in data:
-        i.validate(validator=validator)
-        if skip_relations is False:
-          i.validate_feed(validator=validator)
-    # optional
-    optional = [
-      'calendar_dates',
-      'fare_attributes',
-      'fare_rules',
-      'shapes',
-      'frequencies',
-      'transfers',
-      'feed_info'
-    ]
-    for f in optional:
-      self.log("Validating optional file: %s"%f)
-      try:
-        data = self.read(f)
-      except KeyError, e:
-        data = []
-      for i in data:
-        i.validate(validator=validator)
-        if skip_relations is False:
-          i.validate_feed(validator=validator)
+    tables = self.REQUIRED + self.OPTIONAL
+    hashes = {}
+    check = set(tables)
+    if state is not None:
+      hashes = dict((table, self.table_hash(table)) for table in tables)
+      check = self._changed_tables(state, hashes, skip_relations, validator)
+    # Results are committed to the state only if the run completes.
+    pending = {}
+    if check:
+      self.log('Loading...')
+      self.preload()
+    try:
+      for f in tables:
+        if f not in check:
+          self.log("Reusing results: %s"%f)
+          for record in state.results(f):
+            validator.add(validation.from_finding(record))
+          continue
+        if f in self.REQUIRED:
+          self.log("Validating required file: %s"%f)
+          data = self.read(f)
+        else:
+          self.log("Validating optional file: %s"%f)
+          try:
+            data = self.read(f)
+          except KeyError, e:
+            data = []
+        results = []
+        if state is not None:
+          validator.listeners.append(results.append)
+        try:
+          self._validate_table(validator, data, skip_relations)
+        finally:
+          if state is not None:
+            validator.listeners.remove(results.append)
+        if state is not None:
+          pending[f] = map(validation.finding, results)
+    except validation.ValidationAborted, e:
+      # Error budget exceeded.
+      self.log("Validation aborted: %s"%e)
+      return validator
+    if state is not None:
+      state.options = self._state_options(validator, skip_relations)
+      for f, results in pending.items():
+        state.update(f, hashes[f], results)
     return validator
 
+  def _state_options(self, validator, skip_relations):
+    options = validation.make_validator(validator).options()
+    options['skip_relations'] = skip_relations
+    return options
+
+  def _changed_tables(self, state, hashes, skip_relations=False, validator=None):
+    """Return the tables that must be re-checked, given a previous state."""
+    if state.options != self._state_options(validator, skip_relations):
+      return set(hashes)
+    changed = set(
+      table for table, value in hashes.items()
+      if value != state.hash(table)
+    )
+    check = set(changed)
+    if not skip_relations:
+      for table, depends in self.DEPENDENCIES.items():
+        if changed & set(depends):
+          check.add(table)
+    return check
+
+  def _validate_table(self, validator, data, skip_relations=False):
+    for i in validator.sample(data):
+      i.validate(validator=validator)
+      if skip_relations is False:
+        i.validate_feed(validator=validator)
+
   def validate_feedvalidator(
     self,
     validator=None,
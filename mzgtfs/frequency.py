@@ -1,13 +1,24 @@
 """GTFS Frequency."""
 import datetime
+import collections
 
 import entity
 import geom
 import util
 import widetime
 import validation
+import stoptime
+import timetable
+
+def _ordered_times(frequency):
+  try:
+    return frequency.end() >= frequency.start()
+  except (ValueError, AssertionError):
+    # Reported as invalid start_time or end_time.
+    return True
 
 class Frequency(entity.Entity):
+  TABLE = 'frequencies'
   REQUIRED = [
     'trip_id',
     'start_time',
@@ -17,6 +28,26 @@ class Frequency(entity.Entity):
   OPTIONAL = [
     'exact_times'
   ]
+  RULES = [
+    # Required
+    validation.Rule('trip_id', validation.required, "Required: trip_id"),
+    validation.Rule('start_time', validation.required, "Required: start_time"),
+    validation.Rule('end_time', validation.required, "Required: end_time"),
+    validation.Rule('start_time', validation.valid_widetime,
+      "Invalid start_time"),
+    validation.Rule('end_time', validation.valid_widetime, "Invalid end_time"),
+    validation.Rule(None, _ordered_times,
+      "Invalid end_time, must at least start_date",
+      entity=True, name='start_time:end_time'),
+    validation.Rule('headway_secs', validation.valid_int,
+      "Invalid headway_secs", vmin=1),
+    # Optional
+    validation.Rule('exact_times', validation.valid_bool,
+      "Invalid exact_times", optional=True, empty=True)
+  ]
+  FEED_RULES = [
+    validation.Reference('trip_id', 'trips', "Unknown trip_id")
+  ]
 
   def start(self):
     return widetime.WideTime.from_string(self.get('start_time'))
@@ -24,36 +55,120 @@ class Frequency(entity.Entity):
   def end(self):
     return widetime.WideTime.from_string(self.get('end_time'))
 
-  def validate(self, validator=None):
-    validator = super(Frequency, self).validate(validator)
-    # Required
-    with validator(self):
-      assert self.get('trip_id'), "Required: trip_id"
-    with validator(self):
-      assert self.get('start_time'), "Required: start_time"
-    with validator(self):
-      assert self.get('end_time'), "Required: end_time"
-    with validator(self):
-      assert validation.valid_widetime(self.get('start_time')), \
-        "Invalid start_time"
-    with validator(self):
-      assert validation.valid_widetime(self.get('end_time')), \
-        "Invalid end_time"
-    with validator(self):
-      assert self.end() >= self.start(), \
-        "Invalid end_time, must at least start_date"
-    with validator(self):
-      assert validation.valid_int(self.get('headway_secs'), vmin=1), \
-        "Invalid headway_secs"
-    # Optional
-    with validator(self):
-      if self.get('exact_times'):
-        assert validation.valid_bool(self.get('exact_times'), empty=True), \
-          "Invalid exact_times"
-    return validator
-
-  def validate_feed(self, validator=None):
-    validator = super(Frequency, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.trip(self.get('trip_id')), "Unknown trip_id"
-    return validator
+  def headway(self):
+    return int(self.get('headway_secs'))
+
+  def exact_times(self):
+    return self.get('exact_times') in ('1', 1)
+
+  def departures(self, duration=0, start=None, end=None):
+    """Departure times, in seconds, of the trips run by this frequency.
+
+    Trips depart every headway_secs from start_time, up to but not
+    including end_time. With start and/or end, only trips running in that
+    window are included; duration is the running time of a trip.
+    """
+    first, last, headway = int(self.start()), int(self.end()), self.headway()
+    if start is not None and start - duration > first:
+      # Skip trips that have already finished at start.
+      first += -(-(start - duration - first) // headway) * headway
+    if end is not None:
+      last = min(last, end + 1)
+    return xrange(first, max(first, last), headway)
+
+class VirtualTrip(object):
+  """One departure of a frequency-based trip.
+
+  The stop times of the template trip are shifted to depart at
+  departure. Nothing is copied until stop_times() is called.
+  """
+  __slots__ = ['trip', 'times', 'departure', 'shift']
+
+  def __init__(self, trip, times, departure):
+    """Trip entity, its timetable.TripTimes, and departure in seconds."""
+    self.trip = trip
+    self.times = times
+    self.departure = departure
+    self.shift = departure - timetable.first_departure(times)
+
+  def __repr__(self):
+    return '<%s %s>'%(self.__class__.__name__, self.id())
+
+  def id(self):
+    return '%s@%s'%(self.trip.id(), widetime.WideTime.from_seconds(self.departure))
+
+  def start(self):
+    return widetime.WideTime.from_seconds(self.departure)
+
+  def end(self):
+    return widetime.WideTime.from_seconds(
+      timetable.last_arrival(self.times) + self.shift
+    )
+
+  def _shifted(self, times):
+    return [t + self.shift if t >= 0 else None for t in times]
+
+  def arrivals(self):
+    """Arrival times in seconds; None where the template has no time."""
+    return self._shifted(self.times.arrivals)
+
+  def departures(self):
+    """Departure times in seconds; None where the template has no time."""
+    return self._shifted(self.times.departures)
+
+  def stop_times(self):
+    """Generate StopTimes for this departure.
+
+    Only trip_id, stop_id, stop_sequence, and times are set.
+    """
+    trip_id = self.trip.id()
+    for stop_id, arrive, depart, sequence in zip(
+        self.times.stops,
+        self.arrivals(),
+        self.departures(),
+        self.times.sequences
+      ):
+      yield stoptime.StopTime(
+        trip_id=trip_id,
+        stop_id=stop_id,
+        stop_sequence=str(sequence),
+        arrival_time=_format(arrive),
+        departure_time=_format(depart)
+      )
+
+def timed_trips(tt, trips, frequencies=None):
+  """Generate (trip, trip_id, stops), expanding frequency-based trips.
+
+  stops is a list of (stop_id, arrival, departure) in seconds, with only
+  the stops that have both times. Frequency-based trips are expanded into
+  a trip for each departure, with VirtualTrip ids.
+  """
+  expand = collections.defaultdict(list)
+  for freq in (frequencies or []):
+    expand[freq.get('trip_id')].append(freq)
+  for trip in trips:
+    times = tt.get(trip.id())
+    if not times:
+      continue
+    if trip.id() in expand:
+      for freq in expand[trip.id()]:
+        for departure in freq.departures():
+          virtual = VirtualTrip(trip, times, departure)
+          yield trip, virtual.id(), [
+            (stop_id, arrive, depart)
+            for stop_id, arrive, depart
+            in zip(times.stops, virtual.arrivals(), virtual.departures())
+            if arrive is not None and depart is not None
+          ]
+    else:
+      yield trip, trip.id(), [
+        (stop_id, arrive, depart)
+        for stop_id, arrive, depart
+        in zip(times.stops, times.arrivals, times.departures)
+        if arrive >= 0 and depart >= 0
+      ]
+
+def _format(value):
+  if value is None:
+    return ''
+  return str(widetime.WideTime.from_seconds(value))
@@ -0,0 +1,340 @@
+"""Merge several feeds into one archive, renaming colliding ids.
+
+Merging takes two passes over each feed. The first scans the ids defined
+by each feed, and hashes of its stops and service calendars; feeds can be
+scanned in parallel, in separate processes. Ids defined by more than one
+feed are then prefixed, e.g. 'bart:' + trip_id, in every feed defining
+them. Stops with identical rows, and services with identical calendars,
+are kept once: later copies are dropped, and references to them rewritten.
+A stop whose zone_id or parent_station is renamed differently in each
+feed is kept in each, so fare rules and stations still match.
+The second pass streams each table of every feed, in order, into the new
+archive, rewriting ids as rows are read; no feed is loaded in memory.
+"""
+import argparse
+import collections
+import hashlib
+import multiprocessing
+import os
+
+import feed
+import zipstream
+
+# Tables written to the merged archive, in order.
+TABLES = [
+  'agency',
+  'routes',
+  'trips',
+  'stop_times',
+  'stops',
+  'calendar',
+  'calendar_dates',
+  'frequencies',
+  'shapes',
+  'transfers',
+  'fare_attributes',
+  'fare_rules',
+  'feed_info'
+]
+
+# Id columns of each table, and the namespace of each.
+COLUMNS = {
+  'agency': [('agency_id', 'agency')],
+  'routes': [('route_id', 'route'), ('agency_id', 'agency')],
+  'trips': [
+    ('trip_id', 'trip'),
+    ('route_id', 'route'),
+    ('service_id', 'service'),
+    ('shape_id', 'shape'),
+    ('block_id', 'block')
+  ],
+  'stop_times': [('trip_id', 'trip'), ('stop_id', 'stop')],
+  'stops': [('stop_id', 'stop'), ('parent_station', 'stop'), ('zone_id', 'zone')],
+  'calendar': [('service_id', 'service')],
+  'calendar_dates': [('service_id', 'service')],
+  'frequencies': [('trip_id', 'trip')],
+  'shapes': [('shape_id', 'shape')],
+  'transfers': [('from_stop_id', 'stop'), ('to_stop_id', 'stop')],
+  'fare_attributes': [('fare_id', 'fare'), ('agency_id', 'agency')],
+  'fare_rules': [
+    ('fare_id', 'fare'),
+    ('route_id', 'route'),
+    ('origin_id', 'zone'),
+    ('destination_id', 'zone'),
+    ('contains_id', 'zone')
+  ],
+  'feed_info': []
+}
+
+# Tables with rows dropped as duplicates, by the id in the given column.
+DEDUPLICATE = {
+  'stops': ('stop_id', 'stop'),
+  'calendar': ('service_id', 'service'),
+  'calendar_dates': ('service_id', 'service')
+}
+
+def _iterread(gtfs_feed, table):
+  try:
+    gtfs_feed.header(table)
+  except KeyError:
+    return []
+  return gtfs_feed.iterread(table)
+
+def _hash(values):
+  return hashlib.sha1(repr(values)).hexdigest()
+
+def default_agency_id(gtfs_feed, name):
+  """The agency_id for rows without one, if the feed has one agency.
+
+  Routes may omit agency_id in a feed with one agency; once merged, the
+  feed has many. If that agency has no agency_id either, it is given name.
+  """
+  agencies = list(_iterread(gtfs_feed, 'agency'))
+  if len(agencies) == 1:
+    return agencies[0].get('agency_id') or name
+
+def scan(gtfs_feed, name):
+  """Return the ids defined by a feed, by namespace.
+
+  Each namespace is a dict of id to a hash of its contents, or None if it
+  is not compared. Stop hashes include the stop_id, so only identical
+  rows match, and are paired with the zone_id and parent_station; service
+  hashes exclude the service_id.
+  """
+  ids = collections.defaultdict(dict)
+  agency_id = default_agency_id(gtfs_feed, name)
+  for agency in _iterread(gtfs_feed, 'agency'):
+    ids['agency'][agency.get('agency_id') or agency_id] = None
+  for route in _iterread(gtfs_feed, 'routes'):
+    ids['route'][route.get('route_id')] = None
+  for trip in _iterread(gtfs_feed, 'trips'):
+    ids['trip'][trip.get('trip_id')] = None
+    if trip.get('block_id'):
+      ids['block'][trip.get('block_id')] = None
+  for stop in _iterread(gtfs_feed, 'stops'):
+    ids['stop'][stop.get('stop_id')] = (
+      _hash(sorted((k, stop.get(k)) for k in stop.keys() if stop.get(k))),
+      stop.get('zone_id'),
+      stop.get('parent_station')
+    )
+    if stop.get('zone_id'):
+      ids['zone'][stop.get('zone_id')] = None
+  for shape in _iterread(gtfs_feed, 'shapes'):
+    ids['shape'][shape.get('shape_id')] = None
+  for fare in _iterread(gtfs_feed, 'fare_attributes'):
+    ids['fare'][fare.get('fare_id')] = None
+  # Services: the calendar row and sorted exceptions.
+  services = collections.defaultdict(list)
+  for period in _iterread(gtfs_feed, 'calendar'):
+    services[period.get('service_id')].append(sorted(
+      (k, period.get(k)) for k in period.keys() if k != 'service_id'
+    ))
+  exceptions = collections.defaultdict(list)
+  for date in _iterread(gtfs_feed, 'calendar_dates'):
+    exceptions[date.get('service_id')].append((date.get('date'), date.get('exception_type')))
+  for service_id in set(services) | set(exceptions):
+    ids['service'][service_id] = _hash((
+      services.get(service_id),
+      sorted(exceptions.get(service_id, []))
+    ))
+  return dict(ids)
+
+def _scan(args):
+  # Scan in a worker process.
+  filename, path, name = args
+  return scan(feed.Feed(filename, path=path), name)
+
+def _resolve(ns, values, prefixes, renames, duplicates, distinct=()):
+  # Rename the ids of one namespace; return the (feed, id, (feed, id))
+  # of each row dropped as a duplicate. Ids in distinct are not dropped.
+  first = {}
+  owners = collections.defaultdict(list)
+  aliases = []
+  for i, ids in enumerate(values):
+    renames[i][ns] = {}
+    duplicates[i][ns] = set()
+    for key, value in ids.items():
+      if value is not None and (i, key) not in distinct:
+        if value in first:
+          aliases.append((i, key, first[value]))
+          continue
+        first[value] = (i, key)
+      owners[key].append(i)
+  for key, feeds in owners.items():
+    if len(feeds) > 1:
+      for i in feeds:
+        renames[i][ns][key] = prefixes[i] + key
+  for i, key, (j, original) in aliases:
+    new = renames[j][ns].get(original, original)
+    if new != key:
+      renames[i][ns][key] = new
+    duplicates[i][ns].add(key)
+  return aliases
+
+def _references(value, renames):
+  # The zone_id and parent_station of a stop, once renamed.
+  value, zone_id, parent_station = value
+  return (
+    renames['zone'].get(zone_id, zone_id),
+    renames['stop'].get(parent_station, parent_station)
+  )
+
+def resolve(scans, prefixes):
+  """Return, for each feed, the renamed ids and the duplicate ids.
+
+  renames is a dict of namespace to {old id: new id}; duplicates is a
+  dict of namespace to the set of ids whose rows are dropped. A stop is
+  only dropped if its zone_id and parent_station are renamed the same
+  way in both feeds, so the stop that is kept has the references of both.
+  """
+  renames = [collections.defaultdict(dict) for i in scans]
+  duplicates = [collections.defaultdict(set) for i in scans]
+  namespaces = set(ns for ids in scans for ns in ids)
+  for ns in namespaces - set(['stop']):
+    _resolve(ns, [ids.get(ns, {}) for ids in scans], prefixes, renames, duplicates)
+  # Keeping a stop as a duplicate can change how its parent_station is
+  # renamed, so repeat until every dropped stop has the same references.
+  values = [ids.get('stop', {}) for ids in scans]
+  distinct = set()
+  while True:
+    aliases = _resolve('stop', values, prefixes, renames, duplicates, distinct)
+    rejected = [
+      (i, key) for i, key, (j, original) in aliases
+      if _references(values[i][key], renames[i]) != _references(values[j][original], renames[j])
+    ]
+    if not rejected:
+      break
+    distinct.update(rejected)
+  return renames, duplicates
+
+class Merger(object):
+  """Merge feeds into one archive.
+
+  prefixes is a list of the id prefix for each feed; by default, the name
+  of its file or directory, followed by ':'. An agency without an
+  agency_id is given the prefix, without the ':'. With workers, feeds are
+  scanned in that many processes.
+  """
+  def __init__(self, feeds, prefixes=None, workers=None):
+    self.feeds = feeds
+    self.names = []
+    for i, gtfs_feed in enumerate(feeds):
+      name = os.path.splitext(os.path.basename(
+        (gtfs_feed.filename or gtfs_feed.path or '').rstrip(os.sep)
+      ))[0] or str(i)
+      if name in self.names:
+        name = '%s%s'%(name, i)
+      self.names.append(name)
+    if prefixes is None:
+      prefixes = ['%s:'%name for name in self.names]
+    else:
+      self.names = [i.rstrip(':_-') or name for i, name in zip(prefixes, self.names)]
+    if len(set(prefixes)) != len(prefixes):
+      raise ValueError('Prefixes must be unique: %s'%prefixes)
+    self.prefixes = prefixes
+    self.workers = workers
+    self.renames = None
+    self.duplicates = None
+
+  def scan(self):
+    """Scan each feed, and work out the ids to rename and rows to drop."""
+    args = [
+      (i.filename, i.path, name)
+      for i, name in zip(self.feeds, self.names)
+    ]
+    if self.workers and self.workers > 1 and len(args) > 1:
+      pool = multiprocessing.Pool(min(self.workers, len(args)))
+      try:
+        scans = pool.map(_scan, args)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      scans = [
+        scan(gtfs_feed, name)
+        for gtfs_feed, name in zip(self.feeds, self.names)
+      ]
+    self.renames, self.duplicates = resolve(scans, self.prefixes)
+
+  def rows(self, i, table):
+    """Generate the rows of a table of feed i, with ids rewritten."""
+    gtfs_feed = self.feeds[i]
+    renames = self.renames[i]
+    columns = COLUMNS.get(table, [])
+    agency_id = None
+    if table in ['agency', 'routes', 'fare_attributes']:
+      agency_id = default_agency_id(gtfs_feed, self.names[i])
+    dedup_column, dedup_ns = DEDUPLICATE.get(table, (None, None))
+    dropped = self.duplicates[i].get(dedup_ns, set())
+    for entity in _iterread(gtfs_feed, table):
+      if dedup_column and entity.get(dedup_column) in dropped:
+        # calendar_dates rows are dropped with their service.
+        continue
+      if agency_id and not entity.get('agency_id'):
+        entity.set('agency_id', agency_id)
+      for column, ns in columns:
+        value = entity.get(column)
+        if value and value in renames.get(ns, ()):
+          entity.set(column, renames[ns][value])
+      yield entity
+
+  def _header(self, i, table):
+    try:
+      return self.feeds[i].header(table)
+    except KeyError:
+      return []
+
+  def _columns(self, table):
+    # The union of the columns of each feed, in order.
+    columns = []
+    for i in range(len(self.feeds)):
+      columns += [j for j in self._header(i, table) if j not in columns]
+    return columns
+
+  def write(self, filename, compress=True):
+    """Write the merged archive; return row counts by table."""
+    if self.renames is None:
+      self.scan()
+    counts = {}
+    with zipstream.ZipWriter(filename, compress=compress) as zf:
+      for table in TABLES:
+        columns = self._columns(table)
+        if not columns:
+          continue
+        feeds = [i for i in range(len(self.feeds)) if self._header(i, table)]
+        if table == 'feed_info':
+          # One publisher: the first feed's.
+          feeds = feeds[:1]
+        counts[table] = zf.write_entities(
+          '%s.txt'%table,
+          (row for i in feeds for row in self.rows(i, table)),
+          columns=columns
+        )
+    return counts
+
+def merge(filename, feeds, prefixes=None, workers=None, compress=True):
+  """Merge feeds into a new zip archive; return row counts by table."""
+  if os.path.exists(filename):
+    raise IOError('File exists: %s'%filename)
+  return Merger(feeds, prefixes=prefixes, workers=workers).write(
+    filename,
+    compress=compress
+  )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Merge GTFS feeds.')
+  parser.add_argument('output', help='Output GTFS zip file')
+  parser.add_argument('filenames', nargs='+', help='GTFS files')
+  parser.add_argument('--prefix', action='append', dest='prefixes',
+    help='Id prefix for each feed, in order')
+  parser.add_argument('--workers', type=int, help='Scan feeds in parallel')
+  args = parser.parse_args()
+  counts = merge(
+    args.output,
+    [feed.Feed(i) for i in args.filenames],
+    prefixes=args.prefixes,
+    workers=args.workers
+  )
+  for table in TABLES:
+    if table in counts:
+      print "%s: %s"%(table, counts[table])
@@ -0,0 +1,321 @@
+"""RAPTOR round-based router, for journeys trading off arrival and transfers."""
+import array
+import bisect
+import collections
+
+import widetime
+import frequency
+import csa
+
+INFINITY = csa.INFINITY
+
+class Pattern(object):
+  """Trips visiting the same stops in the same order, without overtaking.
+
+  Times are stored by stop position, then trip: the departures of all
+  trips from one stop are a sorted slice of the departures array.
+  """
+  __slots__ = ['stops', 'trip_ids', 'arrivals', 'departures']
+
+  def __init__(self, stops, trips):
+    """Stop indexes, and (trip_id, arrivals, departures) sorted by departure."""
+    self.stops = array.array('i', stops)
+    self.trip_ids = tuple(i[0] for i in trips)
+    self.arrivals = array.array('i')
+    self.departures = array.array('i')
+    for pos in range(len(stops)):
+      self.arrivals.extend(i[1][pos] for i in trips)
+      self.departures.extend(i[2][pos] for i in trips)
+
+  def __len__(self):
+    return len(self.trip_ids)
+
+  def arrival(self, pos, trip):
+    return self.arrivals[pos * len(self.trip_ids) + trip]
+
+  def departure(self, pos, trip):
+    return self.departures[pos * len(self.trip_ids) + trip]
+
+  def earliest_trip(self, pos, time, before=None):
+    """Index of the first trip departing pos at or after time, or None.
+
+    Only trips before the trip index 'before' are considered.
+    """
+    n = len(self.trip_ids)
+    hi = pos * n + (n if before is None else before)
+    i = bisect.bisect_left(self.departures, time, pos * n, hi)
+    if i < hi:
+      return i - pos * n
+
+def _overtakes(a, b):
+  # True unless trip b is entirely at or after trip a.
+  return any(y < x for x, y in zip(a[1], b[1])) or \
+    any(y < x for x, y in zip(a[2], b[2]))
+
+class Raptor(object):
+  """Round-based public transit routing over the trips of one service date.
+
+  Round k finds the earliest arrival at each stop using k trips, scanning
+  each route pattern once from the earliest stop improved in the previous
+  round. The arrival at the destination in each round gives the Pareto
+  set of journeys over arrival time and number of transfers.
+
+  Range queries run once for each departure from the origin in a window,
+  latest first, keeping the arrival labels between runs, so each run only
+  explores journeys improved by leaving earlier.
+
+  Transfers are read with csa.read_transfers().
+  """
+  def __init__(self, tt, trips, frequencies=None, transfers=None):
+    """Build from a Timetable, the active Trips, Frequencies, and Transfers."""
+    self.stop_ids = []
+    self._stops = {}
+    self.patterns = []
+    # Stop index -> [(pattern index, stop position)]
+    self.stop_patterns = collections.defaultdict(list)
+    groups = collections.defaultdict(list)
+    for _, trip_id, stops in frequency.timed_trips(tt, trips, frequencies):
+      if len(stops) < 2:
+        continue
+      key = tuple(i[0] for i in stops)
+      groups[key].append((
+        trip_id,
+        [i[1] for i in stops],
+        [i[2] for i in stops]
+      ))
+    for key, group in sorted(groups.items()):
+      group.sort(key=lambda x:(x[2][0], x[0]))
+      # Split into patterns where no trip overtakes another.
+      split = []
+      for trip in group:
+        for pattern_trips in split:
+          if not _overtakes(pattern_trips[-1], trip):
+            pattern_trips.append(trip)
+            break
+        else:
+          split.append([trip])
+      stops = [self._stop(stop_id) for stop_id in key]
+      for pattern_trips in split:
+        for pos, stop in enumerate(stops):
+          self.stop_patterns[stop].append((len(self.patterns), pos))
+        self.patterns.append(Pattern(stops, pattern_trips))
+    # Transfers.
+    change_times, footpaths = csa.read_transfers(transfers)
+    self.change_times = dict(
+      (self._stops[stop_id], duration)
+      for stop_id, duration in change_times.items()
+      if stop_id in self._stops
+    )
+    self.footpaths = collections.defaultdict(list)
+    for from_stop_id, walks in footpaths.items():
+      for to_stop_id, duration in walks:
+        if from_stop_id in self._stops and to_stop_id in self._stops:
+          self.footpaths[self._stops[from_stop_id]].append(
+            (self._stops[to_stop_id], duration)
+          )
+
+  @classmethod
+  def from_feed(cls, feed, date):
+    """Build for the services active on a date."""
+    return cls(*csa.feed_inputs(feed, date))
+
+  def _stop(self, stop_id):
+    try:
+      return self._stops[stop_id]
+    except KeyError:
+      self._stops[stop_id] = len(self.stop_ids)
+      self.stop_ids.append(stop_id)
+      return self._stops[stop_id]
+
+  def _state(self, rounds):
+    """Arrival, boarding, and parent labels for each round."""
+    n = len(self.stop_ids)
+    return (
+      [[INFINITY] * n for i in range(rounds + 1)],
+      [[INFINITY] * n for i in range(rounds + 1)],
+      [[None] * n for i in range(rounds + 1)]
+    )
+
+  def _run(self, state, origin, departure, target):
+    """One RAPTOR query from origin at departure, updating state."""
+    tau, ready, parents = state
+    n = len(self.stop_ids)
+    change_times, footpaths = self.change_times, self.footpaths
+    # Round 0: the origin, and walking from it.
+    marked = set()
+    if departure < tau[0][origin]:
+      tau[0][origin] = ready[0][origin] = departure
+      parents[0][origin] = None
+      marked.add(origin)
+    for stop, duration in footpaths.get(origin, ()):
+      if departure + duration < tau[0][stop]:
+        tau[0][stop] = ready[0][stop] = departure + duration
+        parents[0][stop] = ('walk', origin)
+        marked.add(stop)
+    for k in range(1, len(tau)):
+      if not marked:
+        break
+      prev_ready = ready[k-1]
+      cur_tau, cur_ready, cur_parents = tau[k], ready[k], parents[k]
+      # Arrivals with fewer trips carry over.
+      prev_tau = tau[k-1]
+      for stop in xrange(n):
+        if prev_tau[stop] < cur_tau[stop]:
+          cur_tau[stop] = prev_tau[stop]
+          cur_ready[stop] = prev_ready[stop]
+          cur_parents[stop] = None
+      # Patterns to scan, from the earliest marked stop.
+      queue = {}
+      for stop in marked:
+        for pattern, pos in self.stop_patterns.get(stop, ()):
+          if pos < queue.get(pattern, INFINITY):
+            queue[pattern] = pos
+      marked = set()
+      for p, start in queue.items():
+        pattern = self.patterns[p]
+        stops = pattern.stops
+        ntrips = len(pattern.trip_ids)
+        arrivals, departures = pattern.arrivals, pattern.departures
+        trip, board = None, None
+        for pos in xrange(start, len(stops)):
+          stop = stops[pos]
+          if trip is not None:
+            arrive = arrivals[pos * ntrips + trip]
+            if arrive < cur_tau[stop] and arrive < cur_tau[target]:
+              cur_tau[stop] = arrive
+              cur_ready[stop] = arrive + change_times.get(stop, 0)
+              cur_parents[stop] = ('trip', p, trip, board, pos)
+              marked.add(stop)
+          # Catch an earlier trip?
+          t = prev_ready[stop]
+          if t < INFINITY and (trip is None or t < departures[pos * ntrips + trip]):
+            earlier = pattern.earliest_trip(pos, t, before=trip)
+            if earlier is not None:
+              trip, board = earlier, pos
+      # Walk from stops reached by trip in this round.
+      for stop in list(marked):
+        parent = cur_parents[stop]
+        if not parent or parent[0] != 'trip':
+          continue
+        arrive = cur_tau[stop]
+        for walk_stop, duration in footpaths.get(stop, ()):
+          t = arrive + duration
+          if t < cur_tau[walk_stop] and t < cur_tau[target]:
+            cur_tau[walk_stop] = cur_ready[walk_stop] = t
+            cur_parents[walk_stop] = ('walk', stop)
+            marked.add(walk_stop)
+
+  def _journey(self, state, k, stop):
+    """Follow parent labels back from a stop reached in round k."""
+    tau, ready, parents = state
+    legs = []
+    while True:
+      parent = parents[k][stop]
+      if parent is None:
+        if k == 0:
+          break
+        k -= 1
+      elif parent[0] == 'walk':
+        prev = parent[1]
+        legs.append(csa.Leg(
+          None,
+          self.stop_ids[prev],
+          self.stop_ids[stop],
+          widetime.WideTime.from_seconds(tau[k][prev]),
+          widetime.WideTime.from_seconds(tau[k][stop])
+        ))
+        stop = prev
+      else:
+        _, p, trip, board, pos = parent
+        pattern = self.patterns[p]
+        prev = pattern.stops[board]
+        legs.append(csa.Leg(
+          pattern.trip_ids[trip],
+          self.stop_ids[prev],
+          self.stop_ids[stop],
+          widetime.WideTime.from_seconds(pattern.departure(board, trip)),
+          widetime.WideTime.from_seconds(pattern.arrival(pos, trip))
+        ))
+        stop = prev
+        k -= 1
+    return list(reversed(legs))
+
+  def _found(self, state, target, before):
+    """Journeys to target improved since 'before' arrival labels."""
+    tau, ready, parents = state
+    ret = []
+    for k in range(len(tau)):
+      if tau[k][target] < before[k] and (k == 0 or parents[k][target]):
+        ret.append(self._journey(state, k, target))
+    return ret
+
+  def journeys(self, origin, destination, departure, max_transfers=4):
+    """Return Pareto-optimal journeys over arrival time and transfers.
+
+    Each journey is a list of csa.Legs; fewest transfers first.
+    """
+    origin = self._stops.get(origin)
+    target = self._stops.get(destination)
+    if origin is None or target is None:
+      return []
+    state = self._state(max_transfers + 1)
+    before = [INFINITY] * (max_transfers + 2)
+    self._run(state, origin, widetime.to_seconds(departure), target)
+    return self._found(state, target, before)
+
+  def range_journeys(self, origin, destination, start, end, max_transfers=4):
+    """Return Pareto-optimal journeys departing between start and end.
+
+    Journeys are Pareto-optimal over departure time, arrival time, and
+    transfers; sorted by departure, then fewest transfers.
+    """
+    origin = self._stops.get(origin)
+    target = self._stops.get(destination)
+    if origin is None or target is None:
+      return []
+    start, end = widetime.to_seconds(start), widetime.to_seconds(end)
+    # Departures from the origin, and from stops within walking distance.
+    times = set()
+    walks = [(origin, 0)] + self.footpaths.get(origin, [])
+    for stop, duration in walks:
+      for p, pos in self.stop_patterns.get(stop, ()):
+        pattern = self.patterns[p]
+        if pos == len(pattern.stops) - 1:
+          continue
+        for trip in range(len(pattern)):
+          t = pattern.departure(pos, trip) - duration
+          if start <= t <= end:
+            times.add(t)
+    state = self._state(max_transfers + 1)
+    found = []
+    for departure in sorted(times, reverse=True):
+      before = [i[target] for i in state[0]]
+      self._run(state, origin, departure, target)
+      found += self._found(state, target, before)
+    # Labels carry over between runs, so a run can find a journey that
+    # leaves after the window; keep only departures within it.
+    found = [i for i in found if start <= i[0].departure <= end]
+    return _pareto(found)
+
+def _criteria(journey):
+  trips = len([i for i in journey if i.trip_id is not None])
+  if not journey:
+    return 0, 0, 0
+  return -journey[0].departure, journey[-1].arrival, trips
+
+def _pareto(journeys):
+  """Remove journeys dominated by others, and duplicates."""
+  ret = []
+  scores = [_criteria(i) for i in journeys]
+  for i, a in enumerate(scores):
+    dominated = False
+    for j, b in enumerate(scores):
+      if b == a and j < i:
+        dominated = True
+      elif b != a and all(y <= x for x, y in zip(a, b)):
+        dominated = True
+      if dominated:
+        break
+    if not dominated:
+      ret.append(journeys[i])
+  return sorted(ret, key=lambda x:(-_criteria(x)[0], _criteria(x)[2]))
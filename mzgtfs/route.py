@@ -148,10 +148,17 @@ VEHICLE_TYPES = {
   "1702": "Horse-drawn Carriage"
 }
 
+def valid_route_type(value):
+  return bool(VEHICLE_TYPES.get(value))
+
+def _has_name(route):
+  return route.get('route_short_name') or route.get('route_long_name')
+
 class Route(entity.Entity):
   """GTFS Route entity."""
   ENTITY_TYPE = 'r'
   KEY = 'route_id'
+  TABLE = 'routes'
   REQUIRED = [
     'route_id',
     'route_short_name',
@@ -165,6 +172,27 @@ class Route(entity.Entity):
     'route_color',
     'route_text_color'
   ]
+  RULES = [
+    # Required
+    validation.Rule('route_id', validation.required, "Required: route_id"),
+    validation.Rule('route_type', validation.required, "Required: route_type"),
+    validation.Rule('route_type', valid_route_type, "Invalid route_type",
+      optional=True),
+    validation.Rule(None, _has_name,
+      "Must provide either route_short_name or route_long_name",
+      entity=True, name='route_name'),
+    # TODO: Warnings:
+    #   short name too long
+    #   short name == long name
+    #   route_desc != route name
+    # Optional
+    validation.Rule('route_url', validation.valid_url, "Invalid route_url",
+      optional=True),
+    validation.Rule('route_color', validation.valid_color, "Invalid route_color",
+      optional=True),
+    validation.Rule('route_text_color', validation.valid_color,
+      "Invalid route_text_color", optional=True)
+  ]
 
   def name(self):
     return self.get('route_short_name') or self.get('route_long_name')
@@ -230,38 +258,3 @@ class Route(entity.Entity):
       for stop_time in trip.stop_times():
         serves |= stop_time.stops()
     return serves
-
-  ##### Validation #####
-  def validate(self, validator=None):
-    validator = super(Route, self).validate(validator)
-    # Required
-    with validator(self):
-      assert self.get('route_id'), "Required: route_id"
-    with validator(self):
-      assert self.get('route_type'), "Required: route_type"
-      assert self.vehicle(), "Invalid route_type"
-    with validator(self):
-      assert self.get('route_short_name') or self.get('route_long_name'), \
-        "Must provide either route_short_name or route_long_name"
-    # TODO: Warnings:
-    #   short name too long
-    #   short name == long name
-    #   route_desc != route name
-    # Optional
-    with validator(self):
-      if self.get('agency_id'): pass
-    with validator(self):
-      if self.get('route_desc'): pass
-    with validator(self):
-      if self.get('route_url'):
-        assert validation.valid_url(self.get('route_url')), \
-          "Invalid route_url"
-    with validator(self):
-      if self.get('route_color'):
-        assert validation.valid_color(self.get('route_color')), \
-          "Invalid route_color"
-    with validator(self):
-      if self.get('route_text_color'):
-        assert validation.valid_color(self.get('route_text_color')), \
-          "Invalid route_text_color"
-    return validator
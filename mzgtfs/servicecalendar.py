@@ -0,0 +1,144 @@
+"""Service calendar: which services run on which dates."""
+import datetime
+import collections
+
+WEEKDAYS = [
+  'monday',
+  'tuesday',
+  'wednesday',
+  'thursday',
+  'friday',
+  'saturday',
+  'sunday'
+]
+
+def parse_date(value):
+  """Return a datetime.date from a date, datetime, or YYYYMMDD string."""
+  if isinstance(value, datetime.datetime):
+    return value.date()
+  if isinstance(value, datetime.date):
+    return value
+  return datetime.datetime.strptime(value, '%Y%m%d').date()
+
+class ServiceCalendar(object):
+  """Active services for each date.
+
+  Combines the weekday masks and date ranges of calendar.txt with the
+  added and removed dates of calendar_dates.txt. Each service is stored
+  as a bitmap over the days between the first and last date of the feed;
+  the set of active services for each day, and the active dates for each
+  service, are precomputed.
+  """
+  def __init__(self, periods=None, exceptions=None):
+    """Build the calendar from ServicePeriod and ServiceDate entities."""
+    periods = list(periods or [])
+    exceptions = list(exceptions or [])
+    # Parse.
+    ranges = {}
+    for period in periods:
+      ranges[period.get('service_id')] = (
+        parse_date(period.get('start_date')),
+        parse_date(period.get('end_date')),
+        [bool(int(period.get(day) or 0)) for day in WEEKDAYS]
+      )
+    changes = collections.defaultdict(list)
+    for exception in exceptions:
+      changes[exception.get('service_id')].append((
+        parse_date(exception.get('date')),
+        int(exception.get('exception_type'))
+      ))
+    dates = [date for i in ranges.values() for date in i[:2]]
+    dates += [date for i in changes.values() for date, _ in i]
+    self.start = min(dates) if dates else None
+    self.end = max(dates) if dates else None
+    self.days = (self.end - self.start).days + 1 if dates else 0
+    # Service bitmaps.
+    self._bits = {}
+    for service_id in set(ranges) | set(changes):
+      bits = 0
+      if service_id in ranges:
+        bits = self._range_bits(*ranges[service_id])
+      for date, exception_type in changes.get(service_id, []):
+        if exception_type == 1:
+          bits |= 1 << self._index(date)
+        elif exception_type == 2:
+          bits &= ~(1 << self._index(date))
+      self._bits[service_id] = bits
+    # Index by date and by service.
+    self._active = [set() for i in range(self.days)]
+    self._dates = {}
+    for service_id, bits in self._bits.items():
+      # Bit string, lowest bit first.
+      days = [
+        i for i, bit in enumerate(reversed(bin(bits)[2:]))
+        if bit == '1'
+      ]
+      for i in days:
+        self._active[i].add(service_id)
+      self._dates[service_id] = tuple(
+        self.start + datetime.timedelta(days=i) for i in days
+      )
+    self._active = [frozenset(i) for i in self._active]
+
+  @classmethod
+  def from_feed(cls, feed):
+    """Read calendar.txt and calendar_dates.txt; either may be missing."""
+    tables = []
+    for table in ['calendar', 'calendar_dates']:
+      try:
+        tables.append(list(feed.iterread(table)))
+      except KeyError:
+        tables.append([])
+    return cls(*tables)
+
+  def _index(self, date):
+    return (date - self.start).days
+
+  def _range_bits(self, start, end, weekdays):
+    """Bitmap of the days from start to end on the given weekdays."""
+    if end < start:
+      return 0
+    # One week of bits, starting on the calendar's first weekday.
+    week = 0
+    for i in range(7):
+      if weekdays[(self.start.weekday() + i) % 7]:
+        week |= 1 << i
+    # Repeat the week over the calendar, and mask to the date range.
+    weeks = self.days // 7 + 1
+    pattern = week * (((1 << (7 * weeks)) - 1) // 127)
+    mask = ((1 << (self._index(end) + 1)) - 1) ^ ((1 << self._index(start)) - 1)
+    return pattern & mask
+
+  def service_ids(self):
+    """All services in the calendar."""
+    return set(self._bits)
+
+  def active_services(self, date):
+    """Return the set of services active on a date."""
+    if not self.days:
+      return frozenset()
+    i = self._index(parse_date(date))
+    if 0 <= i < self.days:
+      return self._active[i]
+    return frozenset()
+
+  def service_dates(self, service_id):
+    """Return the dates a service is active, in order."""
+    return self._dates.get(service_id, ())
+
+  def is_active(self, service_id, date):
+    """Return True if the service is active on a date."""
+    if not self.days:
+      return False
+    i = self._index(parse_date(date))
+    if not 0 <= i < self.days:
+      return False
+    return bool(self._bits.get(service_id, 0) >> i & 1)
+
+  def dates(self):
+    """Return all dates with at least one active service."""
+    return [
+      self.start + datetime.timedelta(days=i)
+      for i, active in enumerate(self._active)
+      if active
+    ]
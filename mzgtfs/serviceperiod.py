@@ -6,8 +6,16 @@ import geom
 import util
 import validation
 
+def _ordered_dates(period):
+  try:
+    return period.end() >= period.start()
+  except (ValueError, TypeError):
+    # Reported as invalid start_date or end_date.
+    return True
+
 class ServicePeriod(entity.Entity):
   KEY = 'service_id'
+  TABLE = 'calendar'
   REQUIRED = [
     'service_id',
     'monday',
@@ -22,6 +30,25 @@ class ServicePeriod(entity.Entity):
   ]
   OPTIONAL = [
   ]
+  RULES = [
+    validation.Rule('service_id', validation.required, "Required: service_id"),
+    validation.Rule('monday', validation.valid_bool, "Required: monday"),
+    validation.Rule('tuesday', validation.valid_bool, "Required: tuesday"),
+    validation.Rule('wednesday', validation.valid_bool, "Required: wednesday"),
+    validation.Rule('thursday', validation.valid_bool, "Required: thursday"),
+    validation.Rule('friday', validation.valid_bool, "Required: friday"),
+    validation.Rule('saturday', validation.valid_bool, "Required: saturday"),
+    validation.Rule('sunday', validation.valid_bool, "Required: sunday"),
+    validation.Rule('start_date', validation.valid_date, "Invalid start_date",
+      empty=True),
+    validation.Rule('end_date', validation.valid_date, "Invalid end_date",
+      empty=True),
+    validation.Rule(None, _ordered_dates,
+      "Invalid end_date, must be at least start_date",
+      entity=True, name='start_date:end_date')
+    # TODO: Warnings
+    #   - no days of the week
+  ]
 
   def start(self):
     return datetime.datetime.strptime(self.get('start_date'), '%Y%m%d')
@@ -29,56 +56,19 @@ class ServicePeriod(entity.Entity):
   def end(self):
     return datetime.datetime.strptime(self.get('end_date'), '%Y%m%d')
 
-  def validate(self, validator=None):
-    validator = super(ServicePeriod, self).validate(validator)
-    with validator(self):
-      assert self.get('service_id'), "Required: service_id"
-    with validator(self):
-      assert validation.valid_bool(self.get('monday')), "Required: monday"
-    with validator(self):
-      assert validation.valid_bool(self.get('tuesday')), "Required: tuesday"
-    with validator(self):
-      assert validation.valid_bool(self.get('wednesday')), "Required: wednesday"
-    with validator(self):
-      assert validation.valid_bool(self.get('thursday')), "Required: thursday"
-    with validator(self):
-      assert validation.valid_bool(self.get('friday')), "Required: friday"
-    with validator(self):
-      assert validation.valid_bool(self.get('saturday')), "Required: saturday"
-    with validator(self):
-      assert validation.valid_bool(self.get('sunday')), "Required: sunday"
-    with validator(self):
-      assert validation.valid_date(self.get('start_date'), empty=True), "Invalid start_date"
-    with validator(self):
-      assert validation.valid_date(self.get('start_end'), empty=True), "Invalid start_end"
-    with validator(self):
-      assert self.end() >= self.start(), \
-        "Invalid end_date, must be at least start_date"
-    # TODO: Warnings
-    #   - no days of the week
-    return validator
-
 class ServiceDate(entity.Entity):
+  TABLE = 'calendar_dates'
   REQUIRED = [
     'service_id',
     'date',
     'exception_type'
   ]
-
-  def validate(self, validator=None):
-    validator = super(ServiceDate, self).validate(validator)
-    with validator(self):
-      assert self.get('service_id'), "Required: service_id"
-    with validator(self):
-      assert self.get('date'), "Required: date"
-    with validator(self):
-      assert validation.valid_int(self.get('exception_type'), vmin=1, vmax=2), \
-        "Invalid exception_type"
-    return validator
-
-  def validate_feed(self, validator=None):
-    validator = super(ServiceDate, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.service_period(self.get('service_id')), \
-        "Unknown service_id"
-    return validator
+  RULES = [
+    validation.Rule('service_id', validation.required, "Required: service_id"),
+    validation.Rule('date', validation.required, "Required: date"),
+    validation.Rule('exception_type', validation.valid_int,
+      "Invalid exception_type", vmin=1, vmax=2)
+  ]
+  FEED_RULES = [
+    validation.Reference('service_id', 'calendar', "Unknown service_id")
+  ]
@@ -28,6 +28,7 @@ class ShapeLine(entity.Entity):
       
 class ShapeRow(entity.Entity):
   """A row in shapes.txt"""
+  TABLE = 'shapes'
   REQUIRED = [
     'shape_id',
     'shape_pt_lat',
@@ -38,6 +39,18 @@ class ShapeRow(entity.Entity):
   OPTIONAL = [
     'shape_dist_traveled',
   ]
+  RULES = [
+    # Required
+    validation.Rule('shape_pt_sequence', validation.valid_int,
+      "Required: shape_pt_sequence", vmin=0),
+    validation.Rule('shape_pt_lat', validation.required,
+      "Required: shape_pt_lat"),
+    validation.Rule('shape_pt_lon', validation.required,
+      "Required: shape_pt_lon"),
+    validation.Rule(None, lambda shape:validation.valid_point(shape.point()),
+      "Invalid shape_pt_lon or shape_pt_lat", entity=True, name='shape_pt')
+    # Optional
+  ]
   
   def id(self):
     return self.get('shape_id')
@@ -56,19 +69,3 @@ class ShapeRow(entity.Entity):
       "type": 'Point',
       "coordinates": self.point(),
     }
-
-  def validate(self, validator=None):
-    validator = super(ShapeRow, self).validate(validator)
-    # Required
-    with validator(self):
-      assert validation.valid_int(self.get('shape_pt_sequence'), vmin=0), \
-        "Required: shape_pt_sequence"
-    with validator(self): 
-      assert self.get('shape_pt_lat'), "Required: shape_pt_lat"
-    with validator(self): 
-      assert self.get('shape_pt_lon'), "Required: shape_pt_lon"
-    with validator(self): 
-      assert validation.valid_point(self.point()), \
-      "Invalid shape_pt_lon or shape_pt_lat"
-    # Optional
-    return validator
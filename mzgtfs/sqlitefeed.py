@@ -0,0 +1,261 @@
+"""A Feed stored in a SQLite database, for feeds too large for memory.
+
+Each table is bulk-loaded from the GTFS csv file the first time it is
+read, with indexes on its key and reference columns. Afterwards, reads,
+lookups by id, and relationships between entities are answered by
+indexed queries instead of in-memory dicts and a preloaded graph.
+Entities are created as rows are read; an identity map returns the same
+entity for the same row while it is in use.
+"""
+import collections
+import itertools
+import os
+import sqlite3
+import tempfile
+import weakref
+
+import feed
+
+# Rows inserted in each executemany.
+BATCH_SIZE = 10000
+
+# Columns indexed in each table, if present.
+INDEXES = {
+  'agency': ['agency_id'],
+  'routes': ['route_id', 'agency_id'],
+  'trips': ['trip_id', 'route_id', 'service_id', 'shape_id', 'block_id'],
+  'stop_times': ['trip_id', 'stop_id'],
+  'stops': ['stop_id', 'parent_station'],
+  'shapes': ['shape_id'],
+  'calendar': ['service_id'],
+  'calendar_dates': ['service_id'],
+  'fare_rules': ['fare_id', 'route_id'],
+  'fare_attributes': ['fare_id'],
+  'transfers': ['from_stop_id', 'to_stop_id'],
+  'frequencies': ['trip_id']
+}
+
+# Relationships: (table, column) of children, by the parent table's key.
+CHILDREN = {
+  'agency': ('routes', 'agency_id'),
+  'routes': ('trips', 'route_id'),
+  'trips': ('stop_times', 'trip_id')
+}
+
+# Relationships: (table, column) of the parent of each entity; a stop's
+# parents are the stop_times visiting it.
+PARENTS = {
+  'routes': ('agency', 'agency_id'),
+  'trips': ('routes', 'route_id'),
+  'stop_times': ('trips', 'trip_id')
+}
+
+def _quote(name):
+  return '"%s"'%name.replace('"', '""')
+
+class SQLiteFeed(feed.Feed):
+  """A Feed with tables stored in a SQLite database.
+
+  database is the file to use; an existing database is reused, and a
+  table is reloaded only if its source file has changed. By default, a
+  temporary file is used, and removed by close(). A database can also be
+  opened on its own, without the GTFS source.
+  """
+  def __init__(self, filename=None, path=None, debug=False, database=None):
+    super(SQLiteFeed, self).__init__(filename=filename, path=path, debug=debug)
+    self._temporary = None
+    if database is None:
+      fd, database = tempfile.mkstemp(suffix='.sqlite')
+      os.close(fd)
+      self._temporary = database
+    self.database = database
+    # Transactions are managed explicitly, so loading a table does not
+    # reset queries in progress.
+    self.db = sqlite3.connect(database, isolation_level=None)
+    self.db.execute(
+      'CREATE TABLE IF NOT EXISTS mzgtfs_tables (name TEXT PRIMARY KEY, hash TEXT, columns TEXT)'
+    )
+    self._headers = {}
+    self._tuples = {}
+    self._identity = weakref.WeakValueDictionary()
+
+  def __del__(self):
+    self.close()
+
+  def close(self):
+    """Close the database; remove it if temporary."""
+    if getattr(self, 'db', None) is None:
+      return
+    self.db.close()
+    self.db = None
+    if self._temporary and os.path.exists(self._temporary):
+      os.unlink(self._temporary)
+
+  ##### Load #####
+
+  def load(self, table):
+    """Load a table into the database, unless already loaded; return its columns.
+
+    Raises KeyError if the table is in neither the database nor the source.
+    """
+    if table in self._headers:
+      return self._headers[table]
+    row = self.db.execute(
+      'SELECT hash, columns FROM mzgtfs_tables WHERE name = ?',
+      (table,)
+    ).fetchone()
+    if not (self.filename or self.path):
+      # The database on its own.
+      if not row:
+        raise KeyError("File not found in database: %s"%table)
+      self._headers[table] = row[1].split(',')
+      return self._headers[table]
+    source = self.table_hash(table)
+    if source is None:
+      # Removed from the source; drop any stale copy.
+      if row:
+        self._drop(table)
+      raise KeyError("File not found in path or zip file: %s"%table)
+    if row and row[0] == source:
+      self._headers[table] = row[1].split(',')
+      return self._headers[table]
+    self._load(table, source)
+    return self._headers[table]
+
+  def _drop(self, table):
+    self.db.execute('BEGIN')
+    self.db.execute('DROP TABLE IF EXISTS %s'%_quote(table))
+    self.db.execute('DELETE FROM mzgtfs_tables WHERE name = ?', (table,))
+    self.db.execute('COMMIT')
+
+  def _load(self, table, source):
+    header = super(SQLiteFeed, self).header(table)
+    self.log("Loading: %s"%table)
+    db = self.db
+    db.execute('PRAGMA synchronous = OFF')
+    db.execute('BEGIN')
+    db.execute('DROP TABLE IF EXISTS %s'%_quote(table))
+    db.execute('CREATE TABLE %s (%s)'%(
+      _quote(table),
+      ', '.join('%s TEXT'%_quote(i) for i in header)
+    ))
+    insert = 'INSERT INTO %s (rowid, %s) VALUES (?, %s)'%(
+      _quote(table),
+      ', '.join(_quote(i) for i in header),
+      ', '.join('?' for i in header)
+    )
+    rows = (
+      (entity.row(),) + tuple(entity.data)
+      for entity in super(SQLiteFeed, self).iterread(table)
+    )
+    while True:
+      batch = list(itertools.islice(rows, BATCH_SIZE))
+      if not batch:
+        break
+      db.executemany(insert, batch)
+    for column in INDEXES.get(table, []):
+      if column in header:
+        db.execute('CREATE INDEX %s ON %s (%s)'%(
+          _quote('%s_%s'%(table, column)),
+          _quote(table),
+          _quote(column)
+        ))
+    db.execute(
+      'INSERT OR REPLACE INTO mzgtfs_tables (name, hash, columns) VALUES (?, ?, ?)',
+      (table, source, ','.join(header))
+    )
+    db.execute('COMMIT')
+    self._headers[table] = header
+
+  def preload(self):
+    """Load every table into the database."""
+    for table in self.FACTORIES:
+      try:
+        self.load(table)
+      except KeyError:
+        pass
+
+  ##### Read #####
+
+  def header(self, table):
+    return list(self.load(table))
+
+  def _entities_from(self, table, rows):
+    # Create entities, or reuse them from the identity map.
+    cls = self.FACTORIES[table]
+    if table not in self._tuples:
+      self._tuples[table] = collections.namedtuple(
+        'EntityNamedTuple',
+        map(str, self._headers[table])
+      )
+    ent = self._tuples[table]
+    for row in rows:
+      key = (table, row[0])
+      entity = self._identity.get(key)
+      if entity is None:
+        entity = cls.from_row(ent._make(row[1:]), self, row=row[0])
+        self._identity[key] = entity
+      yield entity
+
+  def query(self, table, column=None, value=None):
+    """Generate the entities of a table, optionally where column = value."""
+    self.load(table)
+    sql = 'SELECT rowid, * FROM %s'%_quote(table)
+    args = ()
+    if column:
+      sql += ' WHERE %s = ?'%_quote(column)
+      args = (value,)
+    sql += ' ORDER BY rowid'
+    return self._entities_from(table, self.db.execute(sql, args))
+
+  def iterread(self, table):
+    """Iteratively read a table from the database."""
+    return self.query(table)
+
+  def read(self, table):
+    """Read a table from the database. Tables are not cached in memory."""
+    return list(self.query(table))
+
+  def _entity(self, table, key):
+    cls = self.FACTORIES[table]
+    for entity in self.query(table, cls.KEY, key):
+      return entity
+    raise KeyError(key)
+
+  ##### Graph #####
+
+  def _default_agency_id(self):
+    agencies = self.read('agency')
+    if len(agencies) == 1:
+      return agencies[0].get('agency_id')
+
+  def read_children(self, entity):
+    """Return the children of an entity, by indexed query."""
+    if entity.TABLE == 'stop_times':
+      return set(self.query('stops', 'stop_id', entity.get('stop_id')))
+    if entity.TABLE not in CHILDREN:
+      return set()
+    table, column = CHILDREN[entity.TABLE]
+    # Routes may omit agency_id, or the column, if the feed has one agency.
+    default = entity.TABLE == 'agency' and entity.get('agency_id') == self._default_agency_id()
+    if column not in self.header(table):
+      return set(self.query(table)) if default else set()
+    ret = set(self.query(table, column, entity.get(entity.KEY)))
+    if default:
+      ret |= set(self.query(table, column, ''))
+    return ret
+
+  def read_parents(self, entity):
+    """Return the parents of an entity, by indexed query."""
+    if entity.TABLE == 'stops':
+      return set(self.query('stop_times', 'stop_id', entity.get('stop_id')))
+    if entity.TABLE not in PARENTS:
+      return set()
+    table, column = PARENTS[entity.TABLE]
+    value = entity.get(column)
+    if table == 'agency' and not value:
+      # The feed's only agency, which may not have an agency_id.
+      agencies = self.read('agency')
+      return set(agencies) if len(agencies) == 1 else set()
+    cls = self.FACTORIES[table]
+    return set(self.query(table, cls.KEY, value))
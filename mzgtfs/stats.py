@@ -0,0 +1,205 @@
+"""Service level statistics: trips per period, headways, span, and vehicle hours.
+
+Statistics are computed in bulk from sorted arrays of departure times,
+built in one pass over the timetable, instead of walking entities.
+"""
+import argparse
+import array
+import bisect
+import collections
+import csv
+
+import frequency
+import widetime
+import csa
+
+ROUTE_COLUMNS = [
+  'route_id',
+  'direction_id',
+  'trips',
+  'first_departure',
+  'last_departure',
+  'span_hours',
+  'mean_headway_minutes',
+  'max_headway_minutes',
+  'vehicle_hours'
+]
+
+STOP_COLUMNS = [
+  'stop_id',
+  'departures',
+  'routes',
+  'first_departure',
+  'last_departure',
+  'span_hours',
+  'mean_headway_minutes',
+  'max_headway_minutes'
+]
+
+BIN_COLUMNS = [
+  'start',
+  'end',
+  'trips',
+  'mean_headway_minutes'
+]
+
+def _minutes(seconds):
+  if seconds is None:
+    return None
+  return round(seconds / 60.0, 2)
+
+def _hours(seconds):
+  return round(seconds / 3600.0, 2)
+
+def _time(seconds):
+  if seconds is None:
+    return None
+  return str(widetime.WideTime.from_seconds(seconds))
+
+def summary(times):
+  """Span and headways for a sorted array of departure times."""
+  if not times:
+    return dict(first=None, last=None, span=0, mean_headway=None, max_headway=None)
+  first, last = times[0], times[-1]
+  headways = [b - a for a, b in zip(times, times[1:])]
+  return dict(
+    first=first,
+    last=last,
+    span=last - first,
+    mean_headway=float(last - first) / len(headways) if headways else None,
+    max_headway=max(headways) if headways else None
+  )
+
+def counts(times, edges):
+  """Number of departures between each pair of bin edges."""
+  index = [bisect.bisect_left(times, edge) for edge in edges]
+  return [b - a for a, b in zip(index, index[1:])]
+
+class ServiceStats(object):
+  """Service statistics for the trips running on one day.
+
+  For each route and direction, keeps the sorted first departures of
+  its trips and their total running time; for each stop, the sorted
+  departures of all trips. Frequency-based trips are expanded.
+  """
+  def __init__(self, tt, trips, frequencies=None, bin_size=3600):
+    """Build from a Timetable, the active Trips, and Frequencies."""
+    self.bin_size = bin_size
+    starts = collections.defaultdict(list)
+    durations = collections.defaultdict(int)
+    departures = collections.defaultdict(list)
+    stop_routes = collections.defaultdict(set)
+    for trip, trip_id, stops in frequency.timed_trips(tt, trips, frequencies):
+      if not stops:
+        continue
+      key = (trip.get('route_id'), trip.get('direction_id') or '')
+      starts[key].append(stops[0][2])
+      durations[key] += stops[-1][1] - stops[0][2]
+      for stop_id, arrive, depart in stops[:-1]:
+        departures[stop_id].append(depart)
+        stop_routes[stop_id].add(key[0])
+    self.route_starts = dict(
+      (key, array.array('i', sorted(value)))
+      for key, value in starts.items()
+    )
+    self.route_durations = dict(durations)
+    self.stop_departures = dict(
+      (key, array.array('i', sorted(value)))
+      for key, value in departures.items()
+    )
+    self.stop_routes = dict(stop_routes)
+    # Bins cover the service day, including times past midnight.
+    last = max([i[-1] for i in self.stop_departures.values()] or [0])
+    self.edges = range(0, (last // bin_size + 2) * bin_size, bin_size)
+
+  @classmethod
+  def from_feed(cls, feed, date, bin_size=3600):
+    """Build for the services active on a date."""
+    tt, trips, frequencies, transfers = csa.feed_inputs(feed, date)
+    return cls(tt, trips, frequencies, bin_size=bin_size)
+
+  def routes(self):
+    """Rows of statistics for each route and direction."""
+    for key in sorted(self.route_starts):
+      times = self.route_starts[key]
+      s = summary(times)
+      yield dict(
+        route_id=key[0],
+        direction_id=key[1],
+        trips=len(times),
+        first_departure=_time(s['first']),
+        last_departure=_time(s['last']),
+        span_hours=_hours(s['span']),
+        mean_headway_minutes=_minutes(s['mean_headway']),
+        max_headway_minutes=_minutes(s['max_headway']),
+        vehicle_hours=_hours(self.route_durations[key])
+      )
+
+  def stops(self):
+    """Rows of statistics for each stop."""
+    for stop_id in sorted(self.stop_departures):
+      times = self.stop_departures[stop_id]
+      s = summary(times)
+      yield dict(
+        stop_id=stop_id,
+        departures=len(times),
+        routes=len(self.stop_routes[stop_id]),
+        first_departure=_time(s['first']),
+        last_departure=_time(s['last']),
+        span_hours=_hours(s['span']),
+        mean_headway_minutes=_minutes(s['mean_headway']),
+        max_headway_minutes=_minutes(s['max_headway'])
+      )
+
+  def _bins(self, times):
+    for start, end, count in zip(self.edges, self.edges[1:], counts(times, self.edges)):
+      yield dict(
+        start=_time(start),
+        end=_time(end),
+        trips=count,
+        mean_headway_minutes=_minutes(float(end - start) / count) if count else None
+      )
+
+  def route_bins(self):
+    """Rows of trips per bin, for each route and direction."""
+    for key in sorted(self.route_starts):
+      for row in self._bins(self.route_starts[key]):
+        row.update(route_id=key[0], direction_id=key[1])
+        yield row
+
+  def stop_bins(self):
+    """Rows of departures per bin, for each stop."""
+    for stop_id in sorted(self.stop_departures):
+      for row in self._bins(self.stop_departures[stop_id]):
+        row.update(stop_id=stop_id)
+        yield row
+
+def write_csv(filename, rows, columns):
+  """Write rows of statistics to a csv file."""
+  with open(filename, 'wb') as f:
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for row in rows:
+      writer.writerow([
+        '' if row.get(column) is None else unicode(row.get(column)).encode('utf-8')
+        for column in columns
+      ])
+
+if __name__ == "__main__":
+  import os
+  import feed
+  parser = argparse.ArgumentParser(description='GTFS service statistics.')
+  parser.add_argument('filename', help='GTFS File')
+  parser.add_argument('date', help='Service date, YYYYMMDD')
+  parser.add_argument('--bin', help='Bin size, in seconds', type=int,
+    default=3600)
+  parser.add_argument('--path', help='Output directory', default='.')
+  args = parser.parse_args()
+  stats = feed.Feed(args.filename).service_stats(args.date, bin_size=args.bin)
+  for name, rows, columns in [
+      ('routes', stats.routes(), ROUTE_COLUMNS),
+      ('stops', stats.stops(), STOP_COLUMNS),
+      ('route_bins', stats.route_bins(), ['route_id', 'direction_id'] + BIN_COLUMNS),
+      ('stop_bins', stats.stop_bins(), ['stop_id'] + BIN_COLUMNS)
+    ]:
+    write_csv(os.path.join(args.path, '%s.csv'%name), rows, columns)
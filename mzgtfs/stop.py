@@ -2,10 +2,30 @@
 import entity
 import validation
 
+def _location_type(stop):
+  try:
+    return int(stop.get('location_type') or 0)
+  except ValueError:
+    # Reported as invalid location_type.
+    return 0
+
+def _is_station(stop):
+  # Any non-zero location_type.
+  return bool(_location_type(stop))
+
+def _valid_parent_station(stop):
+  try:
+    parent_station = stop._feed.stop(stop.get('parent_station'))
+  except KeyError:
+    # Reported as unknown parent_station.
+    return True
+  return _location_type(parent_station) == 1
+
 class Stop(entity.Entity):  
   """GTFS Stop entity."""
   ENTITY_TYPE = 's'
   KEY = 'stop_id'
+  TABLE = 'stops'
   REQUIRED = [
     'stop_id',
     'stop_name',
@@ -22,6 +42,44 @@ class Stop(entity.Entity):
     'stop_timezone',
     'wheelchair_boarding'
   ]
+  RULES = [
+    # Required
+    validation.Rule('stop_id', validation.required, "Required: stop_id"),
+    validation.Rule('stop_name', validation.required, "Required: stop_name"),
+    validation.Rule('stop_lat', validation.required, "Required: stop_lat"),
+    validation.Rule('stop_lon', validation.required, "Required: stop_lon"),
+    validation.Rule(None, lambda stop:validation.valid_point(stop.point()),
+      "Invalid stop_lon/stop_lat", entity=True, name='stop_point'),
+    # TODO: Warnings: 
+    #  - stop too close to 0,0
+    # Optional
+    validation.Rule(None,
+      lambda stop:stop.get('stop_desc') != stop.get('stop_name'),
+      "stop_desc and stop_name are the same",
+      severity=validation.ValidationWarning, entity=True, name='stop_desc'),
+    validation.Rule('zone_id', lambda stop:not _is_station(stop),
+      "A station cannot have a zone_id",
+      severity=validation.ValidationWarning, optional=True, entity=True,
+      name='zone_id:station'),
+    validation.Rule('stop_url', validation.valid_url, "Invalid stop_url",
+      optional=True),
+    validation.Rule('location_type', validation.valid_bool,
+      "Invalid location_type", optional=True, empty=True),
+    validation.Rule('parent_station', lambda stop:not _is_station(stop),
+      "A station cannot contain another station",
+      optional=True, entity=True, name='parent_station:station'),
+    validation.Rule('stop_timezone', validation.valid_tz, "Invalid timezone",
+      optional=True),
+    validation.Rule('wheelchair_boarding', validation.valid_int,
+      "Invalid wheelchair_boarding", optional=True, vmin=0, vmax=2, empty=True)
+  ]
+  FEED_RULES = [
+    validation.Reference('parent_station', 'stops', "Unknown parent_station",
+      optional=True),
+    validation.Rule('parent_station', _valid_parent_station,
+      "Invalid parent_station, parent must have location_type set to 1.",
+      optional=True, entity=True, name='parent_station:location_type')
+  ]
   
   def id(self):
     return self.get('stop_id')
@@ -57,9 +115,9 @@ class Stop(entity.Entity):
   # Stop methods.
   def routes(self):
     serves = set()
-    for stop_time in self._parents:
-      for trip in stop_time._parents:
-        serves |= trip._parents
+    for stop_time in self.parents():
+      for trip in stop_time.parents():
+        serves |= trip.parents()
     return serves
 
   def location_type(self):
@@ -69,60 +127,3 @@ class Stop(entity.Entity):
     else:
       value = 0
     return value
-    
-  ##### Validation #####
-  def validate(self, validator=None):
-    validator = super(Stop, self).validate(validator)
-    # Required
-    with validator(self): 
-      assert self.get('stop_id'), "Required: stop_id"
-    with validator(self): 
-      assert self.get('stop_name'), "Required: stop_name"
-    with validator(self): 
-      assert self.get('stop_lat'), "Required: stop_lat"
-    with validator(self): 
-      assert self.get('stop_lon'), "Required: stop_lon"
-    with validator(self): 
-      assert validation.valid_point(self.point()), "Invalid stop_lon/stop_lat"
-    # TODO: Warnings: 
-    #  - stop too close to 0,0
-    # Optional
-    with validator(self):
-      if self.get('stop_desc') == self.get('stop_name'):
-        raise validation.ValidationWarning("stop_desc and stop_name are the same")        
-    with validator(self):
-      if self.get('zone_id') and int(self.get('location_type') or 0):
-        raise validation.ValidationWarning("A station cannot have a zone_id")
-    with validator(self): 
-      if self.get('stop_url'):
-        assert validation.valid_url(self.get('stop_url')), "Invalid stop_url"
-    with validator(self): 
-      if self.get('location_type'):
-        assert validation.valid_bool(self.get('location_type'), empty=True), \
-          "Invalid location_type"
-    with validator(self):
-      if int(self.get('location_type') or 0) and self.get('parent_station'):
-        assert not self.get('parent_station'), \
-          "A station cannot contain another station"          
-    with validator(self):
-      if self.get('stop_timezone'):
-        assert validation.valid_tz(self.get('stop_timezone')), "Invalid timezone"
-    with validator(self): 
-      if self.get('wheelchair_boarding'):
-        assert validation.valid_int(self.get('wheelchair_boarding'), vmin=0, vmax=2, empty=True), \
-          "Invalid wheelchair_boarding"
-    with validator(self):
-      if self.get('stop_code'):
-        pass
-    return validator
-    
-  def validate_feed(self, validator=None):
-    validator = super(Stop, self).validate_feed(validator)  
-    with validator(self):
-      if self.get('parent_station'):
-        parent_station = self._feed.stop(self.get('parent_station'))
-        assert parent_station, "Unknown parent_station"
-        assert int(parent_station.get('location_type') or 0) == 1, \
-          "Invalid parent_station, parent must have location_type set to 1."
-    return validator
-    
\ No newline at end of file
@@ -3,8 +3,27 @@ import entity
 import widetime
 import validation
 
+def _both_times(stoptime):
+  return bool(stoptime.get('arrival_time')) == bool(stoptime.get('departure_time'))
+
+def _ordered_times(stoptime):
+  try:
+    arrive, depart = stoptime.arrive(), stoptime.depart()
+  except (ValueError, AssertionError):
+    # Reported as invalid arrival_time or departure_time.
+    return True
+  if arrive is None or depart is None:
+    return True
+  return arrive <= depart
+
+def _timepoint_times(stoptime):
+  if stoptime.get('timepoint') not in ('1', 1):
+    return True
+  return stoptime.get('arrival_time') and stoptime.get('departure_time')
+
 class StopTime(entity.Entity):
   """GTFS Stop Time Entity."""
+  TABLE = 'stop_times'
   REQUIRED = [
     'trip_id',
     'arrival_time',
@@ -19,10 +38,44 @@ class StopTime(entity.Entity):
     'shape_dist_traveled',
     'timepoint'
   ]
+  RULES = [
+    # Required
+    validation.Rule('trip_id', validation.required, "Required: trip_id"),
+    validation.Rule(None, _both_times,
+      "Both arrival_time and departure_time must be set, or both must be empty.",
+      entity=True, name='arrival_time:departure_time'),
+    validation.Rule('arrival_time', validation.valid_widetime,
+      "Invalid arrival_time: %(value)s", optional=True),
+    validation.Rule('departure_time', validation.valid_widetime,
+      "Invalid departure_time: %(value)s", optional=True),
+    validation.Rule(None, _ordered_times,
+      lambda x:"Cannot depart before arriving!: %s -> %s"%(x.arrive(), x.depart()),
+      entity=True, name='arrive:depart'),
+    validation.Rule('stop_sequence', validation.valid_int,
+      "Invalid stop_sequence: %(value)s", vmin=0),
+    # TODO: Warnings - useless stops (cant pickup or dropoff)
+    # Optional
+    validation.Rule('pickup_type', validation.valid_int,
+      "Invalid pickup_type, must be 0,1,2,3: %(value)s",
+      optional=True, vmin=0, vmax=3),
+    validation.Rule('drop_off_type', validation.valid_int,
+      "Invalid drop_off_type, must be 0,1,2,3: %(value)s",
+      optional=True, vmin=0, vmax=3),
+    validation.Rule('timepoint', validation.valid_bool, "Invalid timepoint",
+      optional=True, empty=True),
+    validation.Rule('timepoint', _timepoint_times,
+      "Exact timepoints require arrival_time and departure_time",
+      optional=True, entity=True, name='timepoint:times')
+  ]
+  FEED_RULES = [
+    # TODO: Check this in feed, since it can be a faster set operation?
+    validation.Reference('trip_id', 'trips', "Unknown trip_id"),
+    validation.Reference('stop_id', 'stops', "Unknown stop_id")
+  ]
   
   def point(self):
     # Ugly hack.
-    return list(self._children)[0].point()
+    return list(self.children())[0].point()
 
   def arrive(self):
     if self.get('arrival_time'):
@@ -38,64 +91,3 @@ class StopTime(entity.Entity):
   # Graph
   def stops(self):
     return set(self.children())
-
-  ##### Validation #####
-  def validate(self, validator=None):
-    validator = super(StopTime, self).validate(validator)
-    # Required
-    with validator(self):
-      assert self.get('trip_id'), "Required: trip_id"
-    with validator(self):
-      assert \
-        (self.get('arrival_time') and self.get('departure_time')) or \
-        (not self.get('arrival_time') and not self.get('departure_time')), \
-        "Both arrival_time and departure_time must be set, or both must be empty."
-    with validator(self):
-      if self.get('arrival_time'):
-        assert validation.valid_widetime(self.get('arrival_time')), \
-          "Invalid arrival_time: %s"%self.get('arrival_time')
-    with validator(self):
-      if self.get('departure_time'):
-        assert validation.valid_widetime(self.get('departure_time')), \
-          "Invalid departure_time: %s"%self.get('departure_time')
-    with validator(self): 
-      assert self.arrive() <= self.depart(), \
-        "Cannot depart before arriving!: %s -> %s"%(self.arrive(), self.depart())
-    with validator(self):
-      assert self.sequence() >= 0, \
-        "Invalid stop_sequence: %s"%self.get('stop_sequence')
-    # TODO: Warnings - useless stops (cant pickup or dropoff)
-    # Optional
-    with validator(self):
-      if self.get('pickup_type'):
-        assert validation.valid_int(self.get('pickup_type'), vmin=0, vmax=3), \
-          "Invalid pickup_type, must be 0,1,2,3: %s"%self.get('pickup_type')
-    with validator(self): 
-      if self.get('drop_off_type'):
-        assert validation.valid_int(self.get('drop_off_type'), vmin=0, vmax=3), \
-          "Invalid drop_off_type, must be 0,1,2,3: %s"%self.get('drop_off_type')
-    with validator(self):
-      if self.get('timepoint'):
-        assert validation.valid_bool(self.get('timepoint'), empty=True), \
-          "Invalid timepoint"
-    with validator(self):
-      if int(self.get('timepoint',0)) == 1:
-        assert self.arrive() and self.depart(), \
-          "Exact timepoints require arrival_time and departure_time"
-    with validator(self):
-      if self.get('stop_headsign'):
-        pass
-    with validator(self):
-      if self.get('shape_dist_traveled'):
-        pass
-    return validator
-
-  def validate_feed(self, validator=None):
-    # TODO: Check this in feed, since it can be a faster set operation?
-    validator = super(StopTime, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.trip(self.get('trip_id')), "Unknown trip_id"
-    with validator(self):
-      assert self._feed.stop(self.get('stop_id')), "Unknown stop_id"
-    return validator
-    
@@ -0,0 +1,363 @@
+"""Generate synthetic GTFS feeds, for tests and benchmarks.
+
+generate() writes a square grid of stops. Each row and each column of the
+grid is a route, running in both directions at a fixed headway; routes
+meet at every stop, so most journeys need one transfer.
+
+generate_network() writes a feed at a given scale: a number of agencies,
+routes, trips per route, and stops per trip, with shapes and calendars.
+Stop positions come from a seeded random number generator, so the same
+arguments always write the same feed.
+"""
+import os
+import csv
+import math
+import random
+import argparse
+import tempfile
+import shutil
+
+import feed
+
+def _time(seconds):
+  return '%02d:%02d:%02d'%(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+def _write(path, table, header, rows):
+  filename = os.path.join(path, '%s.txt'%table)
+  with open(filename, 'wb') as f:
+    writer = csv.writer(f)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+      writer.writerow(row)
+      count += 1
+  return count
+
+def generate(
+    path,
+    size=10,
+    headway=600,
+    start=5*3600,
+    end=23*3600,
+    travel=120,
+    dwell=30,
+    transfer=60
+  ):
+  """Write a synthetic feed as .txt files into path.
+
+  size - grid size; the feed has size*size stops and 2*size routes
+  headway - seconds between trips, in each direction
+  start, end - first and last departure of each route, in seconds
+  travel - seconds between stops
+  dwell - seconds at each stop
+  transfer - min_transfer_time at each stop
+
+  Returns the number of rows written to each table.
+  """
+  def stop_id(row, col):
+    return 'S%d_%d'%(row, col)
+
+  def lines():
+    # Each route: (route_id, stops in order)
+    for i in range(size):
+      yield 'R%d'%i, [stop_id(i, j) for j in range(size)]
+      yield 'C%d'%i, [stop_id(j, i) for j in range(size)]
+
+  def trips():
+    # Each trip: (route_id, trip_id, stops in order, first departure)
+    for route_id, stops in lines():
+      for direction, order in enumerate([stops, stops[::-1]]):
+        for i, t in enumerate(range(start, end + 1, headway)):
+          trip_id = '%s_%d_%d'%(route_id, direction, i)
+          yield route_id, trip_id, direction, order, t
+
+  def stop_times():
+    for route_id, trip_id, direction, order, t in trips():
+      for seq, stop in enumerate(order):
+        arrive = t + seq * (travel + dwell)
+        yield trip_id, _time(arrive), _time(arrive + dwell), stop, seq + 1
+
+  counts = {}
+  counts['agency'] = _write(
+    path,
+    'agency',
+    ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+    [['SYN', 'Synthetic Transit', 'http://example.com', 'America/Los_Angeles']]
+  )
+  counts['stops'] = _write(
+    path,
+    'stops',
+    ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'],
+    (
+      [stop_id(i, j), 'Stop %d %d'%(i, j), 37.7 + i * 0.005, -122.5 + j * 0.005]
+      for i in range(size) for j in range(size)
+    )
+  )
+  counts['routes'] = _write(
+    path,
+    'routes',
+    ['route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_type'],
+    ([route_id, 'SYN', route_id, 'Line %s'%route_id, 3] for route_id, _ in lines())
+  )
+  counts['calendar'] = _write(
+    path,
+    'calendar',
+    [
+      'service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+      'saturday', 'sunday', 'start_date', 'end_date'
+    ],
+    [['ALL', 1, 1, 1, 1, 1, 1, 1, '20150101', '20151231']]
+  )
+  counts['trips'] = _write(
+    path,
+    'trips',
+    ['route_id', 'service_id', 'trip_id', 'direction_id'],
+    (
+      [route_id, 'ALL', trip_id, direction]
+      for route_id, trip_id, direction, _, _ in trips()
+    )
+  )
+  counts['stop_times'] = _write(
+    path,
+    'stop_times',
+    ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'],
+    stop_times()
+  )
+  counts['transfers'] = _write(
+    path,
+    'transfers',
+    ['from_stop_id', 'to_stop_id', 'transfer_type', 'min_transfer_time'],
+    (
+      [stop_id(i, j), stop_id(i, j), 2, transfer]
+      for i in range(size) for j in range(size)
+    )
+  )
+  return counts
+
+def generate_network(
+    path,
+    agencies=1,
+    routes=10,
+    trips=20,
+    stops=20,
+    shapes=True,
+    shape_points=4,
+    calendars=3,
+    seed=0,
+    start=5*3600,
+    end=23*3600,
+    travel=120,
+    dwell=30
+  ):
+  """Write a synthetic feed at a given scale as .txt files into path.
+
+  agencies - number of agencies
+  routes - routes per agency; each is a line with its own stops
+  trips - trips per route, alternating direction, between start and end
+  stops - stops per trip
+  shapes - write a shape for each route and direction
+  shape_points - shape points between consecutive stops
+  calendars - number of service_ids; trips are assigned in turn
+  seed - seed for stop positions
+
+  Returns the number of rows written to each table.
+  """
+  for name, value in [
+      ('agencies', agencies),
+      ('routes', routes),
+      ('trips', trips),
+      ('stops', stops),
+      ('calendars', calendars)
+    ]:
+    if value < 1:
+      raise ValueError('%s must be at least 1: %s'%(name, value))
+  if shape_points < 0:
+    raise ValueError('shape_points must be at least 0: %s'%shape_points)
+  rng = random.Random(seed)
+  # Service patterns: weekdays, saturday, sunday.
+  patterns = [[1, 1, 1, 1, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]]
+  service_ids = ['SVC%d'%i for i in range(calendars)]
+  headway = (end - start) // max(trips // 2, 1)
+
+  def agency_ids():
+    return ['A%d'%i for i in range(agencies)]
+
+  # Each route: (agency_id, route_id, [(stop_id, lat, lon), ...])
+  lines = []
+  for a, agency_id in enumerate(agency_ids()):
+    clat, clon = 37.0 + a * 0.5, -122.0
+    for r in range(routes):
+      route_id = '%s_R%d'%(agency_id, r)
+      lat = clat + rng.uniform(-0.05, 0.05)
+      lon = clon + rng.uniform(-0.05, 0.05)
+      heading = rng.uniform(0, 2 * math.pi)
+      points = []
+      for i in range(stops):
+        points.append(('%s_S%d'%(route_id, i), round(lat, 6), round(lon, 6)))
+        step = rng.uniform(0.002, 0.004)
+        heading += rng.uniform(-0.3, 0.3)
+        lat += step * math.cos(heading)
+        lon += step * math.sin(heading)
+      lines.append((agency_id, route_id, points))
+
+  def trip_rows():
+    # Each trip: (route_id, trip_id, direction, service_id, shape_id, stops, departure)
+    count = 0
+    for agency_id, route_id, points in lines:
+      for i in range(trips):
+        direction = i % 2
+        shape_id = '%s_%d'%(route_id, direction) if shapes else ''
+        order = points[::-1] if direction else points
+        yield (
+          route_id,
+          '%s_T%d'%(route_id, i),
+          direction,
+          service_ids[count % calendars],
+          shape_id,
+          order,
+          start + (i // 2) * headway
+        )
+        count += 1
+
+  def stop_times():
+    for route_id, trip_id, direction, service_id, shape_id, order, t in trip_rows():
+      for seq, (stop_id, lat, lon) in enumerate(order):
+        arrive = t + seq * (travel + dwell)
+        yield trip_id, _time(arrive), _time(arrive + dwell), stop_id, seq + 1
+
+  def shape_rows():
+    for agency_id, route_id, points in lines:
+      for direction, order in enumerate([points, points[::-1]]):
+        shape_id = '%s_%d'%(route_id, direction)
+        seq = 0
+        for i, (stop_id, lat, lon) in enumerate(order):
+          yield shape_id, lat, lon, seq
+          seq += 1
+          if i == len(order) - 1:
+            break
+          nlat, nlon = order[i+1][1:]
+          for j in range(1, shape_points + 1):
+            f = j / float(shape_points + 1)
+            yield shape_id, round(lat + (nlat - lat) * f, 6), round(lon + (nlon - lon) * f, 6), seq
+            seq += 1
+
+  counts = {}
+  counts['agency'] = _write(
+    path,
+    'agency',
+    ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+    (
+      [agency_id, 'Synthetic Transit %s'%agency_id, 'http://example.com', 'America/Los_Angeles']
+      for agency_id in agency_ids()
+    )
+  )
+  counts['stops'] = _write(
+    path,
+    'stops',
+    ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'],
+    (
+      [stop_id, 'Stop %s'%stop_id, lat, lon]
+      for _, _, points in lines for stop_id, lat, lon in points
+    )
+  )
+  counts['routes'] = _write(
+    path,
+    'routes',
+    ['route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_type'],
+    (
+      [route_id, agency_id, route_id, 'Line %s'%route_id, 3]
+      for agency_id, route_id, _ in lines
+    )
+  )
+  counts['calendar'] = _write(
+    path,
+    'calendar',
+    [
+      'service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+      'saturday', 'sunday', 'start_date', 'end_date'
+    ],
+    (
+      [service_id] + patterns[i % len(patterns)] + ['20150101', '20151231']
+      for i, service_id in enumerate(service_ids)
+    )
+  )
+  counts['calendar_dates'] = _write(
+    path,
+    'calendar_dates',
+    ['service_id', 'date', 'exception_type'],
+    ([service_id, '20150704', 2] for service_id in service_ids)
+  )
+  counts['trips'] = _write(
+    path,
+    'trips',
+    ['route_id', 'service_id', 'trip_id', 'direction_id', 'shape_id'],
+    (
+      [route_id, service_id, trip_id, direction, shape_id]
+      for route_id, trip_id, direction, service_id, shape_id, _, _ in trip_rows()
+    )
+  )
+  counts['stop_times'] = _write(
+    path,
+    'stop_times',
+    ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'],
+    stop_times()
+  )
+  if shapes:
+    counts['shapes'] = _write(
+      path,
+      'shapes',
+      ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'],
+      shape_rows()
+    )
+  return counts
+
+def generate_zip(filename, network=False, **kw):
+  """Write a synthetic feed as a GTFS zip archive.
+
+  With network, uses generate_network() instead of generate().
+  """
+  path = tempfile.mkdtemp()
+  try:
+    counts = (generate_network if network else generate)(path, **kw)
+    feed.Feed().make_zip(filename, path=path)
+  finally:
+    shutil.rmtree(path)
+  return counts
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Generate a synthetic GTFS feed.')
+  parser.add_argument('filename', help='Output GTFS zip file')
+  parser.add_argument('--size', help='Grid size', type=int, default=10)
+  parser.add_argument('--headway', help='Headway, in seconds', type=int,
+    default=600)
+  parser.add_argument('--network',
+    help='Generate a network of lines at a given scale, instead of a grid',
+    action='store_true')
+  parser.add_argument('--agencies', help='Number of agencies', type=int,
+    default=1)
+  parser.add_argument('--routes', help='Routes per agency', type=int,
+    default=10)
+  parser.add_argument('--trips', help='Trips per route', type=int, default=20)
+  parser.add_argument('--stops', help='Stops per trip', type=int, default=20)
+  parser.add_argument('--calendars', help='Number of service_ids', type=int,
+    default=3)
+  parser.add_argument('--no-shapes', help='Do not write shapes',
+    action='store_true')
+  parser.add_argument('--seed', help='Random seed', type=int, default=0)
+  args = parser.parse_args()
+  if args.network:
+    counts = generate_zip(
+      args.filename,
+      network=True,
+      agencies=args.agencies,
+      routes=args.routes,
+      trips=args.trips,
+      stops=args.stops,
+      shapes=not args.no_shapes,
+      calendars=args.calendars,
+      seed=args.seed
+    )
+  else:
+    counts = generate_zip(args.filename, size=args.size, headway=args.headway)
+  for table, count in sorted(counts.items()):
+    print "%s: %s rows"%(table, count)
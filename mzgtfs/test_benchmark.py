@@ -0,0 +1,44 @@
+"""Feed benchmark unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import util
+import synthetic
+import benchmark
+
+class TestBenchFeed(unittest.TestCase):
+  def test_bench_feed(self):
+    results = benchmark.bench_feed(util.example_feed(), names=['iterread', 'write'])
+    assert [i[0] for i in results] == ['iterread', 'write']
+    for name, seconds, rows, peak in results:
+      assert seconds >= 0
+      assert rows > 0
+      assert peak >= 0
+
+  def test_missing_table(self):
+    path = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(path, 'synthetic.zip')
+      synthetic.generate_zip(filename, network=True, routes=2, trips=2, stops=3,
+        shapes=False)
+      results = benchmark.bench_feed(filename, names=['shapes'])
+      assert results == [('shapes', None, None, None)]
+    finally:
+      shutil.rmtree(path)
+
+  def test_error(self):
+    # A KeyError inside a benchmark is a failure, not a missing table.
+    original = benchmark.BENCHMARKS
+    def bench_fail(filename):
+      raise KeyError('regression')
+    benchmark.BENCHMARKS = [('fail', bench_fail, [])]
+    try:
+      with self.assertRaises(KeyError):
+        benchmark.bench_feed(util.example_feed())
+    finally:
+      benchmark.BENCHMARKS = original
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+"""Block index unit tests."""
+import unittest
+
+import feed
+import util
+import entities
+import timetable
+import blocks
+
+class TestBlockIndex(unittest.TestCase):
+  def index(self):
+    stop_times = []
+    trips = []
+    for trip_id, route_id, block_id, stops in [
+        ('1', 'A', 'b1', [('x', '6:00:00'), ('y', '6:30:00')]),
+        ('2', 'A', 'b1', [('y', '6:40:00'), ('x', '7:10:00')]),
+        ('3', 'B', 'b1', [('z', '7:20:00'), ('y', '7:50:00')]),
+        ('4', 'B', 'b2', [('z', '6:10:00'), ('y', '6:50:00')]),
+        ('5', 'B', 'b2', [('y', '6:45:00'), ('z', '7:15:00')]),
+        ('6', 'C', '', [('x', '6:20:00'), ('z', '6:40:00')]),
+      ]:
+      trips.append(entities.Trip(trip_id=trip_id, route_id=route_id,
+        service_id='s', block_id=block_id))
+      for seq, (stop_id, t) in enumerate(stops):
+        stop_times.append(entities.StopTime(trip_id=trip_id, stop_id=stop_id,
+          stop_sequence=str(seq), arrival_time=t, departure_time=t))
+    return blocks.BlockIndex(timetable.Timetable(stop_times), trips)
+
+  def test_blocks(self):
+    index = self.index()
+    assert index.block_ids() == [('s', 'b1'), ('s', 'b2')]
+    assert [i.trip_id for i in index.block('s', 'b1')] == ['1', '2', '3']
+    assert index.block('s', 'b1')[0].end == 6*3600+30*60
+    assert [i.trip_id for i in index.unblocked['s']] == ['6']
+    assert index.block('s', 'unknown') == []
+
+  def test_gaps(self):
+    gaps = dict(((i.from_trip_id, i.to_trip_id), i) for i in self.index().gaps())
+    assert gaps[('1', '2')].kind == 'layover'
+    assert gaps[('1', '2')].seconds == 600
+    assert not gaps[('1', '2')].interline
+    assert gaps[('2', '3')].kind == 'deadhead'
+    assert gaps[('2', '3')].interline
+    assert gaps[('4', '5')].kind == 'overlap'
+    assert gaps[('4', '5')].seconds == -300
+
+  def test_fleet_size(self):
+    index = self.index()
+    assert index.spans(['s'])[0] == (6*3600, 7*3600+50*60)
+    assert index.fleet_size(['s']) == 3
+    assert index.fleet_size(['unknown']) == 0
+
+class TestFeedBlocks(unittest.TestCase):
+  def test_blocks(self):
+    f = feed.Feed(util.example_feed())
+    assert f.blocks() is f.blocks()
+    gaps = list(f.blocks().gaps())
+    assert [(i.from_trip_id, i.to_trip_id, i.kind) for i in gaps] == \
+      [('AB1', 'BFC1', 'layover'), ('BFC2', 'AB2', 'layover')]
+
+  def test_fleet_size(self):
+    f = feed.Feed(util.example_feed())
+    assert f.fleet_size('20070605') == 8
+    assert f.fleet_size('20070604') == 0
@@ -0,0 +1,104 @@
+"""Columnar format unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import feed
+import util
+import validation
+import columnar
+
+class TestInfer(unittest.TestCase):
+  def test_kinds(self):
+    assert columnar.infer(['1', '20', '']) == ('int', None)
+    assert columnar.infer(['01']) == ('string', None)
+    assert columnar.infer(['1.25', '36.425288']) == ('float', None)
+    assert columnar.infer(['1.250']) == ('string', None)
+    assert columnar.infer(['nan']) == ('string', None)
+    assert columnar.infer(['06:00:00', '25:10:00']) == ('time', '%02d:%02d:%02d')
+    assert columnar.infer(['6:00:00', '25:10:00']) == ('time', '%d:%02d:%02d')
+    assert columnar.infer(['6:00:00', '06:00:00']) == ('string', None)
+    assert columnar.infer(['', '']) == ('string', None)
+
+@unittest.skipIf(columnar.numpy is None, 'numpy is not installed')
+class TestColumnar(unittest.TestCase):
+  def setUp(self):
+    self.path = os.path.join(tempfile.mkdtemp(), 'columns')
+    self.feed = feed.Feed(util.example_feed())
+    self.counts = columnar.write(self.feed, self.path)
+
+  def tearDown(self):
+    shutil.rmtree(os.path.dirname(self.path))
+
+  def test_roundtrip(self):
+    f = columnar.ColumnarFeed(self.path)
+    for table in self.counts:
+      expect = [(i.row(), tuple(i.data)) for i in self.feed.iterread(table)]
+      assert [(i.row(), tuple(i.data)) for i in f.iterread(table)] == expect
+      assert f.header(table) == self.feed.header(table)
+      assert f.table_hash(table) == self.feed.table_hash(table)
+
+  def test_columns(self):
+    f = columnar.ColumnarFeed(self.path)
+    assert f.column('stop_times', 'arrival_time')[0] == 6 * 3600
+    assert f.column('stop_times', 'stop_sequence').dtype.kind == 'i'
+    assert f.column('stops', 'stop_lat').dtype.kind == 'f'
+    assert isinstance(f.column('stops', 'stop_lat'), columnar.numpy.memmap)
+    assert f.column('stops', 'stop_id')[0] == 'FUR_CREEK_RES'
+    dictionary, codes = f.codes('trips', 'route_id')
+    assert sorted(dictionary.tolist()) == dictionary.tolist()
+    assert len(codes) == 11
+    # Empty values.
+    assert f.column('trips', 'direction_id')[2] == columnar.INT_NULL
+    with self.assertRaises(ValueError):
+      f.codes('stops', 'stop_lat')
+    with self.assertRaises(KeyError):
+      f.column('stops', 'missing')
+
+  def test_feed(self):
+    f = columnar.ColumnarFeed(self.path)
+    assert f.stop('AMV').name() == 'Amargosa Valley (Demo)'
+    assert len(f.trips_on('20070605')) == 7
+    with self.assertRaises(KeyError):
+      f.read('transfers')
+    validator = validation.ValidationReport()
+    f.validate(validator=validator)
+    assert validator.passed()
+
+  def test_open(self):
+    f = feed.Feed(self.path)
+    assert isinstance(f, columnar.ColumnarFeed)
+    assert f.stop('AMV').name() == 'Amargosa Valley (Demo)'
+    assert type(feed.Feed(util.example_feed())) is feed.Feed
+
+  def test_write_columnar(self):
+    path = os.path.join(os.path.dirname(self.path), 'columns2')
+    counts = self.feed.write_columnar(path, tables=['stops'])
+    assert counts == {'stops': 9}
+    assert feed.Feed(path).header('stops') == self.feed.header('stops')
+
+  def test_dictionary(self):
+    # Long values are not padded.
+    source = os.path.join(os.path.dirname(self.path), 'source')
+    os.mkdir(source)
+    with open(os.path.join(source, 'stops.txt'), 'w') as f:
+      f.write('stop_id,stop_name\n')
+      f.write('a,%s\n'%('x' * 5000))
+      for i in range(8):
+        f.write('b%s,\xc3\xa9%s\n'%(i, i))
+    path = os.path.join(os.path.dirname(self.path), 'columns3')
+    columnar.write(feed.Feed(path=source), path)
+    size = os.path.getsize(os.path.join(path, 'stops.stop_name.dict.npy'))
+    assert size < 6000
+    f = columnar.ColumnarFeed(path)
+    names = f.column('stops', 'stop_name')
+    assert names[0] == 'x' * 5000
+    assert names[1] == u'\xe90'
+
+  def test_exists(self):
+    with self.assertRaises(IOError):
+      columnar.write(self.feed, self.path)
+
+if __name__ == '__main__':
+  unittest.main()
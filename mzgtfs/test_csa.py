@@ -0,0 +1,103 @@
+"""Connection Scan unit tests."""
+import unittest
+import shutil
+import tempfile
+
+import feed
+import util
+import entities
+import timetable
+import csa
+import synthetic
+
+def stop_times(trip_id, stops):
+  return [
+    entities.StopTime(trip_id=trip_id, stop_id=stop_id, stop_sequence=str(i),
+      arrival_time=t, departure_time=t)
+    for i, (stop_id, t) in enumerate(stops)
+  ]
+
+class TestConnectionScan(unittest.TestCase):
+  def planner(self, transfers=None):
+    rows = []
+    rows += stop_times('1', [('a', '8:00:00'), ('b', '8:10:00'), ('c', '8:20:00')])
+    rows += stop_times('2', [('b', '8:11:00'), ('d', '8:20:00')])
+    rows += stop_times('3', [('b', '8:15:00'), ('d', '8:30:00')])
+    rows += stop_times('4', [('e', '8:12:00'), ('d', '8:16:00')])
+    trips = [entities.Trip(trip_id=i) for i in '1234']
+    return csa.ConnectionScan(timetable.Timetable(rows), trips, transfers=transfers)
+
+  def transfer(self, from_stop_id, to_stop_id, min_transfer_time, transfer_type='2'):
+    return entities.Transfer(from_stop_id=from_stop_id, to_stop_id=to_stop_id,
+      transfer_type=transfer_type, min_transfer_time=min_transfer_time)
+
+  def legs(self, journey):
+    return [(i.trip_id, i.from_stop_id, i.to_stop_id) for i in journey]
+
+  def test_connections(self):
+    planner = self.planner()
+    assert len(planner) == 5
+    assert list(planner.departures) == sorted(planner.departures)
+
+  def test_journey(self):
+    planner = self.planner()
+    journey = planner.journey('a', 'd', '7:00:00')
+    assert self.legs(journey) == [('1', 'a', 'b'), ('2', 'b', 'd')]
+    assert journey[-1].arrival == 8*3600+20*60
+    assert self.legs(planner.journey('a', 'c', '7:00:00')) == [('1', 'a', 'c')]
+
+  def test_unreachable(self):
+    planner = self.planner()
+    assert planner.journey('a', 'd', '9:00:00') is None
+    assert planner.journey('d', 'a', '7:00:00') is None
+    assert planner.journey('a', 'unknown', '7:00:00') is None
+
+  def test_min_transfer_time(self):
+    planner = self.planner([self.transfer('b', 'b', '120')])
+    journey = planner.journey('a', 'd', '7:00:00')
+    assert self.legs(journey) == [('1', 'a', 'b'), ('3', 'b', 'd')]
+    assert journey[-1].arrival == 8*3600+30*60
+
+  def test_footpath(self):
+    planner = self.planner([self.transfer('b', 'e', '60')])
+    journey = planner.journey('a', 'd', '7:00:00')
+    assert self.legs(journey) == \
+      [('1', 'a', 'b'), (None, 'b', 'e'), ('4', 'e', 'd')]
+    assert journey[1].departure == 8*3600+10*60
+    assert journey[1].arrival == 8*3600+11*60
+    # Not possible.
+    planner = self.planner([self.transfer('b', 'e', '', transfer_type='3')])
+    assert planner.journey('a', 'e', '7:00:00') is None
+
+  def test_arrival_times(self):
+    planner = self.planner()
+    times = planner.arrival_times('a', '8:00:00')
+    assert times['c'] == 8*3600+20*60
+    assert 'e' not in times
+
+class TestFeedJourney(unittest.TestCase):
+  def test_journey(self):
+    f = feed.Feed(util.example_feed())
+    journey = f.journey('STAGECOACH', 'BULLFROG', '20070605', '6:00:00')
+    assert self.legs(journey) == [
+      ('STBA@06:00:00', 'STAGECOACH', 'BEATTY_AIRPORT'),
+      ('AB1', 'BEATTY_AIRPORT', 'BULLFROG')
+    ]
+    assert f.connections('20070605') is f.connections('20070605')
+    assert f.journey('STAGECOACH', 'BULLFROG', '20070604', '6:00:00') is None
+
+  def legs(self, journey):
+    return [(i.trip_id, i.from_stop_id, i.to_stop_id) for i in journey]
+
+  def test_synthetic(self):
+    path = tempfile.mkdtemp()
+    try:
+      counts = synthetic.generate(path, size=4, headway=1800)
+      assert counts['stops'] == 16
+      f = feed.Feed(path=path)
+      journey = f.journey('S0_0', 'S3_3', '20150601', '8:00:00')
+      assert len(journey) == 2
+      assert journey[0].from_stop_id == 'S0_0'
+      assert journey[-1].to_stop_id == 'S3_3'
+    finally:
+      shutil.rmtree(path)
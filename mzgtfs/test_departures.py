@@ -0,0 +1,108 @@
+"""Departure board unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import feed
+import util
+import entities
+import timetable
+import departures
+import servicecalendar
+
+class TestDepartureBoard(unittest.TestCase):
+  def board(self):
+    stop_times = []
+    for trip_id, stops in [
+        ('day', [('a', '12:00:00'), ('b', '12:10:00')]),
+        ('night', [('a', '23:50:00'), ('b', '24:10:00')]),
+        ('freq', [('a', '10:00:00'), ('b', '10:05:00')]),
+      ]:
+      for i, (stop_id, t) in enumerate(stops):
+        stop_times.append(entities.StopTime(
+          trip_id=trip_id, stop_id=stop_id, stop_sequence=str(i+1),
+          arrival_time=t, departure_time=t
+        ))
+    trips = [
+      entities.Trip(trip_id=trip_id, service_id='s')
+      for trip_id in ['day', 'night', 'freq']
+    ]
+    frequencies = [entities.Frequency(trip_id='freq', start_time='12:00:00',
+      end_time='13:00:00', headway_secs='1200')]
+    calendar = servicecalendar.ServiceCalendar([entities.ServicePeriod(
+      service_id='s', start_date='20150101', end_date='20150102',
+      monday='1', tuesday='1', wednesday='1', thursday='1', friday='1',
+      saturday='1', sunday='1'
+    )])
+    board = departures.DepartureBoard(
+      timetable.Timetable(stop_times), trips, frequencies
+    )
+    return board, calendar
+
+  def test_departures(self):
+    board, calendar = self.board()
+    deps = board.departures(['b'], calendar, '20150101', after=12*3600)
+    assert [(i.time, i.trip_id) for i in deps] == [
+      (12*3600+300, 'freq'),
+      (12*3600+600, 'day'),
+      (12*3600+1500, 'freq'),
+      (12*3600+2700, 'freq'),
+      (24*3600+600, 'night')
+    ]
+    assert deps[2].trip_start == 12*3600+1200
+    assert deps[2].stop_sequence == 2
+
+  def test_limit(self):
+    board, calendar = self.board()
+    deps = board.departures(['a', 'b'], calendar, '20150101', limit=3)
+    assert [(i.stop_id, i.trip_id) for i in deps] == \
+      [('a', 'day'), ('a', 'freq'), ('b', 'freq')]
+
+  def test_overnight(self):
+    board, calendar = self.board()
+    deps = board.departures(['b'], calendar, '20150102', limit=1)
+    assert deps[0].trip_id == 'night'
+    assert deps[0].time == 600
+    assert str(deps[0].service_date) == '2015-01-01'
+    # No service on the day before.
+    assert board.departures(['b'], calendar, '20150101', limit=1)[0].trip_id \
+      == 'freq'
+
+class TestFeedDepartures(unittest.TestCase):
+  def test_departures(self):
+    f = feed.Feed(util.example_feed())
+    deps = f.departures('BEATTY_AIRPORT', '20070605', after='7:45:00', limit=3)
+    assert [(str(i.time), i.trip_id) for i in deps] == [
+      ('07:50:00', 'STBA'),
+      ('08:00:00', 'AB1'),
+      ('08:20:00', 'STBA')
+    ]
+
+  def test_no_service(self):
+    f = feed.Feed(util.example_feed())
+    assert f.departures('BEATTY_AIRPORT', '20070604') == []
+
+  def test_station(self):
+    # A station includes departures from its child stops.
+    path = tempfile.mkdtemp()
+    try:
+      with open(os.path.join(path, 'stops.txt'), 'w') as f:
+        f.write('stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n')
+        f.write('STATION,Station,36.9,-116.7,1,\n')
+        for stop in feed.Feed(util.example_feed()).stops():
+          parent = 'STATION' if stop.id() in ['BEATTY_AIRPORT', 'BULLFROG'] else ''
+          f.write('%s,%s,%s,%s,0,%s\n'%(
+            stop.id(), stop.name(), stop.get('stop_lat'), stop.get('stop_lon'), parent
+          ))
+      f = feed.Feed(util.example_feed(), path=path)
+      deps = f.departures('STATION', '20070605', after='7:45:00', limit=3)
+      assert [(str(i.time), i.trip_id) for i in deps] == [
+        ('07:50:00', 'STBA'),
+        ('08:00:00', 'AB1'),
+        ('08:15:00', 'AB1')
+      ]
+      assert len(f.departures('STATION', '20070605')) > \
+        len(f.departures('BEATTY_AIRPORT', '20070605'))
+    finally:
+      shutil.rmtree(path)
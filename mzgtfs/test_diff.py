@@ -0,0 +1,110 @@
+"""Feed diff unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+import StringIO
+import json
+
+import feed
+import util
+import diff
+
+class TestDiff(unittest.TestCase):
+  def setUp(self):
+    # A copy of the sample feed, as a directory.
+    self.path = tempfile.mkdtemp()
+    zipfile.ZipFile(util.example_feed()).extractall(self.path)
+    self.old = feed.Feed(util.example_feed())
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def edit(self, table, old, new):
+    filename = os.path.join(self.path, '%s.txt'%table)
+    with open(filename) as f:
+      data = f.read()
+    assert old in data
+    with open(filename, 'w') as f:
+      f.write(data.replace(old, new))
+
+  def changes(self, **kw):
+    return list(diff.diff(self.old, feed.Feed(path=self.path), **kw))
+
+  def test_same(self):
+    assert self.changes() == []
+
+  def test_stops(self):
+    self.edit('stops', 'Amargosa Valley (Demo)', 'Amargosa Valley')
+    self.edit('stops', 'EMSI,', 'EMSI2,')
+    changes = self.changes(tables=['stops'])
+    assert diff.summary(changes) == {'stops': {'added': 1, 'removed': 1, 'modified': 1}}
+    modified = [i for i in changes if i.action == 'modified'][0]
+    assert modified.key == ('AMV',)
+    assert modified.old == {'stop_name': 'Amargosa Valley (Demo)'}
+    assert modified.new == {'stop_name': 'Amargosa Valley'}
+    removed = [i for i in changes if i.action == 'removed'][0]
+    assert removed.old['stop_id'] == 'EMSI'
+
+  def test_stop_times(self):
+    # Natural key: trip_id, stop_sequence.
+    self.edit('stop_times', 'STBA,6:20:00,6:20:00', 'STBA,6:21:00,6:21:00')
+    changes = self.changes()
+    assert [(i.table, i.action, i.key) for i in changes] == \
+      [('stop_times', 'modified', ('STBA', '2'))]
+    assert changes[0].new == {'arrival_time': '6:21:00', 'departure_time': '6:21:00'}
+
+  def test_duplicate_keys(self):
+    # Two transfers with the same key, differing by from_route_id.
+    transfers = (
+      'from_stop_id,to_stop_id,from_route_id,transfer_type,min_transfer_time\n'
+      'STAGECOACH,NADAV,CITY,2,300\n'
+      'STAGECOACH,NADAV,STBA,2,600\n'
+    )
+    old = os.path.join(self.path, 'old')
+    os.mkdir(old)
+    for path in [old, self.path]:
+      with open(os.path.join(path, 'transfers.txt'), 'w') as f:
+        f.write(transfers)
+    self.old = feed.Feed(util.example_feed(), path=old)
+    assert self.changes(tables=['transfers']) == []
+    self.edit('transfers', 'STBA,2,600', 'STBA,2,900')
+    changes = self.changes(tables=['transfers'])
+    assert [(i.action, i.key, i.old, i.new) for i in changes] == [(
+      'modified',
+      ('STAGECOACH', 'NADAV'),
+      {'min_transfer_time': '600'},
+      {'min_transfer_time': '900'}
+    )]
+    # A third row with the same key is added.
+    with open(os.path.join(self.path, 'transfers.txt'), 'a') as f:
+      f.write('STAGECOACH,NADAV,AB,2,60\n')
+    changes = self.changes(tables=['transfers'])
+    assert sorted(i.action for i in changes) == ['added', 'modified']
+    added = [i for i in changes if i.action == 'added'][0]
+    assert added.new['from_route_id'] == 'AB'
+
+  def test_columns(self):
+    # Column order and empty columns are not changes.
+    self.edit('agency', 'agency_id,agency_name,agency_url,agency_timezone\n',
+      'agency_name,agency_id,agency_timezone,agency_url,agency_phone\n')
+    self.edit('agency', 'DTA,Demo Transit Authority,http://google.com,America/Los_Angeles',
+      'Demo Transit Authority,DTA,America/Los_Angeles,http://google.com,')
+    assert self.changes(tables=['agency']) == []
+
+  def test_missing_table(self):
+    os.unlink(os.path.join(self.path, 'frequencies.txt'))
+    changes = self.changes(tables=['frequencies'])
+    assert diff.summary(changes) == {'frequencies': {'removed': 11}}
+
+  def test_write_changes(self):
+    self.edit('routes', 'Airport - Bullfrog', 'Airport - Bullfrog Express')
+    f = StringIO.StringIO()
+    assert diff.write_changes(f, self.changes()) == 1
+    data = json.loads(f.getvalue())
+    assert data['table'] == 'routes'
+    assert data['key'] == ['AB']
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,69 @@
+"""Export unit tests."""
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import StringIO
+
+import feed
+import util
+import merge
+import export
+
+class TestExport(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.feed = feed.Feed(util.example_feed())
+    self.feed.preload()
+    self.agency = self.feed.agency('DTA')
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_geojson(self):
+    f = StringIO.StringIO()
+    export.write_geojson(f, self.agency)
+    expect = json.dumps(self.agency.json(), sort_keys=True, indent=4,
+      separators=(',', ': '))
+    assert f.getvalue() == expect
+
+  def test_geojson_compact(self):
+    f = StringIO.StringIO()
+    export.write_geojson(f, self.agency, compact=True)
+    assert '\n' not in f.getvalue()
+    data = json.loads(f.getvalue())
+    assert data['type'] == 'FeatureCollection'
+    assert len(data['features']) == 9
+    assert len(data['routes']) == 5
+
+  def test_ndjson(self):
+    f = StringIO.StringIO()
+    export.write_ndjson(f, self.agency)
+    lines = f.getvalue().splitlines()
+    assert len(lines) == 5 + 9
+    assert all(json.loads(i)['type'] == 'Feature' for i in lines)
+
+  def test_dumps(self):
+    assert export.dumps([1, 2], compact=True) == '[1,2]'
+    assert export.dumps([1], level=1) == '[\n        1\n    ]'
+    assert export.dumps([]) == '[]'
+
+  def test_export_workers(self):
+    filename = os.path.join(self.path, 'merged.zip')
+    merge.merge(filename, [
+      feed.Feed(util.example_feed()),
+      feed.Feed(util.example_feed('sample-feed-multipleagencies.zip'))
+    ], prefixes=['a:', 'b:'])
+    f = feed.Feed(filename)
+    f.preload()
+    outfiles = export.export(f, path=self.path, compact=True, workers=2)
+    # ATD has no stops.
+    assert sorted(os.path.basename(i) for i in outfiles) == \
+      ['export-a:DTA.geojson', 'export-b:DTA.geojson']
+    for outfile in outfiles:
+      with open(outfile) as fp:
+        assert len(json.load(fp)['routes']) == 5
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,103 @@
+"""Feed extraction unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import feed
+import util
+import validation
+import extract
+
+class TestExtract(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.filename = os.path.join(self.path, 'subset.zip')
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def extract(self, example='sample-feed.zip', **kw):
+    if os.path.exists(self.filename):
+      os.unlink(self.filename)
+    counts = feed.Feed(util.example_feed(example)).extract(self.filename, **kw)
+    return counts, feed.Feed(self.filename)
+
+  def ids(self, entities):
+    return sorted(i.get(i.KEY) for i in entities)
+
+  def test_all(self):
+    counts, subset = self.extract()
+    source = feed.Feed(util.example_feed())
+    for table in ['agency', 'routes', 'trips', 'stop_times', 'stops', 'calendar']:
+      assert counts[table] == len(source.read(table))
+    validator = validation.ValidationReport()
+    subset.validate(validator=validator)
+    assert validator.passed()
+
+  def test_agency(self):
+    counts, subset = self.extract('sample-feed-multipleagencies.zip', agency_ids=['ATD'])
+    assert counts['agency'] == 0
+    assert counts['trips'] == 0
+    assert counts['stops'] == 0
+    counts, subset = self.extract('sample-feed-multipleagencies.zip', agency_ids=['DTA'])
+    assert self.ids(subset.agencies()) == ['DTA']
+    assert counts['trips'] == 11
+
+  def test_dates(self):
+    counts, subset = self.extract(start_date='20070604', end_date='20070604')
+    assert counts['trips'] == 0
+    # Weekday: no weekend routes, stops, or fares.
+    counts, subset = self.extract(start_date='20070605', end_date='20070605')
+    assert self.ids(subset.service_periods()) == ['FULLW']
+    assert 'AAMV' not in self.ids(subset.routes())
+    assert 'AMV' not in self.ids(subset.stops())
+    assert self.ids(subset.fares()) == ['p']
+    assert len(subset.read('frequencies')) == 11
+
+  def test_dates_clipped(self):
+    counts, subset = self.extract(start_date='20070610', end_date='20070620')
+    assert self.ids(subset.service_periods()) == ['FULLW', 'WE']
+    for period in subset.service_periods():
+      assert period.get('start_date') == '20070610'
+      assert period.get('end_date') == '20070620'
+    assert all(
+      '20070610' <= i.get('date') <= '20070620'
+      for i in subset.service_exceptions()
+    )
+    counts, subset = self.extract(start_date='20070604', end_date='20070604')
+    assert counts['calendar'] == 0
+    assert counts['calendar_dates'] == 0
+
+  def test_skipped(self):
+    source = os.path.join(self.path, 'source')
+    os.mkdir(source)
+    with open(os.path.join(source, 'pathways.txt'), 'w') as f:
+      f.write('pathway_id,from_stop_id,to_stop_id\n1,AMV,BULLFROG\n')
+    f = feed.Feed(util.example_feed(), path=source)
+    extractor = extract.Extractor(f)
+    extractor.write(self.filename)
+    assert extractor.skipped == ['pathways']
+
+  def test_bbox(self):
+    # Amargosa Valley: trips are kept whole.
+    counts, subset = self.extract(bbox=[-116.5, 36.6, -116.3, 36.7])
+    assert self.ids(subset.routes()) == ['AAMV']
+    assert self.ids(subset.trips()) == ['AAMV1', 'AAMV2', 'AAMV3', 'AAMV4']
+    assert self.ids(subset.stops()) == ['AMV', 'BEATTY_AIRPORT']
+    assert self.ids(subset.service_periods()) == ['WE']
+    assert self.ids(subset.fares()) == ['a']
+    assert counts['frequencies'] == 0
+
+  def test_in_bbox(self):
+    stop = feed.Feed(util.example_feed()).stop('AMV')
+    assert extract.in_bbox(stop, [-117, 36, -116, 37])
+    assert not extract.in_bbox(stop, [-116, 36, -115, 37])
+
+  def test_exists(self):
+    f = feed.Feed(util.example_feed())
+    with self.assertRaises(IOError):
+      f.extract(util.example_feed())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -64,6 +64,13 @@ class TestFeed(unittest.TestCase):
     # check cache
     assert 'stops' in f.by_id
   
+  def test_header(self):
+    f = feed.Feed(util.example_feed())
+    assert f.header('trips') == ['route_id', 'service_id', 'trip_id',
+      'trip_headsign', 'direction_id', 'block_id', 'shape_id']
+    with self.assertRaises(KeyError):
+      f.header('transfers')
+
   def test_read_path(self):
     # Test overlay
     f = feed.Feed(
@@ -104,6 +111,40 @@ class TestFeed(unittest.TestCase):
     # Delete temp file
     os.unlink(outfile)
 
+  def test_write_generator(self):
+    f = feed.Feed(util.example_feed())
+    outfile = test_outfile()
+    count = f.write(outfile, f.iterread('stops'), sortkey='stop_id')
+    assert count == 9
+    with open(outfile) as csvfile:
+      rows = list(csv.DictReader(csvfile))
+    assert [i['stop_id'] for i in rows] == sorted(i.id() for i in f.stops())
+    os.unlink(outfile)
+
+  def test_write_sortkey_not_column(self):
+    f = feed.Feed(util.example_feed())
+    outfile = test_outfile()
+    f.write(outfile, f.stops(), sortkey='stop_id', columns=['stop_name'])
+    with open(outfile) as csvfile:
+      rows = list(csv.DictReader(csvfile))
+    expect = [i.name() for i in sorted(f.stops(), key=lambda x:x.id())]
+    assert [i['stop_name'] for i in rows] == expect
+    os.unlink(outfile)
+
+  def test_write_error(self):
+    f = feed.Feed(util.example_feed())
+    outfile = test_outfile()
+    with self.assertRaises(KeyError):
+      f.write(outfile, f.stops(), sortkey='missing')
+    assert not os.path.exists(outfile)
+
+  def test_write_open_error(self):
+    # The error from open() is raised, not one from removing the file.
+    f = feed.Feed(util.example_feed())
+    outfile = os.path.join(test_outfile(), 'missing', 'stops.txt')
+    with self.assertRaises(IOError):
+      f.write(outfile, f.stops())
+
   def test_write_exists(self):
     f = feed.Feed()
     data = [entities.Agency(**self.agency_expect)]
@@ -177,6 +218,25 @@ class TestFeed(unittest.TestCase):
     os.unlink(outfile2)
 
 
+  def test_make_zip_parallel(self):
+    f = feed.Feed()
+    outfile = test_outfile()
+    f.make_zip(
+      outfile,
+      path=os.path.dirname(util.example_feed()),
+      clone=util.example_feed(),
+      workers=2,
+      levels={'stops.txt': 0, 'trips.txt': 9}
+    )
+    zf = zipfile.ZipFile(outfile)
+    assert zf.testzip() is None
+    assert zf.getinfo('stops.txt').compress_type == zipfile.ZIP_STORED
+    assert zf.getinfo('trips.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert zf.getinfo('routes.txt').compress_type == zipfile.ZIP_DEFLATED
+    source = zipfile.ZipFile(util.example_feed())
+    assert zf.read('trips.txt') == source.read('trips.txt')
+    os.unlink(outfile)
+
   def test_cache(self):
     f = feed.Feed(util.example_feed())
     # Read a first time
@@ -0,0 +1,68 @@
+"""Frequency unit tests."""
+import unittest
+import shutil
+import tempfile
+
+import feed
+import util
+import entities
+import synthetic
+
+class TestFrequency(unittest.TestCase):
+  def frequency(self, **kw):
+    data = dict(trip_id='1', start_time='6:00:00', end_time='7:00:00',
+      headway_secs='600')
+    data.update(kw)
+    return entities.Frequency(**data)
+
+  def test_departures(self):
+    freq = self.frequency()
+    assert list(freq.departures()) == range(6*3600, 7*3600, 600)
+
+  def test_departures_window(self):
+    freq = self.frequency()
+    # Trips departing 6:10 or later, or still running at 6:15.
+    assert list(freq.departures(start=6*3600+900)) == \
+      range(6*3600+1200, 7*3600, 600)
+    assert list(freq.departures(300, start=6*3600+900)) == \
+      range(6*3600+600, 7*3600, 600)
+    assert list(freq.departures(end=6*3600+1200)) == \
+      [6*3600, 6*3600+600, 6*3600+1200]
+    assert list(freq.departures(start=8*3600)) == []
+    assert list(freq.departures(end=5*3600)) == []
+
+class TestFrequencyTrips(unittest.TestCase):
+  def test_frequency_trips(self):
+    f = feed.Feed(util.example_feed())
+    trips = list(f.frequency_trips())
+    assert len(trips) == 32 + 52 + 52
+    assert len([i for i in trips if i.trip.id() == 'STBA']) == 32
+
+  def test_stop_times(self):
+    f = feed.Feed(util.example_feed())
+    trips = f.frequency_trips('8:00:00', '8:10:00')
+    trip = [i for i in trips if i.trip.id() == 'CITY1'][-1]
+    assert trip.id() == 'CITY1@08:10:00'
+    assert trip.start() == 8*3600+600
+    assert trip.end() == 8*3600+600+26*60
+    stop_times = list(trip.stop_times())
+    assert [i.get('stop_id') for i in stop_times] == \
+      ['STAGECOACH', 'NANAA', 'NADAV', 'DADAN', 'EMSI']
+    assert stop_times[1].get('arrival_time') == '08:15:00'
+    assert stop_times[1].get('departure_time') == '08:17:00'
+    assert stop_times[1].get('stop_sequence') == '2'
+
+  def test_window(self):
+    f = feed.Feed(util.example_feed())
+    trips = list(f.frequency_trips('21:40:00', '22:00:00'))
+    assert sorted(i.id() for i in trips) == \
+      ['CITY1@21:30:00', 'CITY2@21:30:00', 'STBA@21:30:00']
+
+  def test_no_frequencies(self):
+    path = tempfile.mkdtemp()
+    try:
+      synthetic.generate(path, size=2)
+      f = feed.Feed(path=path)
+      assert list(f.frequency_trips()) == []
+    finally:
+      shutil.rmtree(path)
@@ -0,0 +1,135 @@
+"""Feed merge unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import feed
+import util
+import validation
+import merge
+
+class TestResolve(unittest.TestCase):
+  def test_collisions(self):
+    scans = [
+      {'trip': {'1': None, '2': None}},
+      {'trip': {'2': None, '3': None}}
+    ]
+    renames, duplicates = merge.resolve(scans, ['a:', 'b:'])
+    assert renames[0]['trip'] == {'2': 'a:2'}
+    assert renames[1]['trip'] == {'2': 'b:2'}
+    assert not duplicates[0]['trip']
+    assert not duplicates[1]['trip']
+
+  def test_duplicates(self):
+    scans = [
+      {'service': {'wk': 'x', 'we': 'y'}},
+      {'service': {'weekday': 'x', 'we': 'z'}}
+    ]
+    renames, duplicates = merge.resolve(scans, ['a:', 'b:'])
+    # 'weekday' is the same as 'wk'; 'we' differs, so is renamed.
+    assert renames[0]['service'] == {'we': 'a:we'}
+    assert renames[1]['service'] == {'weekday': 'wk', 'we': 'b:we'}
+    assert duplicates[1]['service'] == set(['weekday'])
+
+  def test_renamed_duplicate(self):
+    scans = [
+      {'stop': {'s': ('x', None, None)}},
+      {'stop': {'s': ('x', None, None)}},
+      {'stop': {'s': ('y', None, None)}}
+    ]
+    renames, duplicates = merge.resolve(scans, ['a:', 'b:', 'c:'])
+    assert renames[0]['stop'] == {'s': 'a:s'}
+    assert renames[1]['stop'] == {'s': 'a:s'}
+    assert renames[2]['stop'] == {'s': 'c:s'}
+    assert duplicates[1]['stop'] == set(['s'])
+
+  def test_renamed_references(self):
+    # Zone z is renamed in each feed, so stop s is kept in each; p is the
+    # same in both, so t, at p, is kept once.
+    scans = [
+      {'stop': {'s': ('x', 'z', None), 'p': ('y', None, None), 't': ('w', None, 'p')},
+        'zone': {'z': None}},
+      {'stop': {'s': ('x', 'z', None), 'p': ('y', None, None), 't': ('w', None, 'p')},
+        'zone': {'z': None}}
+    ]
+    renames, duplicates = merge.resolve(scans, ['a:', 'b:'])
+    assert renames[0]['stop'] == {'s': 'a:s'}
+    assert renames[1]['stop'] == {'s': 'b:s'}
+    assert duplicates[1]['stop'] == set(['p', 't'])
+
+class TestMerge(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.filename = os.path.join(self.path, 'merged.zip')
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def feeds(self):
+    return [
+      feed.Feed(util.example_feed()),
+      feed.Feed(util.example_feed('sample-feed-multipleagencies.zip'))
+    ]
+
+  def test_merge(self):
+    counts = merge.merge(self.filename, self.feeds(), prefixes=['one:', 'two:'])
+    f = feed.Feed(self.filename)
+    # Identical stops and calendars are kept once.
+    assert counts['stops'] == 9
+    assert counts['calendar'] == 2
+    assert counts['trips'] == 22
+    assert sorted(i.id() for i in f.agencies()) == ['ATD', 'one:DTA', 'two:DTA']
+    assert f.trip('one:AB1').get('route_id') == 'one:AB'
+    assert f.trip('two:AB1').get('service_id') == 'FULLW'
+    validator = validation.ValidationReport()
+    f.validate(validator=validator)
+    assert validator.passed()
+
+  def test_merge_workers(self):
+    counts = merge.merge(self.filename, self.feeds(), workers=2)
+    f = feed.Feed(self.filename)
+    assert f.route('sample-feed:AB')
+    assert f.route('sample-feed-multipleagencies:AB')
+
+  def test_default_agency(self):
+    # A feed without agency_id.
+    source = os.path.join(self.path, 'source')
+    os.mkdir(source)
+    with open(os.path.join(source, 'agency.txt'), 'w') as f:
+      f.write('agency_name,agency_url,agency_timezone\nTest,http://example.com,UTC\n')
+    with open(os.path.join(source, 'routes.txt'), 'w') as f:
+      f.write('route_id,route_short_name,route_type\nAB,1,3\n')
+    merge.merge(self.filename, [feed.Feed(util.example_feed()), feed.Feed(path=source)])
+    f = feed.Feed(self.filename)
+    assert f.agency('source')
+    assert f.route('source:AB').get('agency_id') == 'source'
+    assert f.route('sample-feed:AB').get('agency_id') == 'DTA'
+
+  def test_zones(self):
+    # Identical stops, in zones with the same ids in both feeds.
+    sources = []
+    for name in ['a', 'b']:
+      source = os.path.join(self.path, name)
+      os.mkdir(source)
+      with open(os.path.join(source, 'stops.txt'), 'w') as f:
+        f.write('stop_id,stop_name,stop_lat,stop_lon,zone_id\n')
+        f.write('S1,One,36.0,-117.0,Z1\nS2,Two,36.1,-117.1,Z2\n')
+      with open(os.path.join(source, 'fare_rules.txt'), 'w') as f:
+        f.write('fare_id,origin_id,destination_id\nF,Z1,Z2\n')
+      sources.append(feed.Feed(path=source))
+    merge.merge(self.filename, sources)
+    f = feed.Feed(self.filename)
+    zones = set(i.get('zone_id') for i in f.stops())
+    rules = list(f.iterread('fare_rules'))
+    assert len(rules) == 2
+    for rule in rules:
+      assert rule.get('origin_id') in zones
+      assert rule.get('destination_id') in zones
+
+  def test_prefixes(self):
+    with self.assertRaises(ValueError):
+      merge.Merger(self.feeds(), prefixes=['a:', 'a:'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,113 @@
+"""RAPTOR unit tests."""
+import unittest
+import shutil
+import tempfile
+
+import feed
+import util
+import entities
+import timetable
+import raptor
+import synthetic
+
+def stop_times(trip_id, stops):
+  return [
+    entities.StopTime(trip_id=trip_id, stop_id=stop_id, stop_sequence=str(i),
+      arrival_time=t, departure_time=t)
+    for i, (stop_id, t) in enumerate(stops)
+  ]
+
+class TestRaptor(unittest.TestCase):
+  def router(self, transfers=None):
+    rows = []
+    rows += stop_times('slow', [('a', '8:00:00'), ('c', '8:40:00'), ('d', '9:00:00')])
+    rows += stop_times('1', [('a', '8:00:00'), ('b', '8:10:00')])
+    rows += stop_times('2', [('b', '8:15:00'), ('d', '8:30:00')])
+    rows += stop_times('1b', [('a', '8:30:00'), ('b', '8:40:00')])
+    rows += stop_times('2b', [('b', '8:45:00'), ('d', '9:00:00')])
+    rows += stop_times('3', [('e', '8:20:00'), ('f', '8:30:00')])
+    trips = [entities.Trip(trip_id=i) for i in ['slow', '1', '2', '1b', '2b', '3']]
+    return raptor.Raptor(timetable.Timetable(rows), trips, transfers=transfers)
+
+  def legs(self, journey):
+    return [i.trip_id for i in journey]
+
+  def test_patterns(self):
+    r = self.router()
+    assert len(r.patterns) == 4
+    pattern = [i for i in r.patterns if len(i) == 2][0]
+    assert pattern.trip_ids in (('1', '1b'), ('2', '2b'))
+    assert pattern.earliest_trip(0, 8*3600+5*60) == 1
+    assert pattern.earliest_trip(0, 9*3600) is None
+
+  def test_overtaking(self):
+    rows = []
+    rows += stop_times('x', [('a', '8:00:00'), ('b', '9:00:00')])
+    rows += stop_times('y', [('a', '8:05:00'), ('b', '8:30:00')])
+    trips = [entities.Trip(trip_id=i) for i in 'xy']
+    r = raptor.Raptor(timetable.Timetable(rows), trips)
+    assert len(r.patterns) == 2
+    journeys = r.journeys('a', 'b', '8:00:00')
+    assert [self.legs(i) for i in journeys] == [['y']]
+
+  def test_pareto(self):
+    r = self.router()
+    journeys = r.journeys('a', 'd', '7:00:00')
+    assert [self.legs(i) for i in journeys] == [['slow'], ['1', '2']]
+    assert journeys[0][-1].arrival == 9*3600
+    assert journeys[1][-1].arrival == 8*3600+30*60
+
+  def test_max_transfers(self):
+    r = self.router()
+    journeys = r.journeys('a', 'd', '7:00:00', max_transfers=0)
+    assert [self.legs(i) for i in journeys] == [['slow']]
+
+  def test_unreachable(self):
+    r = self.router()
+    assert r.journeys('a', 'd', '9:00:00') == []
+    assert r.journeys('a', 'unknown', '7:00:00') == []
+
+  def test_footpath(self):
+    r = self.router([entities.Transfer(from_stop_id='b', to_stop_id='e',
+      transfer_type='2', min_transfer_time='300')])
+    journeys = r.journeys('a', 'f', '7:00:00')
+    assert [self.legs(i) for i in journeys] == [['1', None, '3']]
+    assert journeys[0][1].arrival == 8*3600+15*60
+
+  def test_range(self):
+    r = self.router()
+    journeys = r.range_journeys('a', 'd', '7:00:00', '9:00:00')
+    assert [self.legs(i) for i in journeys] == \
+      [['slow'], ['1', '2'], ['1b', '2b']]
+
+class TestFeedJourneys(unittest.TestCase):
+  def test_journeys(self):
+    f = feed.Feed(util.example_feed())
+    journeys = f.journeys('STAGECOACH', 'BULLFROG', '20070605', '6:00:00')
+    assert [[i.trip_id for i in j] for j in journeys] == \
+      [['STBA@06:00:00', 'AB1']]
+    assert f.raptor('20070605') is f.raptor('20070605')
+
+  def test_range(self):
+    f = feed.Feed(util.example_feed())
+    journeys = f.journeys('STAGECOACH', 'BULLFROG', '20070605', '6:00:00',
+      end='12:00:00')
+    assert [[i.trip_id for i in j] for j in journeys] == \
+      [['STBA@07:30:00', 'AB1']]
+    journeys = f.journeys('STAGECOACH', 'BEATTY_AIRPORT', '20070605',
+      '6:00:00', end='7:00:00')
+    assert [j[0].trip_id for j in journeys] == \
+      ['STBA@06:00:00', 'STBA@06:30:00', 'STBA@07:00:00']
+
+  def test_range_window(self):
+    path = tempfile.mkdtemp()
+    try:
+      synthetic.generate(path, size=5, headway=1200, start=5*3600, end=8*3600)
+      f = feed.Feed(path=path)
+      start, end = 5*3600+611, 5*3600+2411
+      journeys = f.journeys('S3_4', 'S0_1', '20150601', start, end=end)
+      assert journeys
+      for journey in journeys:
+        assert start <= journey[0].departure <= end
+    finally:
+      shutil.rmtree(path)
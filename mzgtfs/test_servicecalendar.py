@@ -0,0 +1,82 @@
+"""ServiceCalendar unit tests."""
+import unittest
+import datetime
+
+import feed
+import entities
+import util
+import servicecalendar
+
+class TestServiceCalendar(unittest.TestCase):
+  def calendar(self):
+    periods = [
+      entities.ServicePeriod(
+        service_id='WD', monday='1', tuesday='1', wednesday='1',
+        thursday='1', friday='1', saturday='0', sunday='0',
+        start_date='20150101', end_date='20150131'
+      ),
+      entities.ServicePeriod(
+        service_id='WE', monday='0', tuesday='0', wednesday='0',
+        thursday='0', friday='0', saturday='1', sunday='1',
+        start_date='20150101', end_date='20150131'
+      )
+    ]
+    exceptions = [
+      # New Year's day: weekend service.
+      entities.ServiceDate(service_id='WD', date='20150101', exception_type='2'),
+      entities.ServiceDate(service_id='WE', date='20150101', exception_type='1'),
+      # Special service
+      entities.ServiceDate(service_id='SP', date='20150214', exception_type='1'),
+    ]
+    return servicecalendar.ServiceCalendar(periods, exceptions)
+
+  def test_parse_date(self):
+    expect = datetime.date(2015, 1, 2)
+    assert servicecalendar.parse_date('20150102') == expect
+    assert servicecalendar.parse_date(expect) == expect
+    assert servicecalendar.parse_date(datetime.datetime(2015, 1, 2, 5)) == expect
+
+  def test_active_services(self):
+    calendar = self.calendar()
+    assert calendar.active_services('20150101') == set(['WE'])
+    assert calendar.active_services('20150102') == set(['WD'])
+    assert calendar.active_services('20150103') == set(['WE'])
+    assert calendar.active_services(datetime.date(2015, 1, 5)) == set(['WD'])
+    assert calendar.active_services('20150201') == set()
+    assert calendar.active_services('20150214') == set(['SP'])
+    assert calendar.active_services('20140101') == set()
+
+  def test_service_dates(self):
+    calendar = self.calendar()
+    dates = calendar.service_dates('WD')
+    assert len(dates) == 21
+    assert dates[0] == datetime.date(2015, 1, 2)
+    assert dates[-1] == datetime.date(2015, 1, 30)
+    assert calendar.service_dates('SP') == (datetime.date(2015, 2, 14),)
+    assert calendar.service_dates('missing') == ()
+
+  def test_is_active(self):
+    calendar = self.calendar()
+    assert calendar.is_active('WE', '20150101')
+    assert not calendar.is_active('WD', '20150101')
+    assert not calendar.is_active('WD', '20160101')
+
+  def test_dates(self):
+    calendar = self.calendar()
+    dates = calendar.dates()
+    assert len(dates) == 32
+    assert dates[-1] == datetime.date(2015, 2, 14)
+
+  def test_empty(self):
+    calendar = servicecalendar.ServiceCalendar()
+    assert calendar.active_services('20150101') == set()
+    assert calendar.dates() == []
+
+  def test_feed(self):
+    f = feed.Feed(util.example_feed())
+    calendar = f.service_calendar()
+    assert calendar is f.service_calendar()
+    assert calendar.active_services('20070603') == set(['FULLW', 'WE'])
+    # Removed by calendar_dates.txt
+    assert calendar.active_services('20070604') == set()
+    assert calendar.active_services('20070605') == set(['FULLW'])
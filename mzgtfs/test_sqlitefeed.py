@@ -0,0 +1,120 @@
+"""SQLite feed unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+
+import feed
+import util
+import validation
+import sqlitefeed
+
+def ids(entities):
+  return sorted(i.id() for i in entities)
+
+class TestSQLiteFeed(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.feed = sqlitefeed.SQLiteFeed(util.example_feed())
+
+  def tearDown(self):
+    self.feed.close()
+    shutil.rmtree(self.path)
+
+  def test_read(self):
+    assert len(self.feed.read('stops')) == 9
+    assert len(self.feed.read('stop_times')) == 28
+    assert not self.feed.by_id
+    with self.assertRaises(KeyError):
+      self.feed.read('transfers')
+
+  def test_iterread(self):
+    rows = list(self.feed.iterread('stop_times'))
+    assert rows[0].row() == 1
+    assert rows[0].get('trip_id') == 'STBA'
+
+  def test_header(self):
+    assert self.feed.header('routes') == feed.Feed(util.example_feed()).header('routes')
+
+  def test_lookup(self):
+    assert self.feed.stop('AMV').name() == 'Amargosa Valley (Demo)'
+    assert self.feed.service_period('WE').get('saturday') == '1'
+    with self.assertRaises(KeyError):
+      self.feed.route('missing')
+
+  def test_identity(self):
+    route = self.feed.route('AB')
+    assert self.feed.route('AB') is route
+    assert self.feed.trip('AB1').parents() == set([route])
+
+  def test_graph(self):
+    expect = feed.Feed(util.example_feed())
+    expect.preload()
+    agency, other = self.feed.agency('DTA'), expect.agency('DTA')
+    assert ids(agency.routes()) == ids(other.routes())
+    assert ids(agency.stops()) == ids(other.stops())
+    assert ids(agency.trips()) == ids(other.trips())
+    for route in other.routes():
+      assert ids(self.feed.route(route.id()).stops()) == ids(route.stops())
+    for stop in other.stops():
+      assert ids(self.feed.stop(stop.id()).routes()) == ids(stop.routes())
+
+  def test_validate(self):
+    validator = validation.ValidationReport()
+    self.feed.validate(validator=validator)
+    assert validator.passed()
+
+  def test_database(self):
+    database = os.path.join(self.path, 'feed.sqlite')
+    f = sqlitefeed.SQLiteFeed(util.example_feed(), database=database)
+    f.preload()
+    f.close()
+    assert os.path.exists(database)
+    # Without the source.
+    f = sqlitefeed.SQLiteFeed(database=database)
+    assert len(f.trips()) == 11
+    assert ids(f.route('AB').trips()) == ['AB1', 'AB2']
+    f.close()
+
+  def test_removed_table(self):
+    # A table removed from the source is not read from the database.
+    source = os.path.join(self.path, 'source')
+    os.mkdir(source)
+    zipfile.ZipFile(util.example_feed()).extractall(source)
+    database = os.path.join(self.path, 'feed.sqlite')
+    f = sqlitefeed.SQLiteFeed(path=source, database=database)
+    assert len(f.read('frequencies')) == 11
+    f.close()
+    os.unlink(os.path.join(source, 'frequencies.txt'))
+    f = sqlitefeed.SQLiteFeed(path=source, database=database)
+    with self.assertRaises(KeyError):
+      f.read('frequencies')
+    f.close()
+    f = sqlitefeed.SQLiteFeed(database=database)
+    with self.assertRaises(KeyError):
+      f.read('frequencies')
+    f.close()
+
+  def test_default_agency(self):
+    # Routes without an agency_id column belong to the only agency.
+    source = os.path.join(self.path, 'source')
+    os.mkdir(source)
+    with open(os.path.join(source, 'agency.txt'), 'w') as f:
+      f.write('agency_name,agency_url,agency_timezone\nTest,http://example.com,UTC\n')
+    with open(os.path.join(source, 'routes.txt'), 'w') as f:
+      f.write('route_id,route_short_name,route_type\nAB,1,3\nBC,2,3\n')
+    f = sqlitefeed.SQLiteFeed(path=source)
+    agency = f.read('agency')[0]
+    assert ids(f.read_children(agency)) == ['AB', 'BC']
+    assert f.read_parents(f.route('AB')) == set([agency])
+    f.close()
+
+  def test_close(self):
+    database = self.feed.database
+    self.feed.read('agency')
+    self.feed.close()
+    assert not os.path.exists(database)
+
+if __name__ == '__main__':
+  unittest.main()
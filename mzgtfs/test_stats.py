@@ -0,0 +1,93 @@
+"""Service statistics unit tests."""
+import unittest
+import os
+import csv
+import shutil
+import tempfile
+
+import feed
+import util
+import entities
+import timetable
+import stats
+
+class TestStatsFunctions(unittest.TestCase):
+  def test_summary(self):
+    s = stats.summary([100, 200, 500])
+    assert s['first'] == 100
+    assert s['last'] == 500
+    assert s['span'] == 400
+    assert s['mean_headway'] == 200
+    assert s['max_headway'] == 300
+    s = stats.summary([100])
+    assert s['mean_headway'] is None
+    assert stats.summary([])['first'] is None
+
+  def test_counts(self):
+    assert stats.counts([0, 10, 20, 30], [0, 15, 30, 45]) == [2, 1, 1]
+
+class TestServiceStats(unittest.TestCase):
+  def service_stats(self):
+    stop_times = []
+    trips = []
+    for trip_id, times in [
+        ('T0', ['6:00:00', '6:10:00']),
+        ('T1', ['6:20:00', '6:30:00']),
+        ('T2', ['7:10:00', '7:20:00'])
+      ]:
+      trips.append(entities.Trip(trip_id=trip_id, route_id='R', direction_id='0'))
+      for seq, (stop_id, t) in enumerate(zip(['a', 'b'], times)):
+        stop_times.append(entities.StopTime(trip_id=trip_id, stop_id=stop_id,
+          stop_sequence=str(seq), arrival_time=t, departure_time=t))
+    return stats.ServiceStats(timetable.Timetable(stop_times), trips)
+
+  def test_routes(self):
+    rows = list(self.service_stats().routes())
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['route_id'] == 'R'
+    assert row['direction_id'] == '0'
+    assert row['trips'] == 3
+    assert row['first_departure'] == '06:00:00'
+    assert row['last_departure'] == '07:10:00'
+    assert row['span_hours'] == 1.17
+    assert row['mean_headway_minutes'] == 35
+    assert row['max_headway_minutes'] == 50
+    assert row['vehicle_hours'] == 0.5
+
+  def test_stops(self):
+    rows = list(self.service_stats().stops())
+    # No departures from the last stop.
+    assert [i['stop_id'] for i in rows] == ['a']
+    assert rows[0]['departures'] == 3
+    assert rows[0]['routes'] == 1
+
+  def test_bins(self):
+    rows = list(self.service_stats().route_bins())
+    assert len(rows) == 8
+    assert [(i['start'], i['trips']) for i in rows[6:]] == \
+      [('06:00:00', 2), ('07:00:00', 1)]
+    assert rows[6]['mean_headway_minutes'] == 30
+
+  def test_feed(self):
+    f = feed.Feed(util.example_feed())
+    s = f.service_stats('20070605', bin_size=1800)
+    routes = dict(((i['route_id'], i['direction_id']), i) for i in s.routes())
+    assert routes[('STBA', '')]['trips'] == 32
+    assert routes[('STBA', '')]['mean_headway_minutes'] == 30
+    assert routes[('CITY', '0')]['trips'] == 52
+    assert routes[('CITY', '0')]['max_headway_minutes'] == 30
+    assert s.edges[1] == 1800
+    assert list(f.service_stats('20070604').routes()) == []
+
+  def test_write_csv(self):
+    path = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(path, 'routes.csv')
+      stats.write_csv(filename, self.service_stats().routes(), stats.ROUTE_COLUMNS)
+      with open(filename) as f:
+        rows = list(csv.DictReader(f))
+      assert len(rows) == 1
+      assert rows[0]['vehicle_hours'] == '0.5'
+    finally:
+      shutil.rmtree(path)
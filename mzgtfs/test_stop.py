@@ -4,6 +4,7 @@ import json
 import feed
 import entities
 import util
+import validation
 
 class TestStop(unittest.TestCase):
   expect = {
@@ -56,4 +57,11 @@ class TestStop(unittest.TestCase):
     entity = agency.stop(self.expect['stop_id'])
     routes = entity.routes()
     assert len(routes) == 1
-    assert list(routes)[0].id() == 'BFC'
\ No newline at end of file
+    assert list(routes)[0].id() == 'BFC'
+
+  def test_validate_station(self):
+    # Any non-zero location_type is a station for zone_id.
+    data = dict(self.expect, location_type='2', zone_id='z')
+    validator = validation.ValidationReport()
+    entities.Stop(**data).validate(validator=validator)
+    assert 'Stop.zone_id:station' in [e.rule for e in validator.exceptions]
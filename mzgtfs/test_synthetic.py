@@ -0,0 +1,69 @@
+"""Synthetic feed generator unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+
+import feed
+import validation
+import synthetic
+
+class TestGenerateNetwork(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def generate(self, name='feed', **kw):
+    path = os.path.join(self.path, name)
+    os.mkdir(path)
+    return path, synthetic.generate_network(path, **kw)
+
+  def test_counts(self):
+    path, counts = self.generate(agencies=2, routes=3, trips=4, stops=5,
+      shape_points=2, calendars=2)
+    assert counts['agency'] == 2
+    assert counts['routes'] == 6
+    assert counts['trips'] == 24
+    assert counts['stops'] == 30
+    assert counts['stop_times'] == 120
+    assert counts['calendar'] == 2
+    # Each of 12 shapes: 5 stops and 2 points between each.
+    assert counts['shapes'] == 12 * (5 + 4 * 2)
+    f = feed.Feed(path=path)
+    f.preload()
+    assert len(f.agency('A1').routes()) == 3
+    assert len(f.trip('A1_R2_T3').stop_sequence()) == 5
+    assert len(f.shapes()['A1_R2_1'].points()) == 13
+
+  def test_deterministic(self):
+    a, _ = self.generate(name='a', seed=1)
+    b, _ = self.generate(name='b', seed=1)
+    c, _ = self.generate(name='c', seed=2)
+    for table in ['stops.txt', 'shapes.txt', 'stop_times.txt']:
+      with open(os.path.join(a, table)) as f1, open(os.path.join(b, table)) as f2:
+        assert f1.read() == f2.read()
+    with open(os.path.join(a, 'stops.txt')) as f1, open(os.path.join(c, 'stops.txt')) as f2:
+      assert f1.read() != f2.read()
+
+  def test_validate(self):
+    path, _ = self.generate(agencies=2, routes=2, trips=4, stops=4)
+    validator = validation.ValidationReport()
+    feed.Feed(path=path).validate(validator=validator)
+    assert validator.passed()
+
+  def test_no_shapes(self):
+    path, counts = self.generate(routes=2, trips=2, stops=3, shapes=False)
+    assert 'shapes' not in counts
+    f = feed.Feed(path=path)
+    assert not f.trip('A0_R0_T0').get('shape_id')
+    assert f.route('A0_R0').geometry()
+
+  def test_invalid(self):
+    for kw in [dict(calendars=0), dict(trips=0), dict(stops=0), dict(routes=-1)]:
+      with self.assertRaises(ValueError):
+        synthetic.generate_network(self.path, **kw)
+
+if __name__ == '__main__':
+  unittest.main()
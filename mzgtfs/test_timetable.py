@@ -0,0 +1,62 @@
+"""Timetable unit tests."""
+import unittest
+
+import feed
+import entities
+import util
+import timetable
+
+class TestTimetable(unittest.TestCase):
+  def test_timetable(self):
+    f = feed.Feed(util.example_feed())
+    t = f.timetable()
+    assert t is f.timetable()
+    assert len(t) == 11
+    times = t.get('CITY1')
+    assert times.stops == ('STAGECOACH', 'NANAA', 'NADAV', 'DADAN', 'EMSI')
+    assert list(times.sequences) == [1, 2, 3, 4, 5]
+    assert times.arrivals[1] == 6*3600 + 5*60
+    assert times.departures[1] == 6*3600 + 7*60
+    assert timetable.first_departure(times) == 6*3600
+    assert timetable.last_arrival(times) == 6*3600 + 26*60
+
+  def test_sorted(self):
+    stop_times = [
+      entities.StopTime(trip_id='1', stop_id='b', stop_sequence='10',
+        arrival_time='6:10:00', departure_time='6:10:00'),
+      entities.StopTime(trip_id='1', stop_id='c', stop_sequence='20',
+        arrival_time='', departure_time=''),
+      entities.StopTime(trip_id='1', stop_id='a', stop_sequence='2',
+        arrival_time='6:00:00', departure_time='6:00:00'),
+    ]
+    times = timetable.Timetable(stop_times).get('1')
+    assert times.stops == ('a', 'b', 'c')
+    assert list(times.arrivals) == [21600, 22200, -1]
+    assert timetable.last_arrival(times) == 22200
+
+class TestTripsOn(unittest.TestCase):
+  def ids(self, trips):
+    return [trip.id() for trip in trips]
+
+  def test_trips_on(self):
+    f = feed.Feed(util.example_feed())
+    # Sunday
+    trips = f.trips_on('20070603')
+    assert len(trips) == 11
+    # Monday, all service removed by calendar_dates.txt
+    assert f.trips_on('20070604') == []
+    # Tuesday, no weekend service.
+    assert set(self.ids(f.trips_on('20070605'))) == \
+      set(['AB1', 'AB2', 'STBA', 'CITY1', 'CITY2', 'BFC1', 'BFC2'])
+
+  def test_trips_on_window(self):
+    f = feed.Feed(util.example_feed())
+    assert self.ids(f.trips_on('20070605', '6:10:00', '6:20:00')) == \
+      ['CITY1', 'STBA']
+    assert self.ids(f.trips_on('20070605', end_time='6:29:00')) == \
+      ['CITY1', 'STBA']
+    assert self.ids(f.trips_on('20070605', start_time='12:00:00')) == \
+      ['BFC2', 'AB2']
+    assert self.ids(f.trips_on('20070603', start_time=14*3600)) == \
+      ['AAMV3', 'AAMV4']
+    assert f.trips_on('20070605', '23:00:00', '24:00:00') == []
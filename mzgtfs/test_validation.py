@@ -0,0 +1,457 @@
+"""Validation unit tests."""
+import unittest
+import pytz
+import os
+import shutil
+import tempfile
+import StringIO
+import json
+
+import feed
+import entities
+import util
+import validation
+
+class TestValidationCache(unittest.TestCase):
+  def test_lookup(self):
+    cache = validation.ValidationCache()
+    calls = []
+    def func(value):
+      calls.append(value)
+      return value * 2
+    assert cache.lookup('func', func, (2,), {}) == 4
+    assert cache.lookup('func', func, (2,), {}) == 4
+    assert cache.lookup('func', func, (3,), {}) == 6
+    assert calls == [2, 3]
+    assert cache.hits['func'] == 1
+    assert cache.misses['func'] == 2
+
+  def test_lookup_kwargs(self):
+    cache = validation.ValidationCache()
+    func = validation.valid_int.uncached
+    assert cache.lookup('valid_int', func, ('5',), {'vmax':3}) is False
+    assert cache.lookup('valid_int', func, ('5',), {}) is True
+    assert len(cache) == 2
+
+  def test_lookup_unhashable(self):
+    cache = validation.ValidationCache()
+    assert cache.lookup('valid_in', validation.valid_in, (1, [1,2]), {})
+    assert len(cache) == 0
+
+  def test_maxsize(self):
+    cache = validation.ValidationCache(maxsize=2)
+    for i in range(5):
+      cache.lookup('str', str, (i,), {})
+    assert len(cache) <= 2
+    assert cache.evictions == 2
+
+  def test_exceptions_cached(self):
+    cache = validation.ValidationCache()
+    calls = []
+    def func(value):
+      calls.append(value)
+      return validation.valid_tz.uncached(value)
+    for i in range(3):
+      with self.assertRaises(pytz.UnknownTimeZoneError):
+        cache.lookup('valid_tz', func, ('Invalid/Zone',), {})
+    assert len(calls) == 1
+    assert cache.hits['valid_tz'] == 2
+
+  def test_hit_rate(self):
+    cache = validation.ValidationCache()
+    assert cache.hit_rate() == 0.0
+    for i in range(4):
+      cache.lookup('valid_color', validation.valid_color.uncached, ('ffffff',), {})
+    assert cache.hit_rate() == 0.75
+    stats = cache.stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['validators']['valid_color']['hit_rate'] == 0.75
+
+  def test_cached_validators(self):
+    validation.CACHE.clear()
+    f = feed.Feed(util.example_feed())
+    f.validate(validator=validation.ValidationReport())
+    assert validation.CACHE.stats()['hits'] > 0
+    assert validation.valid_color('zzzzzz') is False
+    assert validation.valid_color('ffffff') is True
+
+class TestValidationReport(unittest.TestCase):
+  def stop_times(self, count):
+    return [
+      entities.StopTime(
+        trip_id='1',
+        arrival_time='xx:00:00',
+        departure_time='xx:00:00',
+        stop_id='1',
+        stop_sequence=str(i)
+      )
+      for i in range(count)
+    ]
+
+  def validate(self, validator, data):
+    for i in data:
+      with validator(i):
+        assert validation.valid_widetime(i.get('arrival_time')), \
+          "Invalid arrival_time: %s"%i.get('arrival_time')
+      with validator(i):
+        raise validation.ValidationWarning("Warning")
+
+  def test_collect(self):
+    validator = validation.ValidationReport()
+    self.validate(validator, self.stop_times(10))
+    assert len(validator.exceptions) == 20
+    assert validator.errors == 10
+    assert not validator.passed()
+
+  def test_rule(self):
+    validator = validation.ValidationReport()
+    self.validate(validator, self.stop_times(2))
+    assert len(validator.counts) == 2
+    for e in validator.exceptions:
+      assert e.rule.startswith('StopTime.validate:')
+
+  def test_rule_explicit(self):
+    validator = validation.ValidationReport()
+    with validator(self.stop_times(1)[0], rule='test'):
+      assert False
+    assert validator.counts['test'] == 1
+
+  def test_max_per_rule(self):
+    validator = validation.ValidationReport(max_per_rule=3)
+    self.validate(validator, self.stop_times(10))
+    assert len(validator.exceptions) == 6
+    assert sorted(validator.counts.values()) == [10, 10]
+
+  def test_max_per_table(self):
+    validator = validation.ValidationReport(max_per_table=5)
+    self.validate(validator, self.stop_times(10))
+    assert len(validator.exceptions) == 5
+    assert validator.table_counts['stop_times'] == 20
+
+  def test_max_errors(self):
+    validator = validation.ValidationReport(max_errors=4)
+    with self.assertRaises(validation.ValidationAborted):
+      self.validate(validator, self.stop_times(10))
+    assert validator.aborted
+    assert validator.errors == 4
+
+  def test_sample(self):
+    validator = validation.ValidationReport(sample=0.25)
+    data = list(validator.sample(self.stop_times(10)))
+    assert len(data) == 3
+
+  def test_sample_fraction(self):
+    # 1/rate does not round to a useful step for rates above 0.5.
+    validator = validation.ValidationReport(sample=0.75)
+    data = list(validator.sample(self.stop_times(8)))
+    assert len(data) == 6
+    validator = validation.ValidationReport(sample=0.4)
+    data = list(validator.sample(self.stop_times(10)))
+    assert len(data) == 4
+
+  def test_feed_max_errors(self):
+    # Overlay an invalid stops.txt on the example feed.
+    stops = feed.Feed(util.example_feed()).stops()
+    path = tempfile.mkdtemp()
+    with open(os.path.join(path, 'stops.txt'), 'w') as f:
+      f.write('stop_id,stop_name,stop_lat,stop_lon\n')
+      for stop in stops:
+        f.write('%s,%s,100.0,200.0\n'%(stop.id(), stop.name()))
+    f = feed.Feed(util.example_feed(), path=path)
+    validator = validation.ValidationReport(max_errors=3)
+    f.validate(validator=validator, skip_relations=True)
+    assert validator.aborted
+    assert validator.errors == 3
+    shutil.rmtree(path)
+
+  def test_feed_passed(self):
+    f = feed.Feed(util.example_feed())
+    validator = validation.ValidationReport(max_errors=1)
+    f.validate(validator=validator)
+    assert not validator.aborted
+    assert validator.passed()
+
+class TestValidationProfile(unittest.TestCase):
+  def test_record(self):
+    profile = validation.ValidationProfile()
+    profile.record(('Stop', 'a'), 1.0)
+    profile.record(('Stop', 'a'), 2.0, failed=True)
+    profile.record(('Stop', 'b'), 0.5)
+    rows = profile.rows()
+    assert rows[0]['check'] == 'a'
+    assert rows[0]['evaluated'] == 2
+    assert rows[0]['failed'] == 1
+    assert rows[0]['seconds'] == 3.0
+    assert rows[1]['check'] == 'b'
+
+  def test_profile_disabled(self):
+    validator = validation.ValidationReport()
+    assert validator.profile is None
+
+  def test_profile_report(self):
+    validator = validation.ValidationReport(profile=True)
+    stop = entities.Stop(stop_id='1', stop_lat='100', stop_lon='0')
+    stop.validate(validator=validator)
+    rows = validator.profile.rows()
+    assert rows
+    assert all(row['entity'] == 'Stop' for row in rows)
+    assert sum(row['failed'] for row in rows) == len(validator.exceptions)
+    assert sum(row['evaluated'] for row in rows) > len(validator.exceptions)
+
+  def test_profile_manager(self):
+    validator = validation.ValidationManager(profile=True)
+    stop = entities.Stop(stop_id='1', stop_name='Test', stop_lat='0', stop_lon='0')
+    stop.validate(validator=validator)
+    assert validator.profile.rows()
+
+  def test_profile_rule(self):
+    validator = validation.ValidationReport(profile=True)
+    stop = entities.Stop(stop_id='1')
+    with validator(stop, rule='test'):
+      pass
+    assert validator.profile.checks[('Stop', 'test')][0] == 1
+
+  def test_profile_report_names(self):
+    # The profile and the report name unnamed checks the same way.
+    validator = validation.ValidationReport(profile=True)
+    stop = entities.Stop(stop_id='1')
+    with validator(stop):
+      x = 1
+      assert x == 2
+    e = validator.exceptions[0]
+    assert ('Stop', e.rule[len('Stop.'):]) in validator.profile.checks
+
+class TestValidationState(unittest.TestCase):
+  def overlay(self, stop_lat='100.0'):
+    # Overlay a stops.txt on the example feed.
+    stops = feed.Feed(util.example_feed()).stops()
+    path = tempfile.mkdtemp()
+    with open(os.path.join(path, 'stops.txt'), 'w') as f:
+      f.write('stop_id,stop_name,stop_lat,stop_lon\n')
+      for stop in sorted(stops, key=lambda x:x.id()):
+        f.write('%s,%s,%s,-117.0\n'%(stop.id(), stop.name(), stop_lat))
+    return path
+
+  def test_finding(self):
+    stop = entities.Stop(stop_id='1')
+    e = validation.ValidationWarning('Test', source=stop, rule='test')
+    record = validation.finding(e)
+    assert record['table'] == 'stops'
+    assert record['id'] == '1'
+    assert record['severity'] == 'warning'
+    assert record['message'] == 'Test'
+    e2 = validation.from_finding(record)
+    assert isinstance(e2, validation.ValidationWarning)
+    assert e2.table == 'stops'
+    assert e2.rule == 'test'
+
+  def test_dump_load(self):
+    state = validation.ValidationState()
+    state.update('stops', 'abc', [{'message':'test'}])
+    f = StringIO.StringIO()
+    state.dump(f)
+    f.seek(0)
+    state2 = validation.ValidationState.load(f)
+    assert state2.hash('stops') == 'abc'
+    assert state2.results('stops') == [{'message':'test'}]
+
+  def test_incremental(self):
+    path = self.overlay()
+    state = validation.ValidationState()
+    f = feed.Feed(util.example_feed(), path=path)
+    report1 = f.validate(validation.ValidationReport(), state=state)
+    assert report1.errors == 9
+    assert state.hash('stops')
+    assert len(state.results('stops')) == 9
+    # Nothing changed; reuse all results without loading.
+    f = feed.Feed(util.example_feed(), path=path)
+    report2 = f.validate(validation.ValidationReport(), state=state)
+    assert report2.errors == 9
+    assert not f.by_id
+    shutil.rmtree(path)
+
+  def test_incremental_changed(self):
+    path = self.overlay()
+    state = validation.ValidationState()
+    f = feed.Feed(util.example_feed(), path=path)
+    f.validate(validation.ValidationReport(), state=state)
+    previous = state.hash('stops')
+    shutil.rmtree(path)
+    path = self.overlay(stop_lat='36.0')
+    f = feed.Feed(util.example_feed(), path=path)
+    checked = f._changed_tables(state, dict(
+      (table, f.table_hash(table)) for table in f.REQUIRED + f.OPTIONAL
+    ))
+    assert checked == set(['stops', 'stop_times', 'transfers'])
+    report = f.validate(validation.ValidationReport(), state=state)
+    assert report.passed()
+    assert state.hash('stops') != previous
+    assert state.results('stops') == []
+    shutil.rmtree(path)
+
+  def test_incremental_budget(self):
+    # Every finding is kept in the state, not only the examples.
+    path = self.overlay()
+    state = validation.ValidationState()
+    f = feed.Feed(util.example_feed(), path=path)
+    f.validate(validation.ValidationReport(max_per_rule=1), state=state)
+    assert len(state.results('stops')) == 9
+    f = feed.Feed(util.example_feed(), path=path)
+    report = f.validate(validation.ValidationReport(max_per_rule=1), state=state)
+    assert not f.by_id
+    assert report.errors == 9
+    assert len(report.exceptions) < 9
+    shutil.rmtree(path)
+
+  def test_incremental_options(self):
+    path = self.overlay()
+    state = validation.ValidationState()
+    f = feed.Feed(util.example_feed(), path=path)
+    f.validate(validation.ValidationReport(sample=0.5), state=state)
+    assert state.options == {'sample': 0.5, 'skip_relations': False}
+    # A different sample rate re-checks every table.
+    f = feed.Feed(util.example_feed(), path=path)
+    report = f.validate(validation.ValidationReport(), state=state)
+    assert f.by_id
+    assert report.errors == 9
+    assert state.options == {'skip_relations': False}
+    shutil.rmtree(path)
+
+  def test_incremental_aborted(self):
+    path = self.overlay()
+    state = validation.ValidationState()
+    f = feed.Feed(util.example_feed(), path=path)
+    report = f.validate(validation.ValidationReport(max_errors=1), state=state)
+    assert report.aborted
+    assert not state.tables
+    assert not state.options
+    shutil.rmtree(path)
+
+class TestStreamingReport(unittest.TestCase):
+  def test_stream(self):
+    out = StringIO.StringIO()
+    validator = validation.StreamingReport(out=out)
+    stop = entities.Stop(stop_id='1', stop_name='Test', stop_lat='100', stop_lon='0')
+    stop.validate(validator=validator)
+    assert not validator.exceptions
+    lines = out.getvalue().splitlines()
+    assert len(lines) == validator.written == sum(validator.counts.values())
+    for line in lines:
+      record = json.loads(line)
+      assert record['table'] == 'stops'
+      assert record['id'] == '1'
+      assert record['ids'] == {'stop_id': '1'}
+      assert record['severity'] == 'error'
+      assert record['rule']
+      assert record['message']
+
+  def test_callback(self):
+    records = []
+    validator = validation.StreamingReport(callback=records.append, max_per_rule=1)
+    for i in range(3):
+      stop = entities.Stop(stop_id=str(i), stop_name='Test', stop_lat='100', stop_lon='0')
+      stop.validate(validator=validator)
+    assert len(records) == len(validator.counts)
+    assert validator.errors == 3 * len(records)
+
+  def test_feed_rows(self):
+    records = []
+    f = feed.Feed(util.example_feed())
+    validator = validation.StreamingReport(callback=records.append)
+    for stop in f.iterread('stops'):
+      with validator(stop):
+        raise validation.ValidationWarning('Test')
+    assert sorted(i['row'] for i in records) == range(1, 10)
+
+class TestRules(unittest.TestCase):
+  rules = [
+    validation.Rule('a', validation.required, "Required: a"),
+    validation.Rule('b', validation.valid_int, "Invalid b: %(value)s",
+      optional=True, vmin=0),
+    validation.Rule(None, lambda x:x.get('a') != x.get('b'),
+      lambda x:"Same: %s"%x.get('a'), entity=True, name='a:b',
+      severity=validation.ValidationWarning),
+    validation.Rule('c', lambda x:x.startswith('c'), "Invalid c"),
+    validation.Rule('d', int, "Invalid d", optional=True)
+  ]
+
+  def check(self, **data):
+    check = validation.compile_rules(self.rules)
+    validator = validation.ValidationReport()
+    check(entities.Entity(**data), validator)
+    return validator
+
+  def test_pass(self):
+    validator = self.check(a='1', b='2', c='c')
+    assert not validator.exceptions
+
+  def test_fail(self):
+    validator = self.check(a='', b='-1', c='c')
+    messages = [e.message for e in validator.exceptions]
+    assert messages == ["Required: a", "Invalid b: -1"]
+    assert validator.exceptions[0].rule == 'Entity.a:required'
+    assert validator.exceptions[1].rule == 'Entity.b:valid_int'
+
+  def test_optional(self):
+    validator = self.check(a='1', c='c')
+    assert not validator.exceptions
+
+  def test_entity(self):
+    validator = self.check(a='1', b='1', c='c')
+    assert len(validator.exceptions) == 1
+    e = validator.exceptions[0]
+    assert isinstance(e, validation.ValidationWarning)
+    assert e.message == "Same: 1"
+    assert e.rule == 'Entity.a:b'
+
+  def test_missing(self):
+    # c is missing; the predicate is not called.
+    validator = self.check(a='1', b='2')
+    assert [e.message for e in validator.exceptions] == ["Invalid c"]
+
+  def test_predicate_exception(self):
+    # Invalid data raises ValueError, a failure.
+    validator = self.check(a='1', b='2', c='c', d='x')
+    assert [e.message for e in validator.exceptions] == ["Invalid d"]
+
+  def test_predicate_error(self):
+    # Other exceptions are bugs in the predicate, and are raised.
+    rules = [validation.Rule('a', lambda x:x.missing(), "Invalid a")]
+    check = validation.compile_rules(rules)
+    with self.assertRaises(AttributeError):
+      check(entities.Entity(a='1'), validation.ValidationReport())
+    with self.assertRaises(AttributeError):
+      rules[0].evaluate(entities.Entity(a='1'))
+
+  def test_manager_raises(self):
+    check = validation.compile_rules(self.rules)
+    with self.assertRaises(validation.ValidationError):
+      check(entities.Entity(a='', c='c'), validation.ValidationManager())
+
+  def test_profiled(self):
+    check = validation.compile_rules(self.rules)
+    validator = validation.ValidationReport(profile=True)
+    check(entities.Entity(a='', b='1', c='c'), validator)
+    assert len(validator.exceptions) == 1
+    assert validator.profile.checks[('Entity', 'a:required')][:2] == [1, 1]
+    assert validator.profile.checks[('Entity', 'c:<lambda>')][:2] == [1, 0]
+
+  def test_reference(self):
+    f = feed.Feed(util.example_feed())
+    stoptime = entities.StopTime.from_row(
+      {'trip_id': 'missing', 'stop_id': 'STAGECOACH'},
+      feed=f
+    )
+    validator = stoptime.validate_feed(validation.ValidationReport())
+    assert [e.message for e in validator.exceptions] == ["Unknown trip_id"]
+
+  def test_entity_rules(self):
+    route = entities.Route(route_id='1', route_type='99', route_color='zz')
+    validator = route.validate(validation.ValidationReport())
+    messages = [e.message for e in validator.exceptions]
+    assert messages == [
+      "Invalid route_type",
+      "Must provide either route_short_name or route_long_name",
+      "Invalid route_color"
+    ]
@@ -0,0 +1,59 @@
+"""WideTime unit tests."""
+import unittest
+import pickle
+
+import widetime
+
+class TestWideTime(unittest.TestCase):
+  def test_init(self):
+    t = widetime.WideTime(25, 30, 15)
+    assert t == 25*3600 + 30*60 + 15
+    assert t.hours == 25
+    assert t.minutes == 30
+    assert t.seconds == 15
+
+  def test_invalid(self):
+    with self.assertRaises(AssertionError):
+      widetime.WideTime(1, 61, 0)
+
+  def test_from_string(self):
+    t = widetime.WideTime.from_string('6:05:00')
+    assert list(t) == [6, 5, 0]
+    assert str(t) == '06:05:00'
+    with self.assertRaises(ValueError):
+      widetime.WideTime.from_string('xx:00:00')
+
+  def test_from_string_cache(self):
+    t1 = widetime.WideTime.from_string('26:00:01')
+    t2 = widetime.WideTime.from_string('26:00:01')
+    assert t1 is t2
+
+  def test_from_seconds(self):
+    t = widetime.WideTime.from_seconds(3661)
+    assert list(t) == [1, 1, 1]
+
+  def test_compare(self):
+    t1 = widetime.WideTime.from_string('06:00:00')
+    t2 = widetime.WideTime.from_string('24:00:00')
+    assert t1 < t2
+    assert t1 <= t2
+    assert t2 > t1
+    assert t2 >= t1
+    assert t1 == widetime.WideTime(6)
+    assert sorted([t2, t1]) == [t1, t2]
+
+  def test_arithmetic(self):
+    t1 = widetime.WideTime(6)
+    t2 = widetime.WideTime(7, 30)
+    assert t2 - t1 == 5400
+    assert t1 + t2 == 48600
+    assert t1.as_seconds() == 21600
+
+  def test_nonzero(self):
+    assert widetime.WideTime(0)
+
+  def test_pickle(self):
+    t = widetime.WideTime(25, 1, 2)
+    t2 = pickle.loads(pickle.dumps(t, 2))
+    assert t2 == t
+    assert isinstance(t2, widetime.WideTime)
@@ -0,0 +1,69 @@
+"""Writer unit tests."""
+import unittest
+import csv
+import StringIO
+
+import entities
+import writer
+
+def read(data):
+  return list(csv.reader(StringIO.StringIO(data)))
+
+class TestSchema(unittest.TestCase):
+  def test_list(self):
+    data = [entities.Stop(stop_id='1'), entities.Stop(stop_id='2', stop_name='b')]
+    columns, rows = writer.schema(data)
+    assert columns == ['stop_id', 'stop_name']
+    assert rows is data
+
+  def test_iterator(self):
+    data = (entities.Stop(stop_id=str(i), zzz='x') for i in range(5))
+    columns, rows = writer.schema(data, sample=2)
+    assert columns == entities.Stop.REQUIRED + entities.Stop.OPTIONAL + ['zzz']
+    assert len(list(rows)) == 5
+
+class TestExternalSort(unittest.TestCase):
+  def test_sort(self):
+    rows = [[str(i % 7), i] for i in range(50)]
+    expect = sorted(rows, key=lambda x:x[0])
+    for chunk_size in [1, 3, 10, 100]:
+      result = list(writer.external_sort(iter(rows), key=lambda x:x[0],
+        chunk_size=chunk_size))
+      assert result == expect
+
+  def test_empty(self):
+    assert list(writer.external_sort([], key=lambda x:x)) == []
+
+class TestWriteEntities(unittest.TestCase):
+  def test_generator(self):
+    f = StringIO.StringIO()
+    data = (entities.Agency(agency_id=str(i), agency_name='a%s'%i) for i in range(3))
+    count = writer.write_entities(f, data, buffer_size=2)
+    assert count == 3
+    rows = read(f.getvalue())
+    assert rows[0] == entities.Agency.REQUIRED + entities.Agency.OPTIONAL
+    assert len(rows) == 4
+    assert rows[1][rows[0].index('agency_name')] == 'a0'
+
+  def test_sorted(self):
+    f = StringIO.StringIO()
+    data = (entities.Stop(stop_id=str(i)) for i in [3, 1, 2, 5, 4])
+    writer.write_entities(f, data, sortkey='stop_id', columns=['stop_id'],
+      chunk_size=2)
+    assert read(f.getvalue()) == [['stop_id'], ['1'], ['2'], ['3'], ['4'], ['5']]
+
+  def test_columns(self):
+    f = StringIO.StringIO()
+    data = [entities.Stop(stop_id='1', stop_name='a')]
+    writer.write_entities(f, iter(data), columns=['stop_id'])
+    assert read(f.getvalue()) == [['stop_id'], ['1']]
+
+  def test_strict(self):
+    f = StringIO.StringIO()
+    # An unknown column after the rows used to infer the schema.
+    data = [entities.Stop(stop_id=str(i)) for i in range(writer.SAMPLE_SIZE)]
+    data.append(entities.Stop(stop_id='x', extra='x'))
+    with self.assertRaises(ValueError):
+      writer.write_entities(f, iter(data))
+    # Inferred from all entities in a list.
+    writer.write_entities(f, data)
@@ -0,0 +1,140 @@
+"""Zip stream unit tests."""
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+
+import feed
+import util
+import entities
+import zipstream
+
+class TestZipWriter(unittest.TestCase):
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.filename = os.path.join(self.path, 'test.zip')
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_open(self):
+    with zipstream.ZipWriter(self.filename) as zw:
+      with zw.open('a.txt') as member:
+        for i in range(1000):
+          member.write('line %s\n'%i)
+      with zw.open('b.txt', compress=False) as member:
+        member.write(u'caf\xe9')
+    zf = zipfile.ZipFile(self.filename)
+    assert zf.testzip() is None
+    assert zf.read('a.txt').splitlines()[-1] == 'line 999'
+    assert zf.getinfo('a.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert zf.getinfo('b.txt').compress_type == zipfile.ZIP_STORED
+    assert zf.read('b.txt') == u'caf\xe9'.encode('utf-8')
+
+  def test_one_member_at_a_time(self):
+    with zipstream.ZipWriter(self.filename) as zw:
+      member = zw.open('a.txt')
+      with self.assertRaises(ValueError):
+        zw.open('b.txt')
+      member.close()
+
+  def test_abort(self):
+    # An error inside the block leaves no partial archive behind.
+    with self.assertRaises(ValueError):
+      with zipstream.ZipWriter(self.filename) as zw:
+        with zw.open('a.txt') as member:
+          member.write('partial')
+          raise ValueError('stop')
+    assert not os.path.exists(self.filename)
+
+  def test_write_entities(self):
+    data = (entities.Stop(stop_id=str(i), stop_name='Stop %s'%i) for i in range(5))
+    with zipstream.ZipWriter(self.filename) as zw:
+      count = zw.write_entities('stops.txt', data, sortkey='stop_id')
+    assert count == 5
+    f = feed.Feed(self.filename)
+    assert sorted(i.id() for i in f.stops()) == ['0', '1', '2', '3', '4']
+
+  def test_clone(self):
+    source = zipfile.ZipFile(util.example_feed())
+    with zipstream.ZipWriter(self.filename) as zw:
+      zw.clone(source, 'stops.txt')
+    zf = zipfile.ZipFile(self.filename)
+    assert zf.testzip() is None
+    assert zf.read('stops.txt') == source.read('stops.txt')
+    info, expect = zf.getinfo('stops.txt'), source.getinfo('stops.txt')
+    assert info.compress_size == expect.compress_size
+    assert info.CRC == expect.CRC
+
+  def test_clone_recompress(self):
+    source = zipfile.ZipFile(util.example_feed())
+    with zipstream.ZipWriter(self.filename, compress=False) as zw:
+      zw.clone(source, 'stops.txt', 'copy.txt')
+    zf = zipfile.ZipFile(self.filename)
+    assert zf.getinfo('copy.txt').compress_type == zipfile.ZIP_STORED
+    assert zf.read('copy.txt') == source.read('stops.txt')
+
+  def test_deflate_chunk(self):
+    data = ''.join('line %s\n'%i for i in range(1000))
+    chunks = [data[i:i+1000] for i in range(0, len(data), 1000)]
+    compressed = ''.join(
+      zipstream.deflate_chunk(chunk, 6, i == len(chunks) - 1)
+      for i, chunk in enumerate(chunks)
+    )
+    assert zlib.decompress(compressed, -15) == data
+
+  def test_write_parallel(self):
+    files = []
+    for name in ['a.txt', 'b.txt', 'empty.txt']:
+      filename = os.path.join(self.path, name)
+      with open(filename, 'wb') as f:
+        if name != 'empty.txt':
+          f.write(''.join('%s %s\n'%(name, i) for i in range(5000)))
+      files.append((filename, name))
+    with zipstream.ZipWriter(self.filename) as zw:
+      zw.write_parallel(files, workers=3, levels={'b.txt': 0}, chunk_size=1000)
+    zf = zipfile.ZipFile(self.filename)
+    assert zf.testzip() is None
+    for filename, name in files:
+      with open(filename, 'rb') as f:
+        assert zf.read(name) == f.read()
+    assert zf.getinfo('a.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert zf.getinfo('b.txt').compress_type == zipfile.ZIP_STORED
+
+class TestFeedWriteZip(unittest.TestCase):
+  def test_write_zip(self):
+    path = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(path, 'new.zip')
+      f = feed.Feed(util.example_feed())
+      stops = list(f.iterread('stops'))
+      for stop in stops:
+        stop.set('zone_id', '1')
+      f.write_zip(filename, {'stops': stops}, sortkeys={'stops': 'stop_id'})
+      zf = zipfile.ZipFile(filename)
+      assert zf.testzip() is None
+      assert sorted(zf.namelist()) == \
+        sorted(zipfile.ZipFile(util.example_feed()).namelist())
+      f2 = feed.Feed(filename)
+      assert set(i.get('zone_id') for i in f2.stops()) == set(['1'])
+      assert len(f2.stop_times()) == len(f.stop_times())
+      with self.assertRaises(IOError):
+        f.write_zip(filename)
+    finally:
+      shutil.rmtree(path)
+
+  def test_write_zip_error(self):
+    def stops():
+      yield entities.Stop(stop_id='1', stop_name='Stop 1')
+      raise KeyError('stop_lat')
+    path = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(path, 'new.zip')
+      f = feed.Feed(util.example_feed())
+      with self.assertRaises(KeyError):
+        f.write_zip(filename, {'stops': stops()})
+      assert not os.path.exists(filename)
+    finally:
+      shutil.rmtree(path)
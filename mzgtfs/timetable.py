@@ -0,0 +1,130 @@
+"""Compact timetables: stop times as arrays, and indexes over them."""
+import array
+import bisect
+import collections
+
+import widetime
+
+# Stop times for a trip, in stop_sequence order. Times are seconds since
+# the start of the service day; missing times are -1.
+TripTimes = collections.namedtuple(
+  'TripTimes',
+  ['stops', 'arrivals', 'departures', 'sequences']
+)
+
+def _seconds(value):
+  if not value:
+    return -1
+  return widetime.WideTime.from_string(value)
+
+def first_departure(times):
+  """First departure time of a trip, or None."""
+  for t in times.departures:
+    if t >= 0:
+      return t
+
+def last_arrival(times):
+  """Last arrival time of a trip, or None."""
+  for t in reversed(times.arrivals):
+    if t >= 0:
+      return t
+
+class Timetable(object):
+  """Stop times for every trip, as arrays, built in one pass.
+
+  Reading stop_times.txt through iterread, instead of preloading the
+  entity graph, keeps memory to a few arrays per trip.
+  """
+  def __init__(self, stop_times=None):
+    # trip_id -> TripTimes
+    self.trips = {}
+    rows = collections.defaultdict(list)
+    stops = {}
+    for stop_time in (stop_times or []):
+      stop_id = stop_time.get('stop_id')
+      rows[stop_time.get('trip_id')].append((
+        int(stop_time.get('stop_sequence')),
+        stops.setdefault(stop_id, stop_id),
+        _seconds(stop_time.get('arrival_time')),
+        _seconds(stop_time.get('departure_time'))
+      ))
+    for trip_id, trip_rows in rows.items():
+      trip_rows.sort()
+      sequences, trip_stops, arrivals, departures = zip(*trip_rows)
+      self.trips[trip_id] = TripTimes(
+        trip_stops,
+        array.array('i', arrivals),
+        array.array('i', departures),
+        array.array('i', sequences)
+      )
+
+  @classmethod
+  def from_feed(cls, feed):
+    return cls(feed.iterread('stop_times'))
+
+  def __len__(self):
+    return len(self.trips)
+
+  def __contains__(self, trip_id):
+    return trip_id in self.trips
+
+  def get(self, trip_id):
+    """Return the TripTimes for a trip, or None."""
+    return self.trips.get(trip_id)
+
+class TripIndex(object):
+  """Trips by service, sorted by first departure.
+
+  For each service, keeps the first departure and last arrival of each
+  trip, and the longest trip duration. A time window query is then two
+  binary searches: trips must start before the end of the window, and
+  cannot end after the window starts if they started more than the
+  longest duration before it.
+  """
+  def __init__(self, timetable, trips):
+    """Build from a Timetable, and Trip entities for their service_id."""
+    data = collections.defaultdict(list)
+    for trip in trips:
+      times = timetable.get(trip.id())
+      if not times:
+        continue
+      start, end = first_departure(times), last_arrival(times)
+      if start is None or end is None:
+        continue
+      data[trip.get('service_id')].append((start, end, trip.id()))
+    # service_id -> (starts, ends, trip_ids, longest duration)
+    self._index = {}
+    for service_id, rows in data.items():
+      rows.sort()
+      starts, ends, trip_ids = zip(*rows)
+      self._index[service_id] = (
+        array.array('i', starts),
+        array.array('i', ends),
+        trip_ids,
+        max(end - start for start, end, _ in rows)
+      )
+
+  def trip_ids(self, service_ids, start=None, end=None):
+    """Return trips of the services running between start and end.
+
+    Trips are sorted by first departure.
+
+    A trip runs in the window if its first departure is no later than
+    end, and its last arrival is no earlier than start.
+    """
+    ret = []
+    for service_id in service_ids:
+      try:
+        starts, ends, trip_ids, longest = self._index[service_id]
+      except KeyError:
+        continue
+      lo = 0
+      hi = len(starts)
+      if start is not None:
+        lo = bisect.bisect_left(starts, start - longest)
+      if end is not None:
+        hi = bisect.bisect_right(starts, end)
+      for i in xrange(lo, hi):
+        if start is None or ends[i] >= start:
+          ret.append((starts[i], trip_ids[i]))
+    return [trip_id for _, trip_id in sorted(ret)]
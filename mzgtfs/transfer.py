@@ -8,6 +8,7 @@ import widetime
 import validation
 
 class Transfer(entity.Entity):
+  TABLE = 'transfers'
   REQUIRED = [
     'from_stop_id',
     'to_stop_id',
@@ -16,28 +17,18 @@ class Transfer(entity.Entity):
   OPTIONAL = [
     'min_transfer_time'
   ]
-  
-  def validate(self, validator=None):
-    validator = super(Transfer, self).validate(validator)
+  RULES = [
     # Required
-    with validator(self):
-      assert self.get('from_stop_id'), "Required: from_stop_id"
-    with validator(self):
-      assert self.get('to_stop_id'), "Required: to_stop_id"
-    with validator(self):
-      # field required, blank allowed.
-      assert validation.valid_int(self.get('transfer_type'), vmin=0, vmax=3, empty=True), \
-        "Invalid transfer_type"
-    with validator(self):
-      if self.get('min_transfer_time'):
-        assert validation.valid_int(self.get('min_transfer_time'), vmin=0), \
-        "Invalid min_transfer_time"
-    return validator
-    
-  def validate_feed(self, validator=None):
-    validator = super(Transfer, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.stop(self.get('from_stop_id')), "Unknown from_stop_id"
-    with validator(self):
-      assert self._feed.stop(self.get('to_stop_id')), "Unknown to_stop_id"
-    return validator
\ No newline at end of file
+    validation.Rule('from_stop_id', validation.required,
+      "Required: from_stop_id"),
+    validation.Rule('to_stop_id', validation.required, "Required: to_stop_id"),
+    # field required, blank allowed.
+    validation.Rule('transfer_type', validation.valid_int,
+      "Invalid transfer_type", vmin=0, vmax=3, empty=True),
+    validation.Rule('min_transfer_time', validation.valid_int,
+      "Invalid min_transfer_time", optional=True, vmin=0)
+  ]
+  FEED_RULES = [
+    validation.Reference('from_stop_id', 'stops', "Unknown from_stop_id"),
+    validation.Reference('to_stop_id', 'stops', "Unknown to_stop_id")
+  ]
@@ -2,10 +2,20 @@
 import entity
 import validation
 
+def _increasing_sequence(trip):
+  cur = 0
+  for i in trip.stop_sequence():
+    j = int(i.get('stop_sequence'))
+    if j <= cur:
+      return False
+    cur = j
+  return True
+
 class Trip(entity.Entity):
   """GTFS Trip entity."""
   ENTITY_TYPE = 't'
   KEY = 'trip_id'
+  TABLE = 'trips'
   REQUIRED = [
     'trip_id',
     'route_id',
@@ -20,6 +30,30 @@ class Trip(entity.Entity):
     'wheelchair_accessible',
     'bikes_allowed',
   ]
+  RULES = [
+    # Required
+    validation.Rule('route_id', validation.required, "Required: route_id"),
+    validation.Rule('service_id', validation.required, "Required: service_id"),
+    validation.Rule('trip_id', validation.required, "Required: trip_id"),
+    # TODO: Warnings:
+    #   speed/vehicle_type
+    #   duplicate trips
+    # Optional
+    validation.Rule('direction_id', validation.valid_bool,
+      "Invalid direction_id", optional=True),
+    validation.Rule('wheelchair_accessible', validation.valid_int,
+      "Invalid wheelchair_accessible", optional=True, vmin=0, vmax=2, empty=True),
+    validation.Rule('bikes_allowed', validation.valid_int,
+      "Invalid bikes_allowed", optional=True, vmin=0, vmax=2, empty=True)
+  ]
+  FEED_RULES = [
+    validation.Reference('route_id', 'routes', "Unknown route_id"),
+    validation.Reference('service_id', 'calendar', "Unknown service_id"),
+    validation.Rule(None, _increasing_sequence,
+      "Invalid stop_time sequence: stop_sequence must increase",
+      entity=True, name='stop_sequence')
+    # TODO: validate shape
+  ]
   def id(self):
     return self.get('trip_id')
 
@@ -40,57 +74,3 @@ class Trip(entity.Entity):
       self.stop_times(),
       key=lambda x:int(x.get('stop_sequence'))
     )
-
-  ##### Validation #####
-  def validate(self, validator=None):
-    validator = super(Trip, self).validate(validator)
-    # Required
-    with validator(self):
-      assert self.get('route_id'), "Required: route_id"
-    with validator(self):
-      assert self.get('service_id'), "Required: service_id"
-    with validator(self):
-      assert self.get('trip_id'), "Required: trip_id"
-    # TODO: Warnings:
-    #   speed/vehicle_type
-    #   duplicate trips
-    # Optional
-    with validator(self):
-      if self.get('direction_id'):
-        assert validation.valid_bool(self.get('direction_id')), "Invalid direction_id"
-    with validator(self):
-      if self.get('wheelchair_accessible'):
-        assert validation.valid_int(self.get('wheelchair_accessible'), vmin=0, vmax=2, empty=True), \
-          "Invalid wheelchair_accessible"
-    with validator(self):
-      if self.get('bikes_allowed'):
-        assert validation.valid_int(self.get('bikes_allowed'), vmin=0, vmax=2, empty=True), \
-          "Invalid bikes_allowed"
-    with validator(self):
-      if self.get('trip_headsign'):
-        pass
-    with validator(self):
-      if self.get('trip_short_name'):
-        pass
-    with validator(self):
-      if self.get('block_id'):
-        pass
-    with validator(self):
-      if self.get('shape_id'):
-        pass
-
-  def validate_feed(self, validator=None):
-    validator = super(Trip, self).validate_feed(validator)
-    with validator(self):
-      assert self._feed.route(self.get('route_id')), "Unknown route_id"
-    with validator(self):
-      assert self._feed.service_period(self.get('service_id')), "Unknown service_id"
-    with validator(self):
-      cur = 0
-      for i in self.stop_sequence():
-        j = int(i.get('stop_sequence'))
-        assert j > cur, \
-          "Invalid stop_time sequence: stop_sequence must increase"
-        cur = j
-    # TODO: validate shape
-    return validator
@@ -1,4 +1,6 @@
 """Validate a GTFS file."""
+import os
+import sys
 import argparse
 import json
 
@@ -11,9 +13,72 @@ if __name__ == "__main__":
   parser.add_argument('--debug', 
     help='Show helpful debugging information', 
     action='store_true')
+  parser.add_argument('--max-per-rule',
+    help='Maximum number of errors to report for each rule',
+    type=int)
+  parser.add_argument('--max-per-table',
+    help='Maximum number of errors to report for each table',
+    type=int)
+  parser.add_argument('--max-errors',
+    help='Stop validating after this many errors',
+    type=int)
+  parser.add_argument('--sample',
+    help='Validate only this fraction of rows in each table, e.g. 0.1',
+    type=float)
+  parser.add_argument('--state',
+    help='Validation state file; only re-check tables changed since the last run')
+  parser.add_argument('--jsonl',
+    help='Write findings as JSON lines to this file ("-" for stdout)')
+  parser.add_argument('--profile',
+    help='Show timing and counters for each validation check',
+    action='store_true')
   args = parser.parse_args()
   
-  validator = validation.ValidationReport()
+  options = dict(
+    max_per_rule=args.max_per_rule,
+    max_per_table=args.max_per_table,
+    max_errors=args.max_errors,
+    sample=args.sample,
+    profile=args.profile
+  )
+  out = None
+  if args.jsonl == '-':
+    # Keep stdout valid JSON lines; any text goes to stderr.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+  elif args.jsonl:
+    out = open(args.jsonl, 'w')
+  if out:
+    validator = validation.StreamingReport(out=out, **options)
+  else:
+    validator = validation.ValidationReport(**options)
+  state = None
+  if args.state:
+    state = validation.ValidationState()
+    if os.path.exists(args.state):
+      with open(args.state) as f:
+        state = validation.ValidationState.load(f)
   feed = feed.Feed(args.filename, debug=args.debug)
-  feed.validate(validator=validator)
-  validator.report()
\ No newline at end of file
+  feed.validate(validator=validator, state=state)
+  if state:
+    with open(args.state, 'w') as f:
+      state.dump(f)
+  if out and out is not sys.__stdout__:
+    out.close()
+  validator.report()
+  if args.profile:
+    validator.profile.report()
+  if args.debug:
+    stats = validation.CACHE.stats()
+    print "Validation cache: %s hits, %s misses (%0.1f%%)"%(
+      stats['hits'],
+      stats['misses'],
+      stats['hit_rate'] * 100
+    )
+    for name, value in sorted(stats['validators'].items()):
+      print "  %s: %s hits, %s misses (%0.1f%%)"%(
+        name,
+        value['hits'],
+        value['misses'],
+        value['hit_rate'] * 100
+      )
\ No newline at end of file
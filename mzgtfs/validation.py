@@ -1,8 +1,13 @@
 """Validation exceptions and managers."""
+import sys
+import math
+import json
+import timeit
 import pytz
 import traceback
-import contextlib
 import datetime
+import collections
+import functools
 
 import iso639
 import widetime
@@ -10,6 +15,110 @@ import widetime
 def make_validator(validator=None):
   return validator or ValidationManager()
 
+##### Validation result cache #####
+
+class ValidationCache(object):
+  """A bounded cache of validator results.
+
+  Feeds repeat a small number of distinct values (times, timezones, colors,
+  pickup types...) a very large number of times. Results are keyed by the
+  validator name and its arguments, and shared by all entity validators.
+  An exception raised by a validator is cached and raised again.
+  When the cache is full, it is cleared and starts over.
+  """
+  def __init__(self, maxsize=100000):
+    self.maxsize = maxsize
+    self.data = {}
+    self.hits = collections.defaultdict(int)
+    self.misses = collections.defaultdict(int)
+    self.evictions = 0
+
+  def __len__(self):
+    return len(self.data)
+
+  def lookup(self, name, func, args, kwargs):
+    """Return the cached result of func(*args, **kwargs), or compute it."""
+    if kwargs:
+      key = (name, args, tuple(sorted(kwargs.items())))
+    else:
+      key = (name, args)
+    try:
+      ok, value = self.data[key]
+    except KeyError:
+      pass
+    except TypeError:
+      # Unhashable arguments; do not cache.
+      return func(*args, **kwargs)
+    else:
+      self.hits[name] += 1
+      if not ok:
+        raise value
+      return value
+    # Exceptions are cached too, and raised again on each hit.
+    try:
+      ok, value = True, func(*args, **kwargs)
+    except Exception, e:
+      ok, value = False, e
+    self.misses[name] += 1
+    if len(self.data) >= self.maxsize:
+      self.evictions += 1
+      self.data.clear()
+    self.data[key] = (ok, value)
+    if not ok:
+      raise value
+    return value
+
+  def clear(self):
+    self.data.clear()
+    self.hits.clear()
+    self.misses.clear()
+    self.evictions = 0
+
+  def hit_rate(self, name=None):
+    """Fraction of lookups answered from the cache."""
+    if name:
+      hits, misses = self.hits[name], self.misses[name]
+    else:
+      hits, misses = sum(self.hits.values()), sum(self.misses.values())
+    if not (hits + misses):
+      return 0.0
+    return hits / float(hits + misses)
+
+  def stats(self):
+    """Return hit and miss counts, overall and for each validator."""
+    names = sorted(set(self.hits) | set(self.misses))
+    return {
+      'size': len(self.data),
+      'maxsize': self.maxsize,
+      'evictions': self.evictions,
+      'hits': sum(self.hits.values()),
+      'misses': sum(self.misses.values()),
+      'hit_rate': self.hit_rate(),
+      'validators': dict(
+        (name, {
+          'hits': self.hits[name],
+          'misses': self.misses[name],
+          'hit_rate': self.hit_rate(name)
+        })
+        for name in names
+      )
+    }
+
+# Shared by all validators.
+CACHE = ValidationCache()
+
+def cached(func):
+  """Decorator: cache validator results in the shared ValidationCache."""
+  name = func.__name__
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    return CACHE.lookup(name, func, args, kwargs)
+  wrapper.uncached = func
+  return wrapper
+
+##### Validators #####
+
+@cached
 def valid_color(color):
   color = str(color).lower().strip()
   if len(color) != 6:
@@ -24,12 +133,15 @@ def valid_color(color):
 def valid_url(url):
   return url.startswith('http')
 
+@cached
 def valid_tz(tz):
   return pytz.timezone(tz)
 
+@cached
 def valid_language(lang):
   return iso639.get_language(lang)
 
+@cached
 def valid_int(value, vmin=None, vmax=None, empty=False):
   # Allow empty string if empty=True
   if value == '' and empty:
@@ -44,6 +156,7 @@ def valid_int(value, vmin=None, vmax=None, empty=False):
     return False
   return True
   
+@cached
 def valid_float(value, vmin=None, vmax=None, empty=False):
   # Allow empty string if empty=True
   if value == '' and empty:
@@ -61,6 +174,7 @@ def valid_float(value, vmin=None, vmax=None, empty=False):
 def valid_in(value, within):
   return value in within
 
+@cached
 def valid_bool(value, empty=False):
   if value == '' and empty:
     return True
@@ -70,6 +184,7 @@ def valid_bool(value, empty=False):
     return False
   return value in [0,1]
 
+@cached
 def valid_date(value, empty=False):
   if not value and empty:
     return True
@@ -81,6 +196,7 @@ def valid_date(value, empty=False):
     return False
   return True
 
+@cached
 def valid_widetime(value):
   if len(value.split(':')) != 3:
     return False
@@ -107,9 +223,11 @@ def valid_point(point):
 ##### Validation Exceptions #####
 
 class ValidationException(Exception):
-  def __init__(self, message, source=None):
+  def __init__(self, message, source=None, rule=None):
     super(ValidationException, self).__init__(message)
     self.source = source
+    self.rule = rule
+    self.table = getattr(source, 'TABLE', None)
 
 class ValidationError(ValidationException):
   """Base validation error."""
@@ -123,25 +241,406 @@ class ValidationInfo(ValidationException):
   """Validation info."""
   pass
 
+class ValidationAborted(Exception):
+  """Raised when a ValidationReport exceeds its error budget."""
+  pass
+
+SEVERITIES = {
+  'error': ValidationError,
+  'warning': ValidationWarning,
+  'info': ValidationInfo
+}
+
+def severity(exception):
+  for k,v in SEVERITIES.items():
+    if type(exception) is v:
+      return k
+  return 'error'
+
+def _text(value):
+  try:
+    return unicode(value)
+  except UnicodeDecodeError:
+    return str(value).decode('utf-8', 'replace')
+
+def finding(exception):
+  """Serialize a ValidationException, without a reference to its source."""
+  source = exception.source
+  try:
+    entity_id = source.id()
+    row = source.row()
+    ids = dict(
+      (k,v) for k,v in source.items()
+      if v and (k.endswith('_id') or k == source.KEY)
+    )
+  except AttributeError:
+    entity_id = None
+    row = None
+    ids = {}
+  return {
+    'table': exception.table,
+    'row': row,
+    'id': entity_id,
+    'ids': ids,
+    'source': _text(source) if source is not None else None,
+    'rule': exception.rule,
+    'severity': severity(exception),
+    'message': _text(exception.message)
+  }
+
+def from_finding(record):
+  """Create a ValidationException from a serialized finding."""
+  cls = SEVERITIES.get(record.get('severity'), ValidationError)
+  exception = cls(
+    record.get('message'),
+    source=record.get('source'),
+    rule=record.get('rule')
+  )
+  exception.table = record.get('table')
+  return exception
+
+def check_name(site):
+  """Name an unnamed check by its validating method and 'with' line."""
+  return '%s:%s'%site
+
+def rule_name(source, site):
+  """Name a check by its source entity class and its 'with' statement."""
+  if site is None:
+    return None
+  return '%s.%s'%(source.__class__.__name__, check_name(site))
+
+##### Declarative rules #####
+
+def required(value):
+  return bool(value)
+
+# Exceptions raised by predicates for invalid data; these are failures.
+# Any other exception is a bug in the predicate, and is raised.
+DATA_ERRORS = (ValueError, TypeError, KeyError)
+
+class Rule(object):
+  """A declarative validation rule.
+
+    field - the field to check
+    predicate - returns True if the value is valid; DATA_ERRORS are failures
+    message - message, formatted with %(value)s; or a function of the entity
+    severity - exception class, default ValidationError
+    optional - skip the check if the field is empty
+    entity - call the predicate with the entity, instead of the value
+    name - rule name; defaults to field:predicate
+
+  Additional keyword arguments are passed to the predicate.
+  """
+  def __init__(
+    self,
+    field,
+    predicate,
+    message,
+    severity=None,
+    optional=False,
+    entity=False,
+    name=None,
+    **kwargs
+    ):
+    self.field = field
+    self.predicate = predicate
+    if kwargs:
+      self.predicate = functools.partial(predicate, **kwargs)
+    self.message = message
+    self.severity = severity or ValidationError
+    self.optional = optional
+    self.entity = entity
+    self.name = name or '%s:%s'%(field, predicate.__name__)
+
+  def __repr__(self):
+    return '<%s %s>'%(self.__class__.__name__, self.name)
+
+  def evaluate(self, entity):
+    """Return True if the entity passes this rule."""
+    value = entity.get(self.field) if self.field else None
+    if self.optional and not value:
+      return True
+    if self.field and not self.entity and value is None:
+      # A missing field is invalid.
+      return False
+    try:
+      if self.entity:
+        return bool(self.predicate(entity))
+      return bool(self.predicate(value))
+    except DATA_ERRORS:
+      return False
+
+  def exception(self, entity):
+    """Create the exception for an entity that failed this rule."""
+    if callable(self.message):
+      message = self.message(entity)
+    elif '%(value)s' in self.message:
+      message = self.message%{'value': entity.get(self.field)}
+    else:
+      message = self.message
+    return self.severity(
+      message,
+      source=entity,
+      rule='%s.%s'%(entity.__class__.__name__, self.name)
+    )
+
+class Reference(Rule):
+  """A rule requiring the field to be a key in another table."""
+  def __init__(self, field, table, message, **kwargs):
+    def predicate(entity):
+      return entity._feed._entity(table, entity.get(field)) is not None
+    kwargs.setdefault('name', '%s:%s'%(field, table))
+    super(Reference, self).__init__(
+      field,
+      predicate,
+      message,
+      entity=True,
+      **kwargs
+    )
+
+def _fail(validator, rule, entity):
+  validator.add(rule.exception(entity))
+
+def _profiled(rules, entity, validator):
+  """Evaluate rules one at a time, recording each in the profile."""
+  cls = entity.__class__.__name__
+  for rule in rules:
+    start = timeit.default_timer()
+    ok = rule.evaluate(entity)
+    validator.profile.record(
+      (cls, rule.name),
+      timeit.default_timer() - start,
+      failed=not ok
+    )
+    if not ok:
+      _fail(validator, rule, entity)
+  return validator
+
+def compile_rules(rules, name='rules'):
+  """Compile a list of rules into a single function.
+
+  The function, check(entity, validator), evaluates every rule without a
+  validation context for each check; failures are passed to
+  validator.add(). Profiling validators use a slower, instrumented path.
+  """
+  env = {
+    '_fail': _fail,
+    '_profiled': _profiled,
+    '_errors': DATA_ERRORS,
+    'rules': rules
+  }
+  lines = [
+    'def check(entity, validator):',
+    '  if getattr(validator, "profile", None) is not None:',
+    '    return _profiled(rules, entity, validator)',
+    '  get = entity.get'
+  ]
+  # Read each field once.
+  fields = []
+  for rule in rules:
+    if rule.field and rule.field not in fields:
+      fields.append(rule.field)
+      lines.append('  f%d = get(%r)'%(len(fields)-1, rule.field))
+  for i, rule in enumerate(rules):
+    env['r%d'%i] = rule
+    env['p%d'%i] = rule.predicate
+    indent = '  '
+    value = 'f%d'%fields.index(rule.field) if rule.field else 'None'
+    if rule.optional:
+      lines.append('  if %s:'%value)
+      indent = '    '
+    if rule.predicate is required:
+      lines += [
+        indent+'if not %s:'%value,
+        indent+'  _fail(validator, r%d, entity)'%i
+      ]
+      continue
+    if rule.field and not rule.entity and not rule.optional:
+      # A missing field is invalid.
+      lines += [
+        indent+'if %s is None:'%value,
+        indent+'  _fail(validator, r%d, entity)'%i,
+        indent+'else:'
+      ]
+      indent += '  '
+    lines += [
+      indent+'try:',
+      indent+'  ok = p%d(%s)'%(i, 'entity' if rule.entity else value),
+      indent+'except _errors:',
+      indent+'  ok = False',
+      indent+'if not ok:',
+      indent+'  _fail(validator, r%d, entity)'%i
+    ]
+  lines.append('  return validator')
+  code = compile('\n'.join(lines) + '\n', '<%s>'%name, 'exec')
+  exec code in env
+  return env['check']
+
+# Compiled rules, by (entity class, attribute)
+_COMPILED = {}
+
+def run_rules(entity, attr, validator):
+  """Check an entity against the rules in its class attribute 'attr'."""
+  key = (entity.__class__, attr)
+  try:
+    check = _COMPILED[key]
+  except KeyError:
+    check = _COMPILED[key] = compile_rules(
+      getattr(entity.__class__, attr),
+      name='%s.%s'%(entity.__class__.__name__, attr)
+    )
+  return check(entity, validator)
+
+##### Incremental validation #####
+
+class ValidationState(object):
+  """Content hashes and validation results for each table.
+
+  Pass the state from a previous run to Feed.validate() to only re-check
+  tables whose content, or the content of tables they depend on, has
+  changed. Results for unchanged tables are reused. Every finding is
+  kept, whether or not it was within the report's budgets. The state is
+  updated in place once a run completes without aborting, and can be
+  saved with dump() and restored with load().
+  """
+  def __init__(self, tables=None, options=None):
+    # table -> {'hash': content hash, 'results': [findings]}
+    self.tables = tables or {}
+    # Validation options; a change in options invalidates all tables.
+    self.options = options or {}
+
+  def hash(self, table):
+    return self.tables.get(table, {}).get('hash')
+
+  def results(self, table):
+    return self.tables.get(table, {}).get('results', [])
+
+  def update(self, table, content_hash, results):
+    self.tables[table] = {
+      'hash': content_hash,
+      'results': results
+    }
+
+  def dump(self, f):
+    json.dump({'tables': self.tables, 'options': self.options}, f)
+
+  @classmethod
+  def load(cls, f):
+    data = json.load(f)
+    return cls(tables=data.get('tables'), options=data.get('options'))
+
+##### Validation Profile #####
+
+class ValidationProfile(object):
+  """Evaluation counts, failure counts, and wall time for each check.
+
+  Checks are keyed by entity class and rule name; unnamed checks are
+  named by the validating method and the line of the 'with' statement.
+  """
+  def __init__(self):
+    # (entity class, check) -> [evaluated, failed, seconds]
+    self.checks = {}
+
+  def record(self, key, seconds, failed=False):
+    try:
+      check = self.checks[key]
+    except KeyError:
+      check = self.checks[key] = [0, 0, 0.0]
+    check[0] += 1
+    check[2] += seconds
+    if failed:
+      check[1] += 1
+
+  def rows(self):
+    """Return the results, most expensive first."""
+    rows = [
+      {
+        'entity': entity,
+        'check': check,
+        'evaluated': value[0],
+        'failed': value[1],
+        'seconds': value[2]
+      }
+      for (entity, check), value in self.checks.items()
+    ]
+    return sorted(rows, key=lambda x:x['seconds'], reverse=True)
+
+  def report(self):
+    print "Validation profile:"
+    print "%-16s %-28s %10s %10s %10s"%(
+      'entity', 'check', 'evaluated', 'failed', 'seconds'
+    )
+    for row in self.rows():
+      print "%-16s %-28s %10d %10d %10.4f"%(
+        row['entity'],
+        row['check'],
+        row['evaluated'],
+        row['failed'],
+        row['seconds']
+      )
+
 ##### Validation Managers #####
 
 class ValidationManager(object):
-  def __init__(self):
+  def __init__(self, profile=False):
     # List of exceptions generated
     self.exceptions = []
     # Source of ValidationError
     self.source = None 
+    # Name of the current check, if given
+    self.rule = None
+    # (method, line) of the current 'with' statement
+    self._site = None
+    # Called with each exception, whether kept or not
+    self.listeners = []
+    # Optional per-check timing and counters
+    self.profile = ValidationProfile() if profile else None
+    self._check = None
+    self._start = None
   
-  def __call__(self, source=None):
+  def __call__(self, source=None, rule=None):
     self.source = source
+    self.rule = rule
     return self
   
   def __enter__(self):
+    caller = sys._getframe(1)
+    self._site = (caller.f_code.co_name, caller.f_lineno)
+    if self.profile is not None:
+      self._check = (
+        self.source.__class__.__name__,
+        self.rule or check_name(self._site)
+      )
+      self._start = timeit.default_timer()
     return self
   
   def __exit__(self, etype, value, traceback):
     self.source = None
+    self.rule = None
+    if self.profile is not None:
+      self._profile_exit(etype)
     return
+
+  def _profile_exit(self, etype):
+    failed = etype is not None and \
+      issubclass(etype, (AssertionError, ValidationException))
+    self.profile.record(
+      self._check,
+      timeit.default_timer() - self._start,
+      failed=failed
+    )
+
+  def add(self, exception):
+    """Handle an exception created outside of a validation context."""
+    raise exception
+
+  def sample(self, entities):
+    """Return the entities to validate."""
+    return entities
+
+  def options(self):
+    """Return the options that affect results, for a ValidationState."""
+    return {}
       
   def report(self):
     print "Validation report:"
@@ -149,15 +648,143 @@ class ValidationManager(object):
       print "%s: %s"%(e.source, e.message)
 
 class ValidationReport(ValidationManager):
+  """Collect validation exceptions.
+
+  Failures are always counted exactly, by rule and by table. Optional
+  budgets limit how many exceptions are kept as examples:
+
+    max_per_rule - keep at most this many exceptions for each rule
+    max_per_table - keep at most this many exceptions for each table
+    max_errors - abort validation after this many errors (not warnings)
+    sample - only validate this fraction of the rows in each table
+
+  With profile=True, per-check timing and counters are recorded in
+  a ValidationProfile.
+  """
+  def __init__(
+    self,
+    max_per_rule=None,
+    max_per_table=None,
+    max_errors=None,
+    sample=None,
+    profile=False
+    ):
+    super(ValidationReport, self).__init__(profile=profile)
+    self.max_per_rule = max_per_rule
+    self.max_per_table = max_per_table
+    self.max_errors = max_errors
+    self.sample_rate = sample
+    # Failure counts
+    self.counts = collections.defaultdict(int)
+    self.table_counts = collections.defaultdict(int)
+    self.errors = 0
+    self.aborted = False
+    # Stored example counts
+    self._rule_kept = collections.defaultdict(int)
+    self._table_kept = collections.defaultdict(int)
+
   def __exit__(self, etype, value, traceback):
     # Unset the source from this context.
     s = self.source
+    rule = self.rule
+    site = self._site
     self.source = None
+    self.rule = None
+    if self.profile is not None:
+      self._profile_exit(etype)
     if not etype:
       return
     if issubclass(etype, AssertionError):
       etype = ValidationError
     if issubclass(etype, ValidationException):
-      self.exceptions.append(etype(value, source=s))
+      self.add(etype(value, source=s, rule=rule or rule_name(s, site)))
       return True
 
+  def add(self, exception):
+    """Count an exception, and keep it if within budget."""
+    rule = exception.rule
+    table = exception.table
+    self.counts[rule] += 1
+    self.table_counts[table] += 1
+    if isinstance(exception, ValidationError):
+      self.errors += 1
+    for listener in self.listeners:
+      listener(exception)
+    if (self.max_per_rule is None or self._rule_kept[rule] < self.max_per_rule) and \
+      (self.max_per_table is None or self._table_kept[table] < self.max_per_table):
+      self._rule_kept[rule] += 1
+      self._table_kept[table] += 1
+      self.store(exception)
+    if self.max_errors is not None and self.errors >= self.max_errors:
+      self.aborted = True
+      raise ValidationAborted("Too many errors: %s"%self.errors)
+
+  def store(self, exception):
+    """Keep an exception."""
+    self.exceptions.append(exception)
+
+  def sample(self, entities):
+    """Return a fraction of the entities, according to the sampling rate."""
+    if not self.sample_rate or self.sample_rate >= 1:
+      return entities
+    return self._sample(entities, self.sample_rate)
+
+  def _sample(self, entities, rate):
+    # Keep row i when the running total ceil(i * rate) steps up; this
+    # keeps the first row and spreads the rest evenly for any rate.
+    for i, entity in enumerate(entities):
+      if math.ceil((i + 1) * rate) > math.ceil(i * rate):
+        yield entity
+
+  def options(self):
+    options = dict(
+      max_per_rule=self.max_per_rule,
+      max_per_table=self.max_per_table,
+      max_errors=self.max_errors,
+      sample=self.sample_rate
+    )
+    return dict((k, v) for k, v in options.items() if v is not None)
+
+  def passed(self):
+    """True if no errors were found."""
+    return self.errors == 0
+
+  def report(self):
+    super(ValidationReport, self).report()
+    for rule, count in sorted(self.counts.items()):
+      if count > self._rule_kept[rule]:
+        print "%s: %s more not shown"%(rule, count - self._rule_kept[rule])
+    if self.aborted:
+      print "Validation aborted after %s errors"%self.errors
+
+class StreamingReport(ValidationReport):
+  """Stream findings as they are found, without keeping them.
+
+  Each finding is serialized (see finding()) and written as a line of
+  JSON to 'out', a file-like object, and/or passed to 'callback'.
+  No reference to the source entity is kept; only the counts used by
+  the error budgets are kept in memory. Accepts the same budget options
+  as ValidationReport.
+  """
+  def __init__(self, out=None, callback=None, **kwargs):
+    super(StreamingReport, self).__init__(**kwargs)
+    self.out = out
+    self.callback = callback
+    self.written = 0
+
+  def store(self, exception):
+    record = finding(exception)
+    if self.out:
+      self.out.write(json.dumps(record, sort_keys=True))
+      self.out.write('\n')
+    if self.callback:
+      self.callback(record)
+    self.written += 1
+
+  def report(self):
+    print "Validation report:"
+    print "%s findings written"%self.written
+    for rule, count in sorted(self.counts.items()):
+      print "%s: %s"%(rule, count)
+    if self.aborted:
+      print "Validation aborted after %s errors"%self.errors
@@ -1,45 +1,80 @@
 """WideTime, a time class that supports long days."""
-import time
 
-class WideTime(object):
-  def __init__(self, hours=0, minutes=0, seconds=0):
+# Parsed times, by string. Feeds use a few thousand distinct times.
+_CACHE = {}
+CACHE_SIZE = 100000
+
+class WideTime(int):
+  """A time as integer seconds since the start of the service day.
+
+  Hours may be 24 or greater, for trips running past midnight. Since
+  WideTime is an int, comparison, sorting and arithmetic are as cheap
+  as for ints; adding or subtracting returns plain seconds.
+  """
+  __slots__ = ()
+
+  def __new__(cls, hours=0, minutes=0, seconds=0):
     assert 0 <= hours
     assert 0 <= minutes <= 60
     assert 0 <= seconds <= 60
-    self.hours = hours
-    self.minutes = minutes
-    self.seconds = seconds
-  
-  def as_seconds(self):
-    return self.hours * 3600 + self.minutes * 60 + self.seconds
-    
-  def __add__(self, other):
-    return self.as_seconds() + other.as_seconds()
-  
-  def __sub__(self, other):
-    return self.as_seconds() - other.as_seconds()
-  
+    return int.__new__(cls, hours * 3600 + minutes * 60 + seconds)
+
+  @classmethod
+  def from_seconds(cls, value):
+    assert 0 <= value
+    return int.__new__(cls, value)
+
   @classmethod
   def from_string(cls, value):
-    return cls(*map(int, value.split(':')))
+    """Parse HH:MM:SS. Results are cached and shared."""
+    try:
+      return _CACHE[value]
+    except KeyError:
+      pass
+    t = cls(*map(int, value.split(':')))
+    if cls is WideTime and len(_CACHE) < CACHE_SIZE:
+      _CACHE[value] = t
+    return t
+
+  @property
+  def hours(self):
+    return self // 3600
+
+  @property
+  def minutes(self):
+    return self % 3600 // 60
+
+  @property
+  def seconds(self):
+    return self % 60
+
+  def as_seconds(self):
+    return int(self)
+
+  def __nonzero__(self):
+    # A time is always set, even 00:00:00.
+    return True
+
+  def __reduce_ex__(self, protocol):
+    return (_from_seconds, (int(self),))
 
   def __str__(self):
     return ':'.join('%02d'%i for i in list(self))
 
+  def __repr__(self):
+    return '<%s %s>'%(self.__class__.__name__, self)
+
   def __iter__(self):
     return iter([self.hours, self.minutes, self.seconds])
 
-  def __lt__(self, other):
-    return list(self) < list(other)
-
-  def __le__(self, other):
-    return list(self) <= list(other)
-  
-  def __gt__(self, other):
-    return list(self) > list(other)
-  
-  def __ge__(self, other):
-    return list(self) >= list(other)
-    
-  def __eq__(self, other):
-    return list(self) == list(other)
\ No newline at end of file
+def to_seconds(value):
+  """Seconds from a WideTime, int, or HH:MM:SS string. None is None."""
+  if value is None:
+    return None
+  if isinstance(value, basestring):
+    return int(WideTime.from_string(value))
+  return int(value)
+
+def _from_seconds(value):
+  # For pickle.
+  return WideTime.from_seconds(value)
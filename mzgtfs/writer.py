@@ -0,0 +1,160 @@
+"""Streaming csv output for entities."""
+import cPickle
+import heapq
+import itertools
+import tempfile
+
+try:
+  import unicodecsv
+except ImportError:
+  unicodecsv = None
+
+# Rows buffered before each write.
+BUFFER_SIZE = 1000
+# Rows sorted in memory; larger inputs are sorted in runs on disk.
+CHUNK_SIZE = 100000
+# Entities read ahead to infer the columns of a one-shot iterator.
+SAMPLE_SIZE = 1000
+
+def schema(entities, sample=SAMPLE_SIZE):
+  """Return the columns for entities, and the entities to write.
+
+  For a list or other collection, the columns are the sorted union of all
+  keys. For an iterator, which can only be read once, the columns are the
+  entity class's REQUIRED and OPTIONAL fields, followed by any other keys
+  in the first 'sample' entities; the returned iterator replays them.
+  """
+  if isinstance(entities, (list, tuple, set, frozenset)):
+    columns = set()
+    for entity in entities:
+      columns |= set(entity.keys())
+    return sorted(columns), entities
+  entities = iter(entities)
+  head = list(itertools.islice(entities, sample))
+  columns = []
+  if head:
+    cls = type(head[0])
+    for column in list(cls.REQUIRED) + list(cls.OPTIONAL):
+      if column not in columns:
+        columns.append(column)
+  keys = set()
+  for entity in head:
+    keys |= set(entity.keys())
+  columns += sorted(keys - set(columns))
+  return columns, itertools.chain(head, entities)
+
+def _dump(rows, tmpdir=None):
+  f = tempfile.TemporaryFile(dir=tmpdir)
+  for row in rows:
+    cPickle.dump(row, f, cPickle.HIGHEST_PROTOCOL)
+  f.seek(0)
+  return f
+
+def _load(f, key, run):
+  i = 0
+  while True:
+    try:
+      row = cPickle.load(f)
+    except EOFError:
+      return
+    yield key(row), run, i, row
+    i += 1
+
+def external_sort(rows, key, chunk_size=CHUNK_SIZE, tmpdir=None):
+  """Generate rows sorted by key, holding at most chunk_size rows in memory.
+
+  Runs of chunk_size rows are sorted and written to temporary files, then
+  merged. The sort is stable.
+  """
+  rows = iter(rows)
+  runs = []
+  try:
+    while True:
+      chunk = list(itertools.islice(rows, chunk_size))
+      if not runs and len(chunk) < chunk_size:
+        # Fits in memory.
+        chunk.sort(key=key)
+        for row in chunk:
+          yield row
+        return
+      if not chunk:
+        break
+      chunk.sort(key=key)
+      runs.append(_dump(chunk, tmpdir=tmpdir))
+      del chunk
+    streams = [_load(f, key, run) for run, f in enumerate(runs)]
+    for _, _, _, row in heapq.merge(*streams):
+      yield row
+  finally:
+    for f in runs:
+      f.close()
+
+class EntityWriter(object):
+  """Write entities as csv rows as they arrive.
+
+  Rows are buffered and written buffer_size at a time. With strict, an
+  entity with a key that is not a column raises ValueError, instead of
+  the value being silently dropped.
+  """
+  def __init__(self, f, columns, buffer_size=BUFFER_SIZE, strict=False):
+    self.columns = list(columns)
+    self.count = 0
+    self.buffer_size = buffer_size
+    self._writer = unicodecsv.writer(f)
+    self._buffer = []
+    self._strict = strict
+    self._keys = set(self.columns)
+    self._writer.writerow(self.columns)
+
+  def row(self, entity):
+    """Return the values of an entity, in column order."""
+    if self._strict and not self._keys.issuperset(entity.keys()):
+      raise ValueError('Unknown columns for %s: %s'%(
+        entity,
+        ', '.join(sorted(set(entity.keys()) - self._keys))
+      ))
+    return [entity.get(column) for column in self.columns]
+
+  def write(self, entity):
+    self.writerow(self.row(entity))
+
+  def writerow(self, row):
+    self._buffer.append(row)
+    self.count += 1
+    if len(self._buffer) >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    self._writer.writerows(self._buffer)
+    self._buffer = []
+
+def write_entities(
+    f,
+    entities,
+    sortkey=None,
+    columns=None,
+    buffer_size=BUFFER_SIZE,
+    chunk_size=CHUNK_SIZE
+  ):
+  """Write entities to an open file in csv format; return the row count.
+
+  entities may be any iterable, including a generator. Without columns,
+  they are inferred with schema(). With sortkey, rows are sorted by the
+  entities' value for that key with external_sort().
+  """
+  strict = False
+  if not columns:
+    strict = not isinstance(entities, (list, tuple, set, frozenset))
+    columns, entities = schema(entities)
+  writer = EntityWriter(f, columns, buffer_size=buffer_size, strict=strict)
+  if sortkey:
+    # Sort on the entity's value, which need not be an output column.
+    rows = ((entity[sortkey], writer.row(entity)) for entity in entities)
+    rows = external_sort(rows, key=lambda x:x[0], chunk_size=chunk_size)
+    rows = (row for _, row in rows)
+  else:
+    rows = (writer.row(entity) for entity in entities)
+  for row in rows:
+    writer.writerow(row)
+  writer.flush()
+  return writer.count
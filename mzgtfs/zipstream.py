@@ -0,0 +1,295 @@
+"""Stream GTFS tables into a zip archive.
+
+zipfile in Python 2 can only add complete files or strings. ZipWriter adds
+members as a stream: the local header is written first, with the CRC and
+sizes following the data in a data descriptor, so a table can be written
+into the archive while its rows are produced. Members of another archive
+can be copied without decompressing and recompressing them.
+
+make_zip can also compress in parallel: files are split into chunks, each
+deflated independently by a pool of threads (zlib releases the GIL), and
+the results are written in order as one valid deflate stream.
+"""
+import collections
+import os
+import struct
+import time
+import zipfile
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import writer
+
+# Data descriptor signature, and formats with 4 and 8 byte sizes.
+DESCRIPTOR_SIGNATURE = 'PK\x07\x08'
+DESCRIPTOR = '<4sLLL'
+DESCRIPTOR64 = '<4sLQQ'
+# Copy buffer size.
+CHUNK_SIZE = 2**20
+# Chunk size for parallel compression.
+PARALLEL_CHUNK_SIZE = 4 * 2**20
+
+def deflate_chunk(data, level, last):
+  """Deflate a chunk independently of the others.
+
+  Chunks before the last end with a sync flush, on a byte boundary and
+  without a final block, so the compressed chunks can be concatenated.
+  """
+  compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+  flush = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+  return compressor.compress(data) + compressor.flush(flush)
+
+def _chunks(files, chunk_size):
+  # Generate (filename, arcname, data, first, last) for each chunk of each file.
+  for filename, arcname in files:
+    with open(filename, 'rb') as f:
+      data = f.read(chunk_size)
+      first = True
+      while True:
+        following = f.read(chunk_size)
+        yield filename, arcname, data, first, not following
+        if not following:
+          break
+        data, first = following, False
+
+class ZipMember(object):
+  """A file-like object writing one member of a ZipWriter archive."""
+  def __init__(self, zf, zinfo, level=zlib.Z_DEFAULT_COMPRESSION, zip64=False, raw=False):
+    """With raw, data is compressed by the caller; see write_compressed()."""
+    self._zf = zf
+    self._fp = zf.fp
+    self.zinfo = zinfo
+    self.closed = False
+    self._zip64 = zip64
+    self._crc = 0
+    self._file_size = 0
+    self._compress_size = 0
+    self._compressor = None
+    if zinfo.compress_type == zipfile.ZIP_DEFLATED and not raw:
+      self._compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    zinfo.flag_bits |= 0x08
+    zinfo.header_offset = self._fp.tell()
+    self._fp.write(zinfo.FileHeader(zip64=zip64))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def write(self, data):
+    if isinstance(data, unicode):
+      data = data.encode('utf-8')
+    self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+    self._file_size += len(data)
+    if self._compressor:
+      data = self._compressor.compress(data)
+    self._compress_size += len(data)
+    self._fp.write(data)
+
+  def write_compressed(self, data, compressed):
+    """Write data that was already compressed, for a raw member."""
+    self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+    self._file_size += len(data)
+    self._compress_size += len(compressed)
+    self._fp.write(compressed)
+
+  def close(self):
+    """Finish the member: write the data descriptor, and add it to the archive."""
+    if self.closed:
+      return
+    self.closed = True
+    if self._compressor:
+      data = self._compressor.flush()
+      self._compress_size += len(data)
+      self._fp.write(data)
+    zinfo = self.zinfo
+    zinfo.CRC = self._crc
+    zinfo.file_size = self._file_size
+    zinfo.compress_size = self._compress_size
+    if self._zip64:
+      self._fp.write(struct.pack(DESCRIPTOR64, DESCRIPTOR_SIGNATURE,
+        zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+    elif max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT:
+      raise zipfile.LargeZipFile('Member requires ZIP64 extensions: %s'%zinfo.filename)
+    else:
+      self._fp.write(struct.pack(DESCRIPTOR, DESCRIPTOR_SIGNATURE,
+        zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+    self._zf.filelist.append(zinfo)
+    self._zf.NameToInfo[zinfo.filename] = zinfo
+    self._zf._didModify = True
+    self._zf._member = None
+
+class ZipWriter(object):
+  """Write a zip archive, member by member, without temporary files."""
+  def __init__(self, filename, compress=True, level=zlib.Z_DEFAULT_COMPRESSION):
+    """Filename or file object, and the default compression."""
+    self.compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    self.level = level
+    self.zf = zipfile.ZipFile(filename, 'w', compression=self.compression, allowZip64=True)
+    self.zf._member = None
+    # Only remove files we opened by name.
+    self.filename = None
+    if isinstance(filename, basestring):
+      self.filename = filename
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+  def namelist(self):
+    return self.zf.namelist()
+
+  def _zinfo(self, arcname, compress_type):
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0644 << 16
+    return zinfo
+
+  def _check(self, zinfo):
+    if self.zf._member is not None:
+      raise ValueError('Member still open: %s'%self.zf._member.zinfo.filename)
+    self.zf._writecheck(zinfo)
+
+  def open(self, arcname, compress=None, level=None, zip64=False, raw=False):
+    """Return a file-like ZipMember to write arcname.
+
+    Members must be written one at a time; close each before the next.
+    A level of 0 stores the member without compression. Set zip64 if the
+    member may be larger than 4 GB.
+    """
+    compress_type = self.compression
+    if compress is not None:
+      compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    if level == 0:
+      compress_type = zipfile.ZIP_STORED
+    zinfo = self._zinfo(arcname, compress_type)
+    self._check(zinfo)
+    member = ZipMember(
+      self.zf,
+      zinfo,
+      level=self.level if level is None else level,
+      zip64=zip64,
+      raw=raw
+    )
+    self.zf._member = member
+    return member
+
+  def write_entities(self, arcname, entities, sortkey=None, columns=None):
+    """Write entities as a csv member while they are produced; return the row count."""
+    with self.open(arcname) as member:
+      return writer.write_entities(
+        member,
+        entities,
+        sortkey=sortkey,
+        columns=columns
+      )
+
+  def write(self, filename, arcname=None, level=None):
+    """Add a file from disk; by default, named by its basename."""
+    with open(filename, 'rb') as f:
+      with self.open(arcname or os.path.basename(filename), level=level) as member:
+        for chunk in iter(lambda:f.read(CHUNK_SIZE), ''):
+          member.write(chunk)
+
+  def write_parallel(self, files, workers=4, levels=None, chunk_size=PARALLEL_CHUNK_SIZE):
+    """Add files from disk, compressing chunks in a pool of threads.
+
+    files is a list of (filename, arcname). levels is an optional dict of
+    arcname to compression level. At most 2 * workers chunks are held in
+    memory; members are written in order.
+    """
+    levels = levels or {}
+    pool = ThreadPool(workers)
+    pending = collections.deque()
+    def drain():
+      arcname, data, first, last, result = pending.popleft()
+      if first:
+        member = self.open(arcname, level=levels.get(arcname), raw=True)
+      else:
+        member = self.zf._member
+      if member.zinfo.compress_type == zipfile.ZIP_STORED:
+        member.write_compressed(data, data)
+      else:
+        member.write_compressed(data, result.get())
+      if last:
+        member.close()
+    try:
+      for filename, arcname, data, first, last in _chunks(files, chunk_size):
+        level = levels.get(arcname, self.level)
+        result = None
+        if self.compression == zipfile.ZIP_DEFLATED and level != 0:
+          result = pool.apply_async(deflate_chunk, (data, level, last))
+        pending.append((arcname, data, first, last, result))
+        if len(pending) >= 2 * workers:
+          drain()
+      while pending:
+        drain()
+    finally:
+      pool.close()
+      pool.join()
+
+  def clone(self, source, name, arcname=None, level=None):
+    """Copy a member from another ZipFile.
+
+    If the member is already compressed the same way as this archive, and
+    no level is given, its compressed data is copied directly. Otherwise it
+    is decompressed and recompressed as a stream.
+    """
+    info = source.getinfo(name)
+    arcname = arcname or name
+    if info.compress_type != self.compression or info.flag_bits & 0x01 or level is not None:
+      with source.open(info) as f:
+        with self.open(arcname, level=level) as member:
+          for chunk in iter(lambda:f.read(CHUNK_SIZE), ''):
+            member.write(chunk)
+      return
+    zinfo = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    self._check(zinfo)
+    # Skip the source local header; its extra field may differ from the
+    # central directory.
+    fp = source.fp
+    fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, fp.read(zipfile.sizeFileHeader))
+    fp.seek(
+      header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH],
+      1
+    )
+    zinfo.header_offset = self.zf.fp.tell()
+    self.zf.fp.write(zinfo.FileHeader())
+    remaining = info.compress_size
+    while remaining > 0:
+      data = fp.read(min(CHUNK_SIZE, remaining))
+      if not data:
+        raise zipfile.BadZipfile('Truncated member: %s'%name)
+      self.zf.fp.write(data)
+      remaining -= len(data)
+    self.zf.filelist.append(zinfo)
+    self.zf.NameToInfo[zinfo.filename] = zinfo
+    self.zf._didModify = True
+
+  def close(self):
+    if self.zf._member is not None:
+      self.zf._member.close()
+    self.zf.close()
+
+  def abort(self):
+    """Close without finishing the archive, and remove a partial file."""
+    fp, self.zf.fp = self.zf.fp, None
+    self.zf._member = None
+    if fp is None or self.zf._filePassed:
+      return
+    fp.close()
+    if self.filename:
+      os.unlink(self.filename)
@@ -12,6 +12,7 @@ setup(
   license='License :: OSI Approved :: MIT License',
   packages=['mzgtfs'],
   install_requires=['unicodecsv', 'pytz'],
+  extras_require={'columnar': ['numpy']},
   zip_safe=False,
   # Include examples.
   package_data = {